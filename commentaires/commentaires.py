@@ -28,7 +28,6 @@
  ***************************************************************************/
 """
 
-import requests
 from functools import partial
 from qgis.gui import QgisInterface
 from qgis.PyQt.QtWidgets import QDockWidget, QPushButton
@@ -42,12 +41,12 @@ class Commentaires():
     _mainWidget: QDockWidget
     _iface: QgisInterface
 
-    def __init__(self, mainWidget: QDockWidget, iface):
+    def __init__(self, mainWidget: QDockWidget, iface, preq):
 
         self._mainWidget = mainWidget
         self._iface = iface
-        self.connexion = Connexion(mainWidget, self)
-        self.issues = Issues(mainWidget, iface, self.connexion)
+        self.connexion = Connexion(mainWidget, self, preq)
+        self.issues = Issues(mainWidget, iface, self.connexion, preq)
 
     # fonction executée à la connexion
     def estConnecte(self, connecte: bool):
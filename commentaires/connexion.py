@@ -1,5 +1,4 @@
 import os
-import requests
 from requests.auth import HTTPBasicAuth
 from qgis.PyQt.QtWidgets import QDockWidget
 from qgis.PyQt.QtCore import QByteArray
@@ -13,10 +12,12 @@ class Connexion():
     _apiKey: str
     _loader: bool
     _utilisateurConnecte: str
+    _preq: any
 
-    def __init__(self, mainWidget: QDockWidget, parent):
+    def __init__(self, mainWidget: QDockWidget, parent, preq):
         self._mainWidget = mainWidget
         self._parent = parent
+        self._preq = preq  # Pick_Req : envoi des requetes par la session http partagee
         self._apiKey = None
         self._utilisateurConnecte = None
         self._mainWidget.label_connecte.hide()
@@ -66,7 +67,7 @@ class Connexion():
             motDePasse = self._mainWidget.input_password.text()
             url = "https://forge-scientifique.brgm-rec.fr/users/current.json"
             myAuth = HTTPBasicAuth(identifiant, motDePasse)
-            r = requests.get(url, auth=myAuth)
+            r = self._preq.envoyer_requete(url, auth=myAuth)
             if (r.status_code == 200):
                 res = r.json()
                 self._apiKey = res["user"]["api_key"]
@@ -1,4 +1,3 @@
-import requests
 from typing import List
 from qgis.core import Qgis, QgsPoint, QgsPointXY, QgsGeometry
 from qgis.gui import QgisInterface
@@ -22,11 +21,13 @@ class Issues():
     _canvas: QgsMapCanvas
     _pointClickTool: QgsMapToolEmitPoint
     _checkMapTool: any
+    _preq: any
 
-    def __init__(self, mainWidget: QDockWidget, iface: QgisInterface, connexion: Connexion):
+    def __init__(self, mainWidget: QDockWidget, iface: QgisInterface, connexion: Connexion, preq):
         self._mainWidget = mainWidget
         self._iface = iface
         self._connexion = connexion
+        self._preq = preq  # Pick_Req : envoi des requetes par la session http partagee
         self._formulaireVerrouille = True
         self._mainWidget.input_envoyer.clicked.connect(lambda: self.creeAnomalie(self))
         self._mainWidget.input_effacer.clicked.connect(lambda: self.viderFormulaire(self))
@@ -129,7 +130,7 @@ class Issues():
         description = self._mainWidget.input_description.toPlainText()
         body = self.creationBody(titre, description)
 
-        r = requests.post(url, headers=headers, json=body)
+        r = self._preq.envoyer_requete(url, methode="POST", headers=headers, json=body)
         if (r.status_code == 201):
             self._mainWidget.input_envoyer.setDisabled(False)  # deverouiller avec le retour
             self._iface.messageBar().pushSuccess("Anomalie enregistrée avec succès.", titre)
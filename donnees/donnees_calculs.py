@@ -1,5 +1,4 @@
 
-import requests
 from urllib.parse import quote
 from qgis.PyQt.QtWidgets import QDockWidget
 from qgis.PyQt.QtCore import QDate
@@ -8,6 +7,7 @@ from qgis.core import QgsFeature, QgsProject, QgsLayerTreeGroup
 from ..pick_utilitaire import Pick_Tools
 from .layers_stations import StationsLayers
 from .traitement_resultats_api import ResultatsApi
+from .stats_descriptives_locales import StatsDescriptivesLocales
 from ..utilitaires.utilitaire_couches import UtilitaireCouches
 
 
@@ -18,45 +18,90 @@ class DonneesCalculs():
     _config: dict
     _stationsLayers: StationsLayers
     _resultatsApi: ResultatsApi
+    _statsLocales: StatsDescriptivesLocales
+    _preq: any
 
-    def __init__(self, mainWidget: QDockWidget, iface: QgisInterface):
+    def __init__(self, mainWidget: QDockWidget, iface: QgisInterface, preq):
         self._mainWidget = mainWidget
+        self._preq = preq  # Pick_Req : envoi des requetes par la session http partagee
         self._config = Pick_Tools().lire_fichier_config()
         self._iface = iface
         self._mainWidget.btn_dl_stats_piezo.clicked.connect(lambda: self.dlDatas(self))
         self._stationsLayers = StationsLayers(mainWidget, self._iface)
         self._resultatsApi = ResultatsApi(mainWidget, self._iface)
+        self._statsLocales = StatsDescriptivesLocales()
 
     def dlDatas(self, checked=None):
-        baseUrl = self._config["api"]["piceau"]["url"] + "/" + self._config["api"]["piceau"]["routes"]["stats_descriptives_piezo"]
-
         # obtenir couche piezo selectionnee
         couche_piezos = self._stationsLayers.activeLayerEstCouchePiezometre()
         groupe_actif: QgsLayerTreeGroup = self._iface.layerTreeView().currentGroupNode()
 
         if (couche_piezos):
-            piezos = self.getStationsPiezoSelectionnees(couche_piezos)
-            if (piezos):
-                url = baseUrl + "/" + piezos + "/" + self.getDateDebut() + "/" + self.getDateFin()
-                res = requests.get(url)
-                if (res.status_code == 200):
-                    # resultat
-                    resultat = res.json().keys()
-
-                    if(len(resultat) > 0):
-                        dossier = self._resultatsApi.statsDescriptivesPiezo(res.json(), couche_piezos, res)
-
-                        # Ouvrir les couches du layer (cf fonction utilitaire lire dpkg)
-                        newGroup = groupe_actif.addGroup(dossier["nomDossierCree"])
-                        UtilitaireCouches.lire_toutes_couches_geopackage(dossier["nom_fichier_dpkg"], newGroup, True)
-
-                    else:
-                        self._iface.messageBar().pushWarning("le téléchargement des données n'a retourné aucune donnée", "Aucun résultat")
+            # statistiques calculées localement (chroniques déjà téléchargées) ou par la route Piceau
+            if self._mainWidget.chk_statsLocales.isChecked():
+                resultat = self.calculerStatsLocales(couche_piezos)
+            else:
+                resultat = self.telechargerStats(couche_piezos)
+
+            if (resultat is not None):
+                if(len(resultat) > 0):
+                    dossier = self._resultatsApi.statsDescriptivesPiezo(resultat, couche_piezos, None)
+
+                    # Ouvrir les couches du layer (cf fonction utilitaire lire dpkg)
+                    newGroup = groupe_actif.addGroup(dossier["nomDossierCree"])
+                    UtilitaireCouches.lire_toutes_couches_geopackage(dossier["nom_fichier_dpkg"], newGroup, True)
+
                 else:
-                    self._iface.messageBar().pushWarning("le téléchargement des données à échoué", "Echec du téléchargement")
+                    self._iface.messageBar().pushWarning("le téléchargement des données n'a retourné aucune donnée", "Aucun résultat")
         else:
             self._iface.messageBar().pushWarning("Sélectionner une couche Station_Piézomètres", "Echec du téléchargement")
 
+    def telechargerStats(self, couche_piezos) -> dict:
+        """
+        Téléchargement des statistiques descriptives des stations sélectionnées (route stats_descriptives_piezo de Piceau)
+
+        :param couche_piezos: couche Stations_Piézomètres
+        :type couche_piezos: QgsMapLayer
+
+        :return: réponse de l'api (dictionnaire par station), None si aucune station n'est sélectionnée ou en cas d'échec
+        :rtype: dict
+        """
+        baseUrl = self._config["api"]["piceau"]["url"] + "/" + self._config["api"]["piceau"]["routes"]["stats_descriptives_piezo"]
+        piezos = self.getStationsPiezoSelectionnees(couche_piezos)
+        if (piezos):
+            url = baseUrl + "/" + piezos + "/" + self.getDateDebut() + "/" + self.getDateFin()
+            res = self._preq.envoyer_requete(url)
+            if (res.status_code == 200):
+                return res.json()
+            self._iface.messageBar().pushWarning("le téléchargement des données à échoué", "Echec du téléchargement")
+        return None
+
+    def calculerStatsLocales(self, couche_piezos) -> dict:
+        """
+        Calcul local des statistiques descriptives des stations sélectionnées à partir des chroniques
+        du dernier résultat piézométrique téléchargé dans le dossier de la couche des stations
+
+        :param couche_piezos: couche Stations_Piézomètres
+        :type couche_piezos: QgsMapLayer
+
+        :return: statistiques par station (même structure que la réponse de l'api), None si le calcul est impossible
+        :rtype: dict
+        """
+        listCodesBss = self._stationsLayers.getBssStations(couche_piezos, "code_bss")
+        if (len(listCodesBss) == 0):
+            self._iface.messageBar().pushWarning("Sélectionner au moins une station de la couche Station_Piézomètres", "Echec du calcul")
+            return None
+        listBssIds = self._stationsLayers.getBssStations(couche_piezos, "bss_id") or listCodesBss
+
+        chemin_dossier = UtilitaireCouches.get_chemin_dossier_geopackage_depuis_couche(couche_piezos)
+        resultatLocal = UtilitaireCouches.rechercher_dernier_resultat(chemin_dossier, "Résultats_Piézométrie_", "Données_Niveaux_")
+        if (resultatLocal is None):
+            self._iface.messageBar().pushWarning("Aucune chronique piézométrique téléchargée pour cette couche de stations", "Echec du calcul")
+            return None
+
+        return self._statsLocales.statsDescriptivesPiezo(resultatLocal["chemin_geopackage"], resultatLocal["nom_table_donnees"],
+                                                         dict(zip(listCodesBss, listBssIds)), self.getDateDebut(), self.getDateFin())
+
     def getDateDebut(self) -> str:
         date: QDate = self._mainWidget.stats_dateDebut.date()
         return date.toString("yyyy-MM-dd")
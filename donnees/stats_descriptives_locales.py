@@ -0,0 +1,154 @@
+import pandas as pd
+try:
+    from ..utilitaires.utilitaire_couches import UtilitaireCouches
+except ImportError:     # module importé hors du paquet du plugin (tests)
+    from utilitaires.utilitaire_couches import UtilitaireCouches
+
+
+class StatsDescriptivesLocales():
+    """
+    Calcul local des statistiques descriptives piézométriques, à partir des chroniques déjà téléchargées
+    (table Données_Niveaux_* du dernier résultat piézométrique), sans appel à la route stats_descriptives_piezo
+    de l'API Piceau.
+    Le résultat a la même structure que la réponse de l'API (dictionnaire par station) et suit donc le même
+    traitement (ResultatsApi.statsDescriptivesPiezo) :
+        - stat_pz_chronique : statistiques de toute la chronique sur la période,
+        - stat_pz_par_annee : statistiques par année,
+        - stat_pz_par_mois : statistiques par mois de l'année (toutes années confondues),
+        - chronique_stat_pz_pas_mensuel : statistiques par mois de la chronique (chronique au pas mensuel).
+    """
+
+    # Statistiques calculées pour chaque groupe de mesures : nom de la statistique / fonction d'agrégation pandas
+    _dictStats: dict = {"nb_mesures": "count",
+                        "min": "min",
+                        "max": "max",
+                        "moyenne": "mean",
+                        "mediane": "median",
+                        "ecart_type": "std"}
+
+    _champCode: str = "code_bss"
+    _champDate: str = "date_mesure"
+    _champValeur: str = "niveau_nappe_eau"
+
+    def lireChroniques(self, cheminGeopackage: str, nomTable: str, listCodesBss: list) -> pd.DataFrame:
+        """
+        Lecture des chroniques des stations dans la table des niveaux piézométriques d'un geopackage résultat
+        (les mesures commentées comme aberrantes sont écartées)
+
+        :param cheminGeopackage: chemin du geopackage résultat
+        :type cheminGeopackage: str
+
+        :param nomTable: nom de la table des niveaux piézométriques (Données_Niveaux_*)
+        :type nomTable: str
+
+        :param listCodesBss: codes bss des stations
+        :type listCodesBss: list
+
+        :return: chroniques des stations (champs code_bss, date_mesure, niveau_nappe_eau)
+        :rtype: pd.DataFrame
+        """
+        listCodesSql = ", ".join("'" + str(codeBss).replace("'", "''") + "'" for codeBss in listCodesBss)
+        df = UtilitaireCouches.lire_table_geopackage(cheminGeopackage, nomTable,
+                                                     [self._champCode, self._champDate, self._champValeur, "commentaire"],
+                                                     f'"{self._champCode}" IN ({listCodesSql})')
+        df = df[df["commentaire"] != "Aberrant"]
+        return df.drop(columns=["commentaire"])
+
+    def agreger(self, df: pd.DataFrame, listCles: list) -> pd.DataFrame:
+        """
+        Agrégation des mesures par groupe (groupby) : une ligne par groupe et une colonne par statistique
+
+        :param df: mesures (champs code_bss, valeur et champs des clés)
+        :type df: pd.DataFrame
+
+        :param listCles: champs des clés des groupes (p.ex ["code_bss", "annee"])
+        :type listCles: list
+
+        :return: statistiques des groupes, valeurs manquantes remplacées par None (écart type d'une seule mesure)
+        :rtype: pd.DataFrame
+        """
+        dfStats = df.groupby(listCles, sort=True)["valeur"].agg(list(self._dictStats.values()))
+        dfStats.columns = list(self._dictStats.keys())
+        dfStats["nb_mesures"] = dfStats["nb_mesures"].astype(int)
+        return dfStats.astype(object).where(dfStats.notna(), None).reset_index()
+
+    def calculerStatistiques(self, df: pd.DataFrame, dictBssId: dict, dateDebut: str, dateFin: str) -> dict:
+        """
+        Calcul des statistiques descriptives des chroniques sur une période
+
+        :param df: chroniques des stations (voir lireChroniques)
+        :type df: pd.DataFrame
+
+        :param dictBssId: clé = code bss / valeur = identifiant bss de la station (clé de la réponse)
+        :type dictBssId: dict
+
+        :param dateDebut: date de début de la période (aaaa-mm-jj, incluse)
+        :type dateDebut: str
+
+        :param dateFin: date de fin de la période (aaaa-mm-jj, incluse)
+        :type dateFin: str
+
+        :return: statistiques par station, même structure que la réponse de la route stats_descriptives_piezo
+        :rtype: dict
+        """
+        df = pd.DataFrame({"code_bss": df[self._champCode].astype(str),
+                           "date": pd.to_datetime(df[self._champDate].astype(str).str.replace("/", "-").str[:10], errors="coerce"),
+                           "valeur": pd.to_numeric(df[self._champValeur], errors="coerce")})
+        df = df.dropna()
+        df = df[(df["date"] >= pd.Timestamp(dateDebut)) & (df["date"] <= pd.Timestamp(dateFin))]
+        if len(df) == 0:
+            return {}
+        df["annee"] = df["date"].dt.strftime("%Y")
+        df["mois"] = df["date"].dt.strftime("%m")
+        df["annee_mois"] = df["date"].dt.strftime("%Y-%m")
+
+        # Statistiques de la chronique entière (avec la première et la dernière date de mesure)
+        dfChronique = self.agreger(df, ["code_bss"])
+        dfDates = df.groupby("code_bss", sort=True)["date"].agg(["min", "max"])
+        dfChronique.insert(1, "date_debut", dfDates["min"].dt.strftime("%Y-%m-%d").to_numpy())
+        dfChronique.insert(2, "date_fin", dfDates["max"].dt.strftime("%Y-%m-%d").to_numpy())
+
+        # Statistiques par période : dictionnaire période / statistiques pour chaque station
+        dictPeriodes = {}
+        for nomTable, champPeriode in [("stat_pz_par_annee", "annee"),
+                                       ("stat_pz_par_mois", "mois"),
+                                       ("chronique_stat_pz_pas_mensuel", "annee_mois")]:
+            dfPeriode = self.agreger(df, ["code_bss", champPeriode]).set_index(champPeriode)
+            dictPeriodes[nomTable] = {codeBss: dfStation.drop(columns=["code_bss"]).to_dict(orient="index")
+                                      for codeBss, dfStation in dfPeriode.groupby("code_bss", sort=False)}
+
+        res = {}
+        for station in dfChronique.to_dict(orient="records"):
+            codeBss = station.pop("code_bss")
+            bssId = dictBssId.get(codeBss) or codeBss
+            res[bssId] = {"bss_id": bssId,
+                          "code_bss": codeBss,
+                          "stat_pz_chronique": [station]}
+            for nomTable, dictStation in dictPeriodes.items():
+                res[bssId][nomTable] = [dictStation[codeBss]]
+        return res
+
+    def statsDescriptivesPiezo(self, cheminGeopackage: str, nomTable: str, dictBssId: dict, dateDebut: str, dateFin: str) -> dict:
+        """
+        Lecture des chroniques et calcul local des statistiques descriptives piézométriques
+
+        :param cheminGeopackage: chemin du geopackage résultat
+        :type cheminGeopackage: str
+
+        :param nomTable: nom de la table des niveaux piézométriques (Données_Niveaux_*)
+        :type nomTable: str
+
+        :param dictBssId: clé = code bss / valeur = identifiant bss des stations sélectionnées
+        :type dictBssId: dict
+
+        :param dateDebut: date de début de la période (aaaa-mm-jj, incluse)
+        :type dateDebut: str
+
+        :param dateFin: date de fin de la période (aaaa-mm-jj, incluse)
+        :type dateFin: str
+
+        :return: statistiques par station (voir calculerStatistiques), vide si aucune mesure sur la période
+        :rtype: dict
+        """
+        df = self.lireChroniques(cheminGeopackage, nomTable, list(dictBssId.keys()))
+        return self.calculerStatistiques(df, dictBssId, dateDebut, dateFin)
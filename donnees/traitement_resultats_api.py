@@ -1,6 +1,4 @@
-import json
 import pandas as pd
-import numpy as np
 from qgis.PyQt.QtCore import QVariant
 from qgis.PyQt.QtWidgets import QDockWidget
 from qgis.core import QgsMapLayer, QgsVectorLayer, QgsField, QgsFeature, QgsProject, QgsLayerTreeGroup
@@ -13,6 +11,8 @@ class ResultatsApi():
 
     _mainWidget: QDockWidget
     _iface: QgisInterface
+    # tables imbriquées de la réponse contenant, pour chaque station, un dictionnaire période / statistiques
+    _tablesParPeriode: list = ["chronique_stat_pz_pas_mensuel", "stat_pz_par_annee", "stat_pz_par_mois"]
 
     def __init__(self, mainWidget: QDockWidget, iface: QgisInterface):
         self._mainWidget = mainWidget
@@ -67,86 +67,62 @@ class ResultatsApi():
 
         return champ
 
-    def formatageResultats(self, res: dict):
+    def convertirResultats(self, res: dict) -> dict:
         """
-        Mise en forme des données json retourné par l'API Piceau
+        Conversion en colonnes de la réponse décodée de l'API Piceau (dictionnaire par station), sans passer par le json :
+            - table des stations : un enregistrement par station, champs dont la valeur n'est pas une liste,
+            - tables imbriquées (stat_pz_*) : les enregistrements de toutes les stations sont aplatis en une seule passe,
+              avec l'identifiant de la station (clé de la réponse) en première colonne
 
-        :param res: réponse des l'api piceau
-        :rtype: dict
+        :param res: réponse de l'api piceau
+        :type res: dict
 
-        :return: données mise en forme pour être mise en tableau
+        :return: clé = nom de la table ("stations" puis tables imbriquées) / valeur = DataFrame
         :rtype: dict
         """
-        donnees = {
-            "donneesStations": {
-                "champs": [],
-                "valeurs": []
-            }
-        }
-
-        donneesNouvelleTable = ""
-
-        # reponse de l'api transformée en tableau
-        jsonRes = json.dumps(res)
-        df = pd.read_json(jsonRes)
-        dft = df.T
-        liste_colonnes = dft.columns
-        index = dft.index
-        liste_index = index.to_numpy()
-
-        nouvelleTables = []
-
-        # creation de la liste des champs
-        for colonne in liste_colonnes:
-
-            value = dft.at[dft.iloc[0]['bss_id'], colonne]
-            if(type(value) is not list):
-                champ = self.creationChamp(colonne, value)
-                donnees["donneesStations"]["champs"].append(champ)
+        listCles = list(res.keys())
+        listStations = list(res.values())
+        if (len(listStations) == 0):
+            return {}
+
+        # champs des stations et tables imbriquées (champs dont la valeur est une liste) d'après la première station
+        champsStations = [champ for champ, valeur in listStations[0].items() if not isinstance(valeur, (list, dict))]
+        nouvellesTables = [champ for champ, valeur in listStations[0].items() if isinstance(valeur, list)]
+
+        data = {"stations": pd.DataFrame.from_records(listStations, columns=champsStations)}
+        for nouvelleTable in nouvellesTables:
+            if (nouvelleTable in self._tablesParPeriode):
+                # liste contenant un dictionnaire période / statistiques : une ligne par station et par période
+                lignes = [(cle, periode, stats)
+                          for cle, station in zip(listCles, listStations)
+                          for dictPeriode in (station.get(nouvelleTable) or [])[:1]
+                          for periode, stats in dictPeriode.items()]
+                df = pd.DataFrame.from_records([ligne[2] for ligne in lignes])
+                df.insert(0, 'date', [ligne[1] for ligne in lignes])
             else:
-                nouvelleTables.append(colonne)
+                # liste d'enregistrements : une ligne par enregistrement
+                lignes = [(cle, enregistrement)
+                          for cle, station in zip(listCles, listStations)
+                          for enregistrement in (station.get(nouvelleTable) or [])]
+                df = pd.DataFrame.from_records([ligne[1] for ligne in lignes])
+            df.insert(0, 'bss_id', [ligne[0] for ligne in lignes])
+            data[nouvelleTable] = df
+        return data
 
-        # creation des donnes stations
-        for index in liste_index:
-            ligne_donnees = []
-
-            for colonne in liste_colonnes:
-                value = dft.at[index, colonne]
-                if(type(value) is not dict):
-                    ligne_donnees.append(value)
+    def formatageResultats(self, res: dict):
+        """
+        Mise en forme des données json retourné par l'API Piceau
 
-            donnees["donneesStations"]["valeurs"].append(ligne_donnees)
+        :param res: réponse des l'api piceau
+        :rtype: dict
 
-        # creation des nouvelles tables
+        :return: données mise en forme pour être mise en tableau (table des stations puis tables imbriquées)
+        :rtype: list
+        """
         donneesApi = []
-        donneeApi = DonneeApi(donnees["donneesStations"]["champs"], donnees["donneesStations"]["valeurs"], "stations")
-        donneesApi.append(donneeApi)
-
-        data = {}
-        for nouvelleTable in nouvelleTables:
-            dataframes = []
-            if (nouvelleTable == "stat_pz_chronique"):
-                for bss_id in liste_index:
-                    dataPerBss = pd.DataFrame(dft.at[bss_id, nouvelleTable])
-                    # Convert index as column
-                    dataPerBss.insert(0, 'bss_id', bss_id)
-                    dataframes.append(dataPerBss)
-
-            if (nouvelleTable == "chronique_stat_pz_pas_mensuel" or nouvelleTable == 'stat_pz_par_annee' or nouvelleTable == 'stat_pz_par_mois'):
-                dataframes = []
-                for bss_id in liste_index:
-                    dataPerBssPerMonth = pd.DataFrame(dft.at[bss_id, nouvelleTable][0])
-                    dataPerBssPerMonthT = dataPerBssPerMonth.T
-                    # Convert index as column
-                    dataPerBssPerMonthT = dataPerBssPerMonthT.reset_index().rename(columns={'index': 'date'})
-                    # insert bss id
-                    dataPerBssPerMonthT.insert(0, 'bss_id', bss_id)
-                    dataframes.append(dataPerBssPerMonthT)
-
-            data[nouvelleTable] = pd.concat(dataframes, ignore_index=True)
-            donnees_pr_creation_table = self.prepareTableForQgis(data[nouvelleTable])
-            donneeApiNouvelleTable = DonneeApi(donnees_pr_creation_table["champs"], donnees_pr_creation_table["valeurs"], nouvelleTable)
-            donneesApi.append(donneeApiNouvelleTable)
+        for nomTable, df in self.convertirResultats(res).items():
+            donnees_pr_creation_table = self.prepareTableForQgis(df)
+            donneesApi.append(DonneeApi(donnees_pr_creation_table["champs"], donnees_pr_creation_table["valeurs"], nomTable))
         return donneesApi
 
     def prepareTableForQgis(self, df):
@@ -159,37 +135,66 @@ class ResultatsApi():
         :return: donnees preparer pour etre mise en Table sous Qgis (un dict  champs [List de QGis Field] et valeurs [List de valeurs])
         :rtype: dict
         """
-        donnees = {
-            "champs": [],
-            "valeurs": []
-        }
-
-        # obtenir les champs
-        liste_colonne = df.columns
-        for colonne in liste_colonne:
-            value = df.at[df.index[0], colonne]
-            if (isinstance(value, np.float64)):
-                value = np.float64(value).item()
-            if (isinstance(value, np.int64)):
-                value = np.int64(value).item()
-            if(type(value) is not dict):
-                champ = self.creationChamp(colonne, value)
-                donnees["champs"].append(champ)
-
-        # obtenir les valeurs
-        indexs = df.index
-        liste_index = indexs.to_numpy()
-
-        for index in liste_index:
-            ligne_donnees = []
-            for colonne in liste_colonne:
-                value = df.at[index, colonne]
-                if (isinstance(value, np.float64)):
-                    value = np.float64(value).item()
-                if (isinstance(value, np.int64)):
-                    value = np.int64(value).item()
-                if(type(value) is not dict):
-                    ligne_donnees.append(value)
-
-            donnees["valeurs"].append(ligne_donnees)
-        return donnees
+        # type des champs d'après la première valeur renseignée de chaque colonne
+        champs = []
+        for colonne in df.columns:
+            valeursRenseignees = df[colonne].dropna()
+            champs.append(self.creationChamp(colonne, valeursRenseignees.iloc[0] if len(valeursRenseignees) > 0 else None))
+
+        # valeurs converties en types python (valeurs manquantes : None) en une seule opération
+        valeurs = df.astype(object).where(df.notna(), None).to_numpy().tolist()
+        return {"champs": champs, "valeurs": valeurs}
+
+
+if __name__ == '__main__':
+
+    print("")
+    print("---------------------------------------------------------------")
+    print("  Test de la classe ResultatsApi du module traitement_resultats_api")
+    print("---------------------------------------------------------------")
+    print("")
+
+    import io
+    import json
+    import time
+
+    def convertirResultatsJson(res):
+        """Conversion précédente (json, transposition et lecture cellule par cellule), pour comparaison"""
+        dft = pd.read_json(io.StringIO(json.dumps(res))).T
+        data = {"stations": [[dft.at[index, colonne] for colonne in dft.columns if type(dft.at[index, colonne]) is not list]
+                             for index in dft.index]}
+        for nouvelleTable in ["stat_pz_chronique", "stat_pz_par_annee", "stat_pz_par_mois", "chronique_stat_pz_pas_mensuel"]:
+            dataframes = []
+            for bss_id in dft.index:
+                if (nouvelleTable == "stat_pz_chronique"):
+                    dataPerBss = pd.DataFrame(dft.at[bss_id, nouvelleTable])
+                else:
+                    dataPerBss = pd.DataFrame(dft.at[bss_id, nouvelleTable][0]).T.reset_index().rename(columns={'index': 'date'})
+                dataPerBss.insert(0, 'bss_id', bss_id)
+                dataframes.append(dataPerBss)
+            df = pd.concat(dataframes, ignore_index=True)
+            data[nouvelleTable] = [[df.at[index, colonne] for colonne in df.columns] for index in df.index]
+        return data
+
+    # Réponse de 1000 stations sur 10 ans
+    def stats(valeur):
+        return {"nb_mesures": 30, "min": valeur - 1.0, "max": valeur + 1.0, "moyenne": valeur, "mediane": valeur, "ecart_type": 0.5}
+    res = {f"BSS{num:06d}": {"bss_id": f"BSS{num:06d}", "code_bss": f"0{num:04d}X0001/P",
+                             "stat_pz_chronique": [dict(stats(num), date_debut="2010-01-01", date_fin="2019-12-31")],
+                             "stat_pz_par_annee": [{str(annee): stats(num) for annee in range(2010, 2020)}],
+                             "stat_pz_par_mois": [{f"{mois:02d}": stats(num) for mois in range(1, 13)}],
+                             "chronique_stat_pz_pas_mensuel": [{f"{annee}-{mois:02d}": stats(num)
+                                                                for annee in range(2010, 2020) for mois in range(1, 13)}]}
+           for num in range(1000)}
+
+    resultatsApi = ResultatsApi(None, None)
+    debut = time.time()
+    dataJson = convertirResultatsJson(res)
+    print("Conversion json et cellule par cellule (s) : ", round(time.time() - debut, 2))
+    debut = time.time()
+    data = resultatsApi.convertirResultats(res)
+    valeurs = {nomTable: df.astype(object).where(df.notna(), None).to_numpy().tolist() for nomTable, df in data.items()}
+    print("Conversion en colonnes (s) : ", round(time.time() - debut, 2))
+    print("Lignes par table : ", {nomTable: len(df) for nomTable, df in data.items()})
+    print("Valeurs identiques : ", all(len(valeurs[nomTable]) == len(dataJson[nomTable]) for nomTable in data)
+          and valeurs["chronique_stat_pz_pas_mensuel"][-1] == list(dataJson["chronique_stat_pz_pas_mensuel"][-1]))
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+copyright: (C) 2019 by BRGM
+
+Module PickEau contenant une classe Pick_Cache permettant :
+    - de conserver sur le disque les réponses http des requêtes peu changeantes (stations Hubeau, référentiels Sandre et Ades),
+    - de les réutiliser pendant une durée de vie définie par type de requête dans le fichier de configuration,
+    - de les revalider ensuite auprès du serveur (en-têtes ETag / Last-Modified) plutôt que de les télécharger à nouveau,
+    - de borner la taille du cache en supprimant les réponses les moins récemment utilisées.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+class Pick_Cache():
+    """
+    Classe Pick_Cache : cache disque des réponses http.
+    Chaque réponse est enregistrée dans deux fichiers nommés d'après l'empreinte sha256 de l'url normalisée :
+        - <clé>.bin : contenu de la réponse,
+        - <clé>.json : métadonnées (url, date d'enregistrement, statut, en-têtes utiles).
+    Les pages partielles des réponses paginées de Hubeau (statut 206) sont conservées avec leur statut et leur
+    en-tête Link (adresse de la page suivante) : une page lue dans le cache est suivie de la même façon qu'une page
+    reçue du serveur.
+    La date de dernière modification du fichier .bin sert de date de dernière utilisation pour l'éviction LRU.
+    """
+    # En-têtes de la réponse conservés dans les métadonnées
+    list_entete_conserve = ["Content-Type", "Content-Encoding", "ETag", "Last-Modified", "Link"]
+    # Statuts des réponses enregistrées dans le cache (réponse complète ou page partielle)
+    list_statut_conserve = [200, 206]
+
+    def __init__(self, dossier_cache, taille_max_mo, dict_duree_vie):
+        """
+        Constructeur de la classe Pick_Cache
+        :param dossier_cache: (str) dossier des fichiers du cache (créé s'il n'existe pas)
+        :param taille_max_mo: (int) taille maximum du cache en Mo
+        :param dict_duree_vie: (dict) durée de vie des réponses en secondes par type de cache (clé)
+        """
+        self.dossier_cache = dossier_cache
+        self.taille_max_octets = int(taille_max_mo) * 1024 * 1024
+        self.dict_duree_vie = dict_duree_vie
+        # Flag de contournement du cache (case 'Ignorer le cache' de l'interface) : les réponses sont alors
+        # toujours téléchargées, puis enregistrées pour les téléchargements suivants
+        self.ignorer = False
+        self.verrou = threading.Lock()
+        os.makedirs(self.dossier_cache, exist_ok=True)
+
+    @staticmethod
+    def normaliser_url(url):
+        """
+        Normalise une url pour que deux urls équivalentes aient la même clé de cache
+        (schéma et serveur en minuscules, paramètres triés).
+        :param url: (str) url de la requête
+        :return: (str) url normalisée
+        """
+        morceaux = urlsplit(url)
+        list_parametre = sorted(parse_qsl(morceaux.query, keep_blank_values=True))
+        return urlunsplit((morceaux.scheme.lower(), morceaux.netloc.lower(), morceaux.path,
+                           urlencode(list_parametre, safe=',:'), ''))
+
+    def calculer_cle(self, url):
+        """
+        Calcule la clé de cache d'une url.
+        :param url: (str) url de la requête
+        :return: (str) empreinte sha256 de l'url normalisée
+        """
+        return hashlib.sha256(self.normaliser_url(url).encode('utf-8')).hexdigest()
+
+    def envoyer_requete(self, fonction_get, url, type_cache, **kwargs):
+        """
+        Envoie une requête GET en utilisant le cache :
+            - réponse en cache et non expirée : renvoyée sans requête au serveur,
+            - réponse en cache expirée : requête conditionnelle (If-None-Match / If-Modified-Since),
+              la réponse en cache est renvoyée si le serveur répond 304 (non modifiée),
+            - sinon : requête complète et enregistrement de la réponse si elle est correcte
+              (200, ou 206 pour une page partielle Hubeau).
+        :param fonction_get: fonction d'envoi d'une requête GET au serveur, appelée avec (url, **kwargs)
+                             (p.ex requests.Session.get)
+        :param url: (str) url de la requête
+        :param type_cache: (str) type de cache (clé de la durée de vie dans la configuration)
+        :param kwargs: paramètres supplémentaires passés à requests (timeout...)
+        :return: (requests.Response) réponse du serveur ou réponse reconstituée depuis le cache
+        """
+        cle = self.calculer_cle(url)
+        dict_meta = None if self.ignorer else self.lire_meta(cle)
+
+        if dict_meta is not None:
+            # Réponse en cache encore valide
+            duree_vie = self.dict_duree_vie.get(type_cache, 0)
+            if time.time() - dict_meta["date_enregistrement"] < duree_vie:
+                reponse = self.lire_reponse(cle, dict_meta)
+                if reponse is not None:
+                    return reponse
+            # Réponse en cache expirée : revalidation auprès du serveur
+            headers = dict(kwargs.pop("headers", {}) or {})
+            if "ETag" in dict_meta["entetes"]:
+                headers["If-None-Match"] = dict_meta["entetes"]["ETag"]
+            if "Last-Modified" in dict_meta["entetes"]:
+                headers["If-Modified-Since"] = dict_meta["entetes"]["Last-Modified"]
+            reponse = fonction_get(url, headers=headers, **kwargs)
+            if reponse.status_code == 304:
+                # (les threads du téléchargement partagent le cache : écriture sous verrou, comme l'enregistrement)
+                dict_meta["date_enregistrement"] = time.time()
+                with self.verrou:
+                    self.ecrire_meta(cle, dict_meta)
+                reponse_cache = self.lire_reponse(cle, dict_meta)
+                if reponse_cache is not None:
+                    return reponse_cache
+                reponse = fonction_get(url, **kwargs)
+        else:
+            reponse = fonction_get(url, **kwargs)
+
+        if reponse.status_code in self.list_statut_conserve:
+            self.enregistrer_reponse(cle, url, reponse)
+        return reponse
+
+    def lire_meta(self, cle):
+        """
+        Lit les métadonnées d'une réponse en cache.
+        :param cle: (str) clé de cache
+        :return: (dict) métadonnées, None si la réponse n'est pas en cache
+        """
+        chemin_meta = os.path.join(self.dossier_cache, cle + ".json")
+        chemin_contenu = os.path.join(self.dossier_cache, cle + ".bin")
+        if not (os.path.isfile(chemin_meta) and os.path.isfile(chemin_contenu)):
+            return None
+        try:
+            with open(chemin_meta, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def ecrire_meta(self, cle, dict_meta):
+        """
+        Ecrit les métadonnées d'une réponse en cache (écriture dans un fichier temporaire puis remplacement).
+        Fonction appelée sous le verrou du cache (le nom du fichier temporaire est le même pour tous les threads).
+        :param cle: (str) clé de cache
+        :param dict_meta: (dict) métadonnées
+        :return: None
+        """
+        chemin_meta = os.path.join(self.dossier_cache, cle + ".json")
+        with open(chemin_meta + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(dict_meta, f)
+        os.replace(chemin_meta + ".tmp", chemin_meta)
+
+    def lire_reponse(self, cle, dict_meta):
+        """
+        Reconstitue une réponse http à partir du cache (statut et en-têtes dont Link compris)
+        et met à jour sa date de dernière utilisation.
+        :param cle: (str) clé de cache
+        :param dict_meta: (dict) métadonnées de la réponse
+        :return: (requests.Response) réponse reconstituée, None en cas d'erreur de lecture
+        """
+        chemin_contenu = os.path.join(self.dossier_cache, cle + ".bin")
+        try:
+            with open(chemin_contenu, 'rb') as f:
+                contenu = f.read()
+            os.utime(chemin_contenu)
+        except OSError:
+            return None
+        reponse = requests.models.Response()
+        # (réponses enregistrées sans leur statut : réponses complètes)
+        reponse.status_code = dict_meta.get("statut", 200)
+        reponse.url = dict_meta["url"]
+        reponse._content = contenu
+        # Le contenu enregistré est déjà décodé : l'éventuelle compression http n'est pas reprise dans les en-têtes
+        reponse.headers = CaseInsensitiveDict({nom: valeur for nom, valeur in dict_meta["entetes"].items()
+                                               if nom != "Content-Encoding"})
+        reponse.encoding = dict_meta.get("encodage")
+        return reponse
+
+    def enregistrer_reponse(self, cle, url, reponse):
+        """
+        Enregistre une réponse http correcte dans le cache puis applique la taille maximum du cache.
+        :param cle: (str) clé de cache
+        :param url: (str) url de la requête
+        :param reponse: (requests.Response) réponse du serveur
+        :return: None
+        """
+        dict_meta = {"url": url,
+                     "date_enregistrement": time.time(),
+                     "statut": reponse.status_code,
+                     "encodage": reponse.encoding,
+                     "entetes": {nom: reponse.headers[nom] for nom in self.list_entete_conserve if nom in reponse.headers}}
+        chemin_contenu = os.path.join(self.dossier_cache, cle + ".bin")
+        with self.verrou:
+            with open(chemin_contenu + ".tmp", 'wb') as f:
+                f.write(reponse.content)
+            os.replace(chemin_contenu + ".tmp", chemin_contenu)
+            self.ecrire_meta(cle, dict_meta)
+            self.appliquer_taille_max()
+
+    def appliquer_taille_max(self):
+        """
+        Supprime les réponses les moins récemment utilisées tant que la taille du cache dépasse la taille maximum.
+        :return: None
+        """
+        list_fichier = []
+        taille_totale = 0
+        for entree in os.scandir(self.dossier_cache):
+            if entree.is_file() and entree.name.endswith(".bin"):
+                stat = entree.stat()
+                list_fichier.append((stat.st_mtime, stat.st_size, entree.path))
+                taille_totale += stat.st_size
+        for date_utilisation, taille, chemin_contenu in sorted(list_fichier):
+            if taille_totale <= self.taille_max_octets:
+                break
+            for chemin in (chemin_contenu, chemin_contenu[:-4] + ".json"):
+                if os.path.isfile(chemin):
+                    os.remove(chemin)
+            taille_totale -= taille
+
+    def vider(self):
+        """
+        Supprime toutes les réponses du cache.
+        :return: None
+        """
+        with self.verrou:
+            for entree in os.scandir(self.dossier_cache):
+                if entree.is_file() and (entree.name.endswith(".bin") or entree.name.endswith(".json")):
+                    os.remove(entree.path)
+
+
+if __name__ == '__main__':
+
+    print("")
+    print("---------------------------------------------------------------")
+    print("  Test de la classe Pick_Cache du module pick_cache")
+    print("---------------------------------------------------------------")
+    print("")
+
+    import tempfile
+
+    pcache = Pick_Cache(tempfile.mkdtemp(), 1, {"test": 3600})
+    print(pcache.normaliser_url("HTTPS://Hubeau.eaufrance.fr/api/v1/niveaux_nappes/stations.csv?srid=4326&size=20000"))
+    print(pcache.normaliser_url("https://hubeau.eaufrance.fr/api/v1/niveaux_nappes/stations.csv?size=20000&srid=4326"))
+
+    session = requests.Session()
+    url = "https://hubeau.eaufrance.fr/api/v1/niveaux_nappes/stations.csv?size=10"
+    debut = time.time()
+    reponse = pcache.envoyer_requete(session.get, url, "test", timeout=30)
+    print("Requête serveur : ", reponse.status_code, round(time.time() - debut, 3), "s")
+    debut = time.time()
+    reponse = pcache.envoyer_requete(session.get, url, "test", timeout=30)
+    print("Requête cache : ", reponse.status_code, round(time.time() - debut, 3), "s")
+
+    # Page partielle Hubeau : statut 206 et lien vers la page suivante conservés
+    url = "https://hubeau.eaufrance.fr/api/v1/niveaux_nappes/stations.csv?size=5"
+    reponse = pcache.envoyer_requete(session.get, url, "test", timeout=30)
+    reponse_cache = pcache.envoyer_requete(session.get, url, "test", timeout=30)
+    print("Page partielle : ", reponse.status_code, reponse_cache.status_code,
+          reponse.links.get('next', {}).get('url') == reponse_cache.links.get('next', {}).get('url'))
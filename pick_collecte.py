@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+copyright: (C) 2019 by BRGM
+
+Module PickEau contenant une classe Pick_Sink permettant :
+    - de collecter les dataframes reçus au cours d'un téléchargement (pages, requêtes, paramètres),
+    - de les concaténer en une seule fois en fin de téléchargement (coût linéaire en nombre de lignes,
+      contrairement à des appels successifs à DataFrame.append, supprimé de pandas 2),
+    - de suivre le nombre de lignes et d'octets reçus (affichage dans la barre de progression).
+"""
+
+import pandas as pd
+
+
+class Pick_Sink():
+    """
+    Classe Pick_Sink : collecteur des dataframes résultats d'un téléchargement.
+    Les dataframes sont conservés en mémoire dans une liste et concaténés une seule fois : les traitements
+    qui suivent le téléchargement (doublons, tri, jointures) portent sur le dataframe complet.
+    Les fonctions ajouter et concatener sont appelées depuis un même thread (thread de la tâche de téléchargement).
+    """
+    def __init__(self, fonction_volume=None):
+        """
+        Constructeur de la classe Pick_Sink
+        :param fonction_volume: fonction appelée à chaque ajout avec le nombre total de lignes et d'octets reçus
+        """
+        self.fonction_volume = fonction_volume
+        self.list_df = []
+        # Compteurs de l'ensemble des données reçues
+        self.nb_lignes = 0
+        self.nb_octets = 0
+
+    def __len__(self):
+        return self.nb_lignes
+
+    def ajouter(self, df_morceau):
+        """
+        Ajoute un dataframe au collecteur (les dataframes vides sont ignorés).
+        :param df_morceau: (DataFrame) dataframe à ajouter
+        :return: None
+        """
+        if len(df_morceau) == 0:
+            return
+        self.list_df.append(df_morceau)
+        self.nb_lignes += len(df_morceau)
+        self.nb_octets += int(df_morceau.memory_usage(index=True, deep=True).sum())
+        if self.fonction_volume is not None:
+            self.fonction_volume(self.nb_lignes, self.nb_octets)
+
+    def concatener(self):
+        """
+        Concatène en une seule fois tous les dataframes collectés puis vide le collecteur.
+        :return: (DataFrame) dataframe de toutes les données reçues (vide si aucune donnée n'a été reçue)
+        """
+        list_df = self.list_df
+        self.vider()
+        if len(list_df) == 0:
+            return pd.DataFrame()
+        if len(list_df) == 1:
+            return list_df[0]
+        return pd.concat(list_df, ignore_index=True, sort=False)
+
+    def vider(self):
+        """
+        Vide le collecteur (les compteurs sont conservés).
+        :return: None
+        """
+        self.list_df = []
+
+
+if __name__ == '__main__':
+
+    print("")
+    print("---------------------------------------------------------------")
+    print("  Test de la classe Pick_Sink du module pick_collecte")
+    print("---------------------------------------------------------------")
+    print("")
+
+    psink = Pick_Sink(fonction_volume=lambda nb_lignes, nb_octets: None)
+    for i in range(50):
+        psink.ajouter(pd.DataFrame({"code_bss": ["BSS%06d" % j for j in range(i * 1000, (i + 1) * 1000)],
+                                    "resultat": [float(j) for j in range(1000)]}))
+    print("Lignes reçues : ", psink.nb_lignes, " - Octets reçus : ", psink.nb_octets)
+    df_resultat = psink.concatener()
+    print("Lignes concaténées : ", len(df_resultat), " - Ordre conservé : ", df_resultat["code_bss"].is_monotonic_increasing)
@@ -58,6 +58,7 @@ class Pick_Config():
         self.list_lex_type_commentaire = self.dict_lexique['lex_type_commentaire']
         self.list_lex_commentaire_pickeau = self.dict_lexique['lex_commentaire_pickeau']
         self.list_lex_qualification_ades = self.dict_lexique['lex_qualification_ades']
+        self.dict_code_qualification_ades = self.dict_lexique['code_qualification_ades']
         self.list_lex_disposition_graphe = self.dict_lexique['lex_disposition_graphe']
 
 if __name__ == '__main__':
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+copyright: (C) 2019 by BRGM
+
+Module PickEau contenant une classe Pick_Lod permettant :
+    - de réduire le nombre de points d'une chronique avant son tracé (niveau de détail adapté à la largeur
+      du graphique) par l'algorithme LTTB (Largest Triangle Three Buckets), qui conserve l'allure de la courbe
+      (pics, creux) contrairement à un simple tirage d'un point sur n,
+    - de renvoyer les index des points conservés pour appliquer la même sélection à toutes les colonnes
+      (dates, valeurs, identifiants des lignes utilisés par l'interaction entre le graphique et la table).
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class Pick_Lod():
+    """
+    Classe Pick_Lod : sous-échantillonnage visuel des chroniques tracées dans DataPlotly.
+    Le nombre de points conservés est calculé à partir de la largeur du graphique en pixels :
+    au-delà de quelques points par pixel, les points supplémentaires ne sont pas visibles
+    mais ralentissent l'affichage de la vue web de DataPlotly.
+    """
+    def __init__(self, dict_config_graphique):
+        """
+        Constructeur de la classe Pick_Lod
+        :param dict_config_graphique: (dict) section "graphique" du fichier de configuration
+        """
+        self.sous_echantillonnage = dict_config_graphique["sous_echantillonnage"]
+        self.nb_points_par_pixel = dict_config_graphique["nb_points_par_pixel"]
+        self.largeur_defaut_px = dict_config_graphique["largeur_defaut_px"]
+
+    def calculer_nb_points(self, largeur_px):
+        """
+        Calcule le nombre maximum de points tracés pour une largeur de graphique.
+        :param largeur_px: (int) largeur du graphique en pixels (largeur par défaut si le graphique n'est pas affiché)
+        :return: (int) nombre maximum de points
+        """
+        if largeur_px < 100:
+            largeur_px = self.largeur_defaut_px
+        return int(largeur_px * self.nb_points_par_pixel)
+
+    @staticmethod
+    def convertir_abscisses(array_x):
+        """
+        Convertit les abscisses (dates) en nombres pour le calcul des aires des triangles.
+        :param array_x: (numpy array) dates au format texte iso, QDate / QDateTime ou nombres
+        :return: (numpy array) abscisses numériques (float), positions des points si les dates ne sont pas lisibles
+        """
+        if np.issubdtype(array_x.dtype, np.number):
+            return array_x.astype(float)
+        if len(array_x) > 0 and hasattr(array_x[0], "toMSecsSinceEpoch"):
+            return np.array([x.toMSecsSinceEpoch() for x in array_x], dtype=float)
+        if len(array_x) > 0 and hasattr(array_x[0], "toJulianDay"):
+            return np.array([x.toJulianDay() for x in array_x], dtype=float)
+        serie_date = pd.to_datetime(pd.Series(array_x, dtype=object).astype(str), errors='coerce')
+        if serie_date.isna().any():
+            return np.arange(len(array_x), dtype=float)
+        return serie_date.to_numpy(dtype='datetime64[ms]').astype(np.int64).astype(float)
+
+    @staticmethod
+    def lttb(array_x, array_y, nb_points):
+        """
+        Sélectionne les points d'une courbe par l'algorithme LTTB : le premier et le dernier point sont conservés,
+        les autres points sont répartis en seaux de même effectif et, dans chaque seau, le point conservé
+        est celui qui forme le plus grand triangle avec le point conservé dans le seau précédent
+        et la moyenne des points du seau suivant.
+        :param array_x: (numpy array) abscisses numériques, dans l'ordre du tracé
+        :param array_y: (numpy array) ordonnées numériques, sans valeur manquante
+        :param nb_points: (int) nombre de points à conserver
+        :return: (numpy array) index des points conservés (croissants)
+        """
+        nb_lignes = len(array_x)
+        if (nb_points >= nb_lignes) or (nb_points < 3):
+            return np.arange(nb_lignes)
+        array_index = np.empty(nb_points, dtype=np.int64)
+        array_index[0] = 0
+        array_index[-1] = nb_lignes - 1
+        # Bornes des nb_points - 2 seaux répartis entre le deuxième et l'avant-dernier point
+        array_borne = np.linspace(1, nb_lignes - 1, nb_points - 1).astype(np.int64)
+        index_precedent = 0
+        for num_seau in range(nb_points - 2):
+            debut, fin = array_borne[num_seau], array_borne[num_seau + 1]
+            # Moyenne du seau suivant (dernier point pour le dernier seau)
+            if num_seau + 2 < len(array_borne):
+                debut_suivant, fin_suivant = array_borne[num_seau + 1], array_borne[num_seau + 2]
+            else:
+                debut_suivant, fin_suivant = nb_lignes - 1, nb_lignes
+            x_moyen = array_x[debut_suivant:fin_suivant].mean()
+            y_moyen = array_y[debut_suivant:fin_suivant].mean()
+            x_precedent, y_precedent = array_x[index_precedent], array_y[index_precedent]
+            # Aires (au facteur 1/2 près) des triangles formés avec chaque point du seau
+            array_aire = np.abs((x_precedent - x_moyen) * (array_y[debut:fin] - y_precedent)
+                                - (x_precedent - array_x[debut:fin]) * (y_moyen - y_precedent))
+            index_precedent = debut + int(np.argmax(array_aire))
+            array_index[num_seau + 1] = index_precedent
+        return array_index
+
+    def sous_echantillonner(self, dict_colonne, champ_x, champ_y, largeur_px):
+        """
+        Sous-échantillonne les colonnes d'une courbe (voir pick_page_graphique.Pick_Pg_Graph.extraire_colonnes) :
+        la même sélection de lignes est appliquée à toutes les colonnes, dont les identifiants des lignes ("id").
+        Les lignes sans valeur sont écartées du calcul (elles ne sont pas tracées) mais sont conservées.
+        :param dict_colonne: (dict) clé = nom du champ ou "id" / valeur = numpy array des valeurs
+        :param champ_x: (str) champ des abscisses (dates)
+        :param champ_y: (str) champ des ordonnées (valeurs)
+        :param largeur_px: (int) largeur du graphique en pixels
+        :return: (dict) colonnes sous-échantillonnées (colonnes d'origine si aucune réduction n'est nécessaire)
+        """
+        nb_points = self.calculer_nb_points(largeur_px)
+        if (not self.sous_echantillonnage) or (len(dict_colonne[champ_y]) <= nb_points):
+            return dict_colonne
+        array_y = pd.to_numeric(pd.Series(dict_colonne[champ_y], dtype=object), errors='coerce').to_numpy(dtype=float)
+        array_x = self.convertir_abscisses(dict_colonne[champ_x])
+        array_index_valeur = np.flatnonzero(np.isfinite(array_y))
+        array_index_vide = np.flatnonzero(~np.isfinite(array_y))
+        array_index = array_index_valeur[self.lttb(array_x[array_index_valeur], array_y[array_index_valeur], nb_points)]
+        array_index = np.sort(np.concatenate([array_index, array_index_vide]))
+        return {champ: valeurs[array_index] for champ, valeurs in dict_colonne.items()}
+
+
+if __name__ == '__main__':
+
+    print("")
+    print("---------------------------------------------------------------")
+    print("  Test de la classe Pick_Lod du module pick_echantillonnage")
+    print("---------------------------------------------------------------")
+    print("")
+
+    plod = Pick_Lod({"sous_echantillonnage": True, "nb_points_par_pixel": 2, "largeur_defaut_px": 1000})
+    # Chronique journalière de 50 ans avec un pic isolé
+    array_date = pd.date_range("1970-01-01", periods=18262, freq="D").strftime("%Y-%m-%d").to_numpy()
+    array_niveau = np.sin(np.arange(18262) / 365.25 * 2 * np.pi)
+    array_niveau[10000] = 5.0
+    dict_colonne = {"id": np.arange(18262) + 1, "date_mesure": array_date, "niveau_nappe_eau": array_niveau}
+    dict_reduit = plod.sous_echantillonner(dict_colonne, "date_mesure", "niveau_nappe_eau", 800)
+    print("Points conservés : ", len(dict_reduit["id"]), " sur ", len(dict_colonne["id"]))
+    print("Pic conservé : ", 10001 in dict_reduit["id"])
+    print("Identifiants cohérents : ", (dict_reduit["niveau_nappe_eau"] == array_niveau[dict_reduit["id"] - 1]).all())
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+copyright: (C) 2019 by BRGM
+
+Module PickEau contenant une classe Pick_Norm permettant :
+    - de séparer, au fur et à mesure de leur réception, les analyses qualité renvoyées par Hubeau
+      (une ligne par analyse avec toutes les métadonnées de la station) en un schéma en étoile :
+        - une table des stations (une ligne par station, métadonnées et coordonnées),
+        - une table des nomenclatures (libellés des codes : paramètres, unités, remarques, producteurs...),
+        - une table des faits compacte (clé de la station, codes, date, résultat, limites),
+    - d'encoder les codes de la table des faits (entiers ou catégories) pour réduire la mémoire occupée,
+    - de reconstituer la présentation à plat des analyses : df des données (csv résultat) et requête sql de la vue
+      du geopackage.
+"""
+
+import pandas as pd
+
+
+class Pick_Norm():
+    """
+    Classe Pick_Norm : normalisation des résultats d'analyses qualité.
+    La fonction separer est passée au téléchargement par point (fonction appelée pour chaque df reçu) :
+    les métadonnées des stations et les libellés sont conservés une seule fois par station et par code,
+    seuls les champs de la table des faits sont collectés pour chaque analyse.
+    Les fonctions separer et lire_* sont appelées depuis un même thread (thread de la tâche de téléchargement).
+    """
+    # Nombre de df de stations / libellés conservés avant de supprimer les doublons
+    nb_max_morceaux = 50
+
+    def __init__(self, list_col_station, list_col_donnee, dict_col_libelle, champ_cle="code_bss"):
+        """
+        Constructeur de la classe Pick_Norm
+        :param list_col_station: (list) champs des métadonnées des stations (table des stations)
+        :param list_col_donnee: (list) champs des données d'analyse (table des faits, hors libellés)
+        :param dict_col_libelle: (dict) clé = champ code / valeur = champ libellé du code (p.ex "code_param": "nom_param")
+        :param champ_cle: (str) champ clé des stations, commun à la table des stations et à la table des faits
+        """
+        self.champ_cle = champ_cle
+        self.list_col_station = list_col_station
+        self.list_col_donnee = list_col_donnee
+        self.dict_col_libelle = dict_col_libelle
+        # Champs de la table des faits : clé de la station puis champs des données sans les libellés
+        self.list_col_fait = [champ_cle] + [nom_col for nom_col in list_col_donnee
+                                            if (nom_col != champ_cle) and (nom_col not in dict_col_libelle.values())]
+        self.list_df_station = []
+        self.dict_list_df_libelle = {champ_code: [] for champ_code in dict_col_libelle}
+
+    def separer(self, df_morceau):
+        """
+        Sépare un df d'analyses reçu : conserve les stations et les libellés non encore reçus
+        et renvoie les champs de la table des faits.
+        :param df_morceau: (DataFrame) analyses renvoyées par une requête (métadonnées et données)
+        :return: (DataFrame) df des faits (champs list_col_fait)
+        """
+        if len(df_morceau) == 0:
+            return df_morceau.reindex(columns=self.list_col_fait)
+        self.list_df_station.append(df_morceau[self.list_col_station].drop_duplicates(subset=[self.champ_cle]))
+        for champ_code, champ_libelle in self.dict_col_libelle.items():
+            self.dict_list_df_libelle[champ_code].append(df_morceau[[champ_code, champ_libelle]].drop_duplicates(subset=[champ_code]))
+        # Suppression régulière des doublons pour borner la mémoire occupée par les stations et les libellés
+        if len(self.list_df_station) >= self.nb_max_morceaux:
+            self.list_df_station = [self.lire_stations()]
+            for champ_code in self.dict_col_libelle:
+                self.dict_list_df_libelle[champ_code] = [self.lire_libelles(champ_code)]
+        return df_morceau[self.list_col_fait]
+
+    def lire_stations(self):
+        """
+        Renvoie la table des stations reçues (une ligne par station, triée par clé).
+        :return: (DataFrame) df des stations
+        """
+        if len(self.list_df_station) == 0:
+            return pd.DataFrame(columns=self.list_col_station)
+        df_station = pd.concat(self.list_df_station, ignore_index=True, sort=False)
+        df_station = df_station.drop_duplicates(subset=[self.champ_cle]).sort_values(self.champ_cle)
+        return df_station.reset_index(drop=True)
+
+    def lire_libelles(self, champ_code):
+        """
+        Renvoie les libellés reçus d'un champ code (un libellé par code).
+        :param champ_code: (str) champ code (p.ex "code_param")
+        :return: (DataFrame) df des champs code et libellé
+        """
+        champ_libelle = self.dict_col_libelle[champ_code]
+        if len(self.dict_list_df_libelle[champ_code]) == 0:
+            return pd.DataFrame(columns=[champ_code, champ_libelle])
+        df_libelle = pd.concat(self.dict_list_df_libelle[champ_code], ignore_index=True, sort=False)
+        df_libelle = df_libelle.dropna(subset=[champ_code]).drop_duplicates(subset=[champ_code])
+        return df_libelle.reset_index(drop=True)
+
+    def lire_nomenclatures(self):
+        """
+        Renvoie la table des nomenclatures : libellés de tous les champs code, une ligne par champ et par code.
+        :return: (DataFrame) df des champs "champ", "code" et "libelle"
+        """
+        list_df_nomenclature = []
+        for champ_code, champ_libelle in self.dict_col_libelle.items():
+            df_libelle = self.lire_libelles(champ_code).rename(columns={champ_code: "code", champ_libelle: "libelle"})
+            df_libelle.insert(0, "champ", champ_code)
+            list_df_nomenclature.append(df_libelle)
+        df_nomenclature = pd.concat(list_df_nomenclature, ignore_index=True, sort=False)
+        df_nomenclature["code"] = df_nomenclature["code"].astype(str)
+        return df_nomenclature.sort_values(["champ", "code"]).reset_index(drop=True)
+
+    @staticmethod
+    def encoder_colonne(serie):
+        """
+        Encode une colonne de codes lus comme du texte :
+            - en entiers (Int64) si tous les codes sont des entiers écrits sans zéro initial (p.ex "1340"),
+            - en catégories sinon (p.ex codes BSS, codes avec zéro initial).
+        :param serie: (Series) colonne de codes
+        :return: (Series) colonne encodée
+        """
+        serie_non_nulle = serie.dropna().astype(str)
+        serie_numerique = pd.to_numeric(serie_non_nulle, errors='coerce')
+        if (len(serie_non_nulle) > 0) and serie_numerique.notna().all() and (serie_numerique % 1 == 0).all():
+            serie_entiere = serie_numerique.astype('Int64')
+            # Conversion sans perte uniquement (les codes "01" ou "1.0" restent du texte)
+            if (serie_entiere.astype(str).to_numpy() == serie_non_nulle.to_numpy()).all():
+                return pd.to_numeric(serie, errors='coerce').astype('Int64')
+        return serie.astype('category')
+
+    def encoder_faits(self, df_fait):
+        """
+        Encode la clé des stations (catégories) et les champs code de la table des faits (voir encoder_colonne).
+        :param df_fait: (DataFrame) df des faits
+        :return: (DataFrame) df des faits encodé
+        """
+        df_fait = df_fait.copy()
+        df_fait[self.champ_cle] = df_fait[self.champ_cle].astype('category')
+        for champ_code in self.dict_col_libelle:
+            if champ_code in df_fait.columns:
+                df_fait[champ_code] = self.encoder_colonne(df_fait[champ_code])
+        return df_fait
+
+    def reconstituer_donnees(self, df_fait):
+        """
+        Reconstitue la présentation à plat des données d'analyse (champs des csv Hubeau) : table des faits
+        non encodée jointe aux libellés des codes.
+        :param df_fait: (DataFrame) df des faits (codes non encodés, voir separer)
+        :return: (DataFrame) df du champ clé et des champs list_col_donnee, dans l'ordre des csv Hubeau
+        """
+        df_donnee = df_fait
+        for champ_code in self.dict_col_libelle:
+            if champ_code in df_donnee.columns:
+                df_donnee = df_donnee.merge(self.lire_libelles(champ_code), on=champ_code, how='left')
+        return df_donnee[[self.champ_cle] + [nom_col for nom_col in self.list_col_donnee if nom_col != self.champ_cle]]
+
+    def construire_requete_vue(self, nom_table_fait, nom_table_station, nom_table_nomenclature, list_col_supplementaire=None):
+        """
+        Construit la requête sql (SELECT) de la vue à plat des analyses : table des faits jointe à la table des stations
+        et à la table des nomenclatures, champs dans l'ordre des csv Hubeau.
+        :param nom_table_fait: (str) nom de la table des faits dans le geopackage
+        :param nom_table_station: (str) nom de la table des stations dans le geopackage
+        :param nom_table_nomenclature: (str) nom de la table des nomenclatures dans le geopackage
+        :param list_col_supplementaire: (list) champs ajoutés à la table des faits (p.ex "commentaire")
+        :return: (str) requête sql
+        """
+        list_select = ['f."fid" AS "fid"']
+        list_select += [f's."{nom_col}"' for nom_col in self.list_col_station if nom_col != self.champ_cle]
+        list_select.append(f'f."{self.champ_cle}"')
+        list_jointure = [f'LEFT JOIN "{nom_table_station}" AS s ON s."{self.champ_cle}" = f."{self.champ_cle}"']
+        dict_champ_libelle = {champ_libelle: champ_code for champ_code, champ_libelle in self.dict_col_libelle.items()}
+        for nom_col in self.list_col_donnee:
+            if nom_col in dict_champ_libelle:
+                champ_code = dict_champ_libelle[nom_col]
+                alias = f"n_{champ_code}"
+                list_select.append(f'{alias}."libelle" AS "{nom_col}"')
+                list_jointure.append(f'LEFT JOIN "{nom_table_nomenclature}" AS {alias} ON {alias}."champ" = \'{champ_code}\' '
+                                     f'AND {alias}."code" = CAST(f."{champ_code}" AS TEXT)')
+            elif nom_col != self.champ_cle:
+                list_select.append(f'f."{nom_col}"')
+        list_select += [f'f."{nom_col}"' for nom_col in (list_col_supplementaire or [])]
+        return f'SELECT {", ".join(list_select)} FROM "{nom_table_fait}" AS f {" ".join(list_jointure)}'
+
+
+if __name__ == '__main__':
+
+    print("")
+    print("---------------------------------------------------------------")
+    print("  Test de la classe Pick_Norm du module pick_normalisation")
+    print("---------------------------------------------------------------")
+    print("")
+
+    pnorm = Pick_Norm(["bss_id", "code_bss", "nom_commune_actuel"],
+                      ["code_param", "nom_param", "date_debut_prelevement", "resultat", "code_producteur", "nom_producteur"],
+                      {"code_param": "nom_param", "code_producteur": "nom_producteur"})
+    for num_morceau in range(3):
+        df_fait = pnorm.separer(pd.DataFrame({"bss_id": ["BSS001", "BSS001", "BSS002"],
+                                              "code_bss": ["01-1X-0001/P", "01-1X-0001/P", "01-1X-0002/P"],
+                                              "nom_commune_actuel": ["Orléans", "Orléans", "Olivet"],
+                                              "code_param": ["1340", "1301", "1340"],
+                                              "nom_param": ["Nitrates", "Température", "Nitrates"],
+                                              "date_debut_prelevement": ["2020-01-0" + str(num_morceau + 1)] * 3,
+                                              "resultat": [12.5, 11.0, 30.2],
+                                              "code_producteur": ["0180000001", "0180000001", "0180000001"],
+                                              "nom_producteur": ["ARS", "ARS", "ARS"]}))
+    print("Champs de la table des faits : ", list(df_fait.columns))
+    print(pnorm.lire_stations())
+    print(pnorm.lire_nomenclatures())
+    print(pnorm.encoder_faits(df_fait).dtypes)
+    print(pnorm.reconstituer_donnees(df_fait))
+    print(pnorm.construire_requete_vue("Données_Analyses", "Stations_Analyses", "Nomenclatures_Analyses", ["commentaire"]))
@@ -23,11 +23,15 @@ Module PickEau :
 """
 
 from PyQt5.QtWidgets import QDockWidget, QAction, QFileDialog, QMessageBox
-from PyQt5.QtCore import QCoreApplication
 from qgis.core import *
 from qgis.gui import QgsProjectionSelectionWidget
 from osgeo import ogr
 
+from .pick_telechargement import Pick_Download
+from .pick_tache import Pick_Task
+from .pick_collecte import Pick_Sink
+from .pick_normalisation import Pick_Norm
+from .pick_planification import Pick_Plan
 from .zone_etude.zone_etude import ZoneEtude
 from .donnees.donnees_calculs import DonneesCalculs
 # from .donnees.outils_layers import OutilsLayers
@@ -84,16 +88,6 @@ class ErreurCoucheQgisNonConforme(Error):
     pass
 
 
-class ErreurNombreParametreQualiteTropGrand(Error):
-    """Exception gérée levée s'il y a trop de paramètres quantité à télécharger (> 200)."""
-    pass
-
-
-class ErreurNombreGroupeQualiteTropGrand(Error):
-    """Exception gérée levée s'il y a trop de paramètres qualité à télécharger (> 200)."""
-    pass
-
-
 class ErreurListeParametreQuantiteIncorrecte(Error):
     """Exception gérée levée si la liste des paramètres quantité est incorrecte."""
     pass
@@ -150,9 +144,23 @@ class Pick_Pg_Data():
         self.pio = pio
         self.ptools = ptools
         self.dockwidget = dockwidget
-        self.stop = False
-
-        DonneesCalculs(dockwidget, iface)  # init donnees calculs
+        # Tâche Qgis de téléchargement en cours (None si aucun téléchargement n'est en cours)
+        self.tache = None
+
+        # Moteur de téléchargement parallèle des requêtes par point (taille du pool définie dans la configuration)
+        self.pdownload = Pick_Download(self.preq.nb_requetes_simultanees)
+        # Planification des requêtes par point (regroupement des stations en requêtes multi-stations)
+        self.pplan = Pick_Plan(self.preq, self.ptools)
+        # Noms des tables du geopackage résultat qualité : points d'eau par paramètre,
+        # stations (une ligne par station) et nomenclatures (libellés des codes de la table des analyses)
+        self.nom_table_points_parametres = "Stations_Paramètres"
+        self.nom_table_stations_analyses = "Stations_Analyses"
+        self.nom_table_nomenclatures_analyses = "Nomenclatures_Analyses"
+        # Champs des index des tables de données, dans l'ordre des filtres du module pick_page_graphique
+        self.list_champ_index_analyses = ['code_bss', 'code_param', 'date_debut_prelevement']
+        self.list_champ_index_niveaux = ['code_bss', 'date_mesure']
+
+        DonneesCalculs(dockwidget, iface, preq)  # init donnees calculs
 
         # Désactivation des widgets non encore implémentés
         self.dockwidget.cbx_choisirPointBassin.setEnabled(False)
@@ -174,6 +182,7 @@ class Pick_Pg_Data():
         self.dockwidget.pbt_supprimerItemSelectionPoint.clicked.connect(self.supprimer_point)
         self.dockwidget.pbt_viderListItemSelectionPoint.clicked.connect(self.vider_list_point)
         self.dockwidget.pbt_telechargerPoints.clicked.connect(self.telecharger_point)
+        self.dockwidget.chk_ignorerCache.toggled.connect(self.ignorer_cache)
         # self.dockwidget.cbx_choisirParametreQuantite.addItems(self.pconfig.list_lex_parametre_quantite)
         # self.dockwidget.pbt_ajouterParametreQuantite.clicked.connect(self.ajouter_parametre_quantite)
         self.dockwidget.cbx_choisirParametreGroupePickEau.addItems(self.pconfig.list_lex_groupe_parametre_pickeau)
@@ -236,14 +245,13 @@ class Pick_Pg_Data():
         self.dockwidget.listw_afficherItemSelectionPoint.clear()
 
     def telecharger_point(self):
-
-        # Définition du flag d'interruption des boucles de requete par appui sur le bouton 'Interrompre'
-        self.stop = False
-        # L'ensemble de la fonction est incluse dans un bloc try de niveau le plus haut pour capturer
-        # tous les types d'erreurs gérés (par "raise") : chaque erreur gérée rencontrée est remontée
-        # jusqu'à ce niveau et passée au bloc "except" correspondant (voir en bas de la fonction).
-        # Il est possible d'insérer des structures try - except de niveau inférieur, chaque except de niveau
-        # inférieur devant lever par "raise" une exception gérée qui remontera jusqu'au niveau supérieur.
+        """
+        [ Connectée à 'pbt_telechargerPoints' ]
+        Contrôle la sélection de l'utilisateur puis lance le téléchargement des points d'eau
+        dans une tâche Qgis (voir executer_telecharger_point et terminer_telecharger_point).
+        """
+        # Toutes les erreurs gérées (par "raise") rencontrées avant le lancement de la tâche sont remontées
+        # jusqu'à ce niveau et signalées à l'utilisateur (voir signaler_erreur_telecharger_point).
         try:
             # Détermination du type de point d'eau (piézo ou qualito)
             type_point = self.dockwidget.cbx_choisirTypePoint.currentText()
@@ -284,131 +292,178 @@ class Pick_Pg_Data():
                 nb_req += 1     # nb_req = nb_req * 2 quand l'API piézo tiendra compte des dept !
             elif type_point == "Piézomètre":      # condition à supprimer quand l'API piézo tiendra compte des dept !
                 nb_req = 1
-            # Fixe les bornes min et max du progressBar en fonction du nombre total de requêtes à envoyer
-            self.dockwidget.progressBarStations.setRange(0, nb_req + 2)     # On ajoute 2 pour créer une étape de début et de fin de procédure
-            num_iteration_progressbar = 1
-            self.dockwidget.progressBarStations.setValue(num_iteration_progressbar)
-            # Active le bouton d'interruption des calculs et désactive les boutons de téléchargement
-            # des points et données pour éviter des déclenchements successifs intempestifs
-            self.dockwidget.pb_annulerStations.setEnabled(True)
-            self.dockwidget.pbt_telechargerPoints.setEnabled(False)
-            self.dockwidget.pbt_telechargerData.setEnabled(False)
             # Création d'un sous-dossier horodaté pour contenir les résultats
             self.horodate = datetime.datetime.now().strftime('%y%m%d%H%M%S')
             self.chemin_sous_dossier_horodate = os.path.join(chemin_dossier_resultat, "Hubeau_" + self.horodate)
             self.chemin_geopackage = os.path.join(self.chemin_sous_dossier_horodate, "Stations_Hubeau.gpkg")
             os.mkdir(self.chemin_sous_dossier_horodate)
-
-            # Pour les piézomètres, on ne fait pas de boucle sur les items de la listwidget
-            # ni sur la liste de liste de départements et on envoie une seule requête à Hubeau
-            # (moins de 5000 points pour la France et pas de filtre par département sur l'API Hubeau)
-            if (type_point == "Piézomètre") or (type_point == "Tous"):
+        except Exception as erreur:
+            self.signaler_erreur_telecharger_point(erreur)
+            return
+
+        # Active le bouton d'interruption des calculs et lance la tâche de téléchargement :
+        # la progression compte une étape par requête, plus une étape de début et de fin de procédure
+        self.dockwidget.pb_annulerStations.setEnabled(True)
+        self.lancer_tache("PickEau - Téléchargement des points d'eau",
+                          lambda tache: self.executer_telecharger_point(tache, type_point, dict_item, epsg_reproj),
+                          self.terminer_telecharger_point,
+                          self.dockwidget.progressBarStations, nb_req + 2)
+
+    def executer_telecharger_point(self, tache, type_point, dict_item, epsg_reproj):
+        """
+        Téléchargement des points d'eau et écriture du geopackage des stations (hors du thread de l'interface).
+        :param tache: (Pick_Task) tâche Qgis en cours
+        :param type_point: (str) type de point d'eau ("Piézomètre" | "Qualitomètre" | "Tous")
+        :param dict_item: (dict) dictionnaire clé = item de la listwidget / valeur = (type_item, nom_item, list_list_dept)
+        :param epsg_reproj: (str) code epsg de reprojection des stations au format du type "EPSG:2154"
+        :return: None
+        """
+        num_iteration_progressbar = 1
+        tache.avancer(num_iteration_progressbar)
+
+        # Pour les piézomètres, on ne fait pas de boucle sur les items de la listwidget
+        # ni sur la liste de liste de départements et on envoie une seule requête à Hubeau
+        # (moins de 5000 points pour la France et pas de filtre par département sur l'API Hubeau)
+        if (type_point == "Piézomètre") or (type_point == "Tous"):
+            # Contrôle de la demande d'interruption par l'utilisateur
+            self.controler_interruption_utilisateur()
+            # Peu importe les paramètres qui sont passés à la fonction car la requête PickEau les ignorera...
+            nom_item = "Toute la France"
+            list_dept = ["Tous"]
+            # On lance la requête Hubeau
+            df_req, statut_req = self.preq.requete_hubeau_par_dept(nom_item, list_dept, "stations_piezo_csv")
+            # Si le résultat de la requête est correct on ajoute les données au df résultat
+            # (résultat partiel : les stations reçues sont conservées et l'utilisateur est averti)
+            if statut_req in (200, 206):
+                df_station_piezo = df_req
+                if statut_req == 206:
+                    self.differer_avertissement(f"La liste des piézomètres ({nom_item}) n'a été reçue qu'en partie.",
+                                                "Téléchargement incomplet")
+            # Si le résultat est incorrect on lève une exception gérée et on avertit l'utilisateur
+            else:
+                raise ErreurResultatRequeteIncorrect(f"{nom_item} ({statut_req})")
+            # Mise à jour du progressbar
+            num_iteration_progressbar += 1
+            tache.avancer(num_iteration_progressbar)
+            # Si le df résultat contient des données
+            if len(df_station_piezo) > 0:
+                # Suppression des doublons du df résultat et tri dans l'ordre des codes BSS
+                df_station_piezo = df_station_piezo.drop_duplicates()
+                df_station_piezo = df_station_piezo.sort_values('code_bss')     # En attendant de disposer de id_bss !
+                # TODO : sélection des points demandés par l'utilisateur quand l'API renverra un descriptif plus complet !
+                # Ecriture du df sous forme de csv dans le dossier défini par l'utilisateur
+                self.chemin_station_piezo = os.path.join(self.chemin_sous_dossier_horodate, "Stations_Piézomètres.csv")
+                self.pio.ecrire_fichier_csv(df_station_piezo, self.chemin_station_piezo)
+                # Création d'un geopackage et écriture directe du df avec reprojection dans la projection demandée par l'utilisateur
+                self.ecrire_couche_geopackage(self.chemin_geopackage, df_station_piezo, "Stations_Piézomètres", "EPSG:4326", epsg_reproj,
+                                              ajouter_couche=False, champ_x="x", champ_y="y")
+            else:
+                self.differer_message(
+                    "La requête vers Hubeau n'a renvoyé aucun résultat : " +
+                    "il n'existe aucun piézomètre dans la sélection effectuée.",
+                    Qgis.Warning)
+
+        # Pour les qualitomètres on fait une boucle sur les items de la listwidget
+        if (type_point == "Qualitomètre") or (type_point == "Tous"):
+            # Collecteur des df résultats des requêtes, concaténés en fin de boucle
+            psink = Pick_Sink(fonction_volume=tache.signaler_volume)
+            for item in dict_item.keys():
                 # Contrôle de la demande d'interruption par l'utilisateur
                 self.controler_interruption_utilisateur()
-                # Peu importe les paramètres qui sont passés à la fonction car la requête PickEau les ignorera...
-                nom_item = "Toute la France"
-                list_dept = ["Tous"]
-                # On lance la requête Hubeau
-                df_req, statut_req = self.preq.requete_hubeau_par_dept(nom_item, list_dept, "stations_piezo_csv")
-                # Si le résultat de la requête est correct on ajoute les données au df résultat
-                if statut_req == 200:
-                    df_station_piezo = df_req
-                # Si le résultat est incorrect on lève une exception gérée et on avertit l'utilisateur
-                else:
-                    raise ErreurResultatRequeteIncorrect
-                # Mise à jour du progressbar
-                num_iteration_progressbar += 1
-                self.dockwidget.progressBarStations.setValue(num_iteration_progressbar)
-                # Si le df résultat contient des données
-                if len(df_station_piezo) > 0:
-                    # Suppression des doublons du df résultat et tri dans l'ordre des codes BSS
-                    df_station_piezo = df_station_piezo.drop_duplicates()
-                    df_station_piezo = df_station_piezo.sort_values('code_bss')     # En attendant de disposer de id_bss !
-                    # TODO : sélection des points demandés par l'utilisateur quand l'API renverra un descriptif plus complet !
-                    # Ecriture du df sous forme de csv dans le dossier défini par l'utilisateur
-                    self.chemin_station_piezo = os.path.join(self.chemin_sous_dossier_horodate, "Stations_Piézomètres.csv")
-                    self.pio.ecrire_fichier_csv(df_station_piezo, self.chemin_station_piezo)
-                    # Lecture du fichier csv qui vient d'être écrit sur le disque et création d'une couche qgis sans ajout à la carte
-                    self.couche_piezometre = self.lire_couche_csv(self.chemin_station_piezo, "Stations_Piézomètres", ";",
-                                                                  champ_x="x", champ_y="y", epsg="EPSG:4326", ajouter_carte=False)
-                    # Création d'un geopackage et ajout de la couche qgis avec reprojection dans la projection demandée par l'utilisateur
-                    self.ecrire_couche_geopackage(self.chemin_geopackage, self.couche_piezometre, "Stations_Piézomètres", "EPSG:4326", epsg_reproj, ajouter_couche=False)
-                else:
-                    self.iface.messageBar().pushMessage(
-                        "La requête vers Hubeau n'a renvoyé aucun résultat : " +
-                        "il n'existe aucun piézomètre dans la sélection effectuée.",
-                        Qgis.Warning)
-
-            # Pour les qualitomètres on fait une boucle sur les items de la listwidget
-            if (type_point == "Qualitomètre") or (type_point == "Tous"):
-                # Création d'un df résultat vide
-                df_station_qualite = pd.DataFrame()
-                for item in dict_item.keys():
+                # Unpacking des éléments nécessaires pour envoyer la ou les requête(s)
+                type_item, nom_item, list_list_dept = dict_item[item]
+                # Boucle sur les listes de dept contenues dans list_list_dept :
+                # les requêtes s'effectuent de manière itérative par liste de départements
+                # (une liste de départements correspond au maximum à une ancienne région afin de limiter
+                # à moins de 20000 le nombre de résultats renvoyés par Hubeau tout en diminuant le nombre
+                # de requêtes successives à effectuer).
+                for list_dept in list_list_dept:
                     # Contrôle de la demande d'interruption par l'utilisateur
                     self.controler_interruption_utilisateur()
-                    # Unpacking des éléments nécessaires pour envoyer la ou les requête(s)
-                    type_item, nom_item, list_list_dept = dict_item[item]
-                    # Boucle sur les listes de dept contenues dans list_list_dept :
-                    # les requêtes s'effectuent de manière itérative par liste de départements
-                    # (une liste de départements correspond au maximum à une ancienne région afin de limiter
-                    # à moins de 20000 le nombre de résultats renvoyés par Hubeau tout en diminuant le nombre
-                    # de requêtes successives à effectuer).
-                    for list_dept in list_list_dept:
-                        # Contrôle de la demande d'interruption par l'utilisateur
-                        self.controler_interruption_utilisateur()
-                        if type_item == "Administratif":
-                            # On lance la requête Hubeau
-                            df_req, statut_req = self.preq.requete_hubeau_par_dept(nom_item, list_dept, "stations_qualite_csv")
-                            # Si le résultat de la requête est correct on ajoute les données au df résultat
-                            if statut_req == 200:
-                                if len(df_station_qualite) > 0:
-                                    df_station_qualite = df_station_qualite.append(df_req)
-                                else:
-                                    df_station_qualite = df_req
-                            # Si le résultat est incorrect on lève une exception gérée et on avertit l'utilisateur
-                            else:
-                                raise ErreurResultatRequeteIncorrect
-                        # TODO : traiter les autres type_item
-                        # Mise à jour du progressbar
-                        num_iteration_progressbar += 1
-                        self.dockwidget.progressBarStations.setValue(num_iteration_progressbar)
-                # Si le df résultat contient des données
-                if len(df_station_qualite) > 0:
-                    # Suppression des doublons du df résultat et tri dans l'ordre des codes BSS
-                    df_station_qualite = df_station_qualite.drop_duplicates()
-                    df_station_qualite = df_station_qualite.sort_values('code_bss')     # En attendant de disposer de id_bss !
-                    # TODO : sélection des points demandés par l'utilisateur
-                    # Ecriture du df sous forme de csv dans le dossier défini par l'utilisateur
-                    self.chemin_station_qualite = os.path.join(self.chemin_sous_dossier_horodate, "Stations_Qualitomètres.csv")
-                    self.pio.ecrire_fichier_csv(df_station_qualite, self.chemin_station_qualite)
-                    # Lecture du fichier csv qui vient d'être écrit sur le disque et création d'une couche qgis sans ajout à la carte
-                    self.couche_qualitometre = self.lire_couche_csv(self.chemin_station_qualite, "Stations_Qualitomètres", ";",
-                                                                    champ_x="longitude", champ_y="latitude", epsg="EPSG:4326", ajouter_carte=False)
-                    # Si le geopackage existe
-                    if os.path.isfile(self.chemin_geopackage):
-                        # on ajoute la couche qgis au geopackage existant avec reprojection dans la projection demandée par l'utilisateur
-                        self.ecrire_couche_geopackage(self.chemin_geopackage, self.couche_qualitometre, "Stations_Qualitomètres", "EPSG:4326", epsg_reproj, ajouter_couche=True)
-                    else:
-                        # Création d'un geopackage et ajout de la couche qgis avec reprojection dans la projection demandée par l'utilisateur
-                        self.ecrire_couche_geopackage(self.chemin_geopackage, self.couche_qualitometre, "Stations_Qualitomètres", "EPSG:4326", epsg_reproj, ajouter_couche=False)
-                else:
-                    self.iface.messageBar().pushMessage(
-                        "La requête vers Hubeau n'a renvoyé aucun résultat : " +
-                        "il n'existe aucun qualitomètre dans la sélection effectuée.",
-                        Qgis.Warning)
-
-            # Instanciation de l'arborescence des groupes de couches via son noeud racine (root)
-            self.root = QgsProject.instance().layerTreeRoot()
-            # Création du groupe de couche associé à la requête, horodaté comme le sous-dossier résultat
-            groupe_couches = self.root.insertGroup(0, "Hubeau_" + self.horodate)
-            # Lecture du geopackage et ajout de toutes les couches dans un groupe de couches horodaté
-            self.lire_toutes_couches_geopackage(self.chemin_geopackage, groupe_couches, developper_groupe=True)
+                    if type_item == "Administratif":
+                        # On lance la requête Hubeau
+                        df_req, statut_req = self.preq.requete_hubeau_par_dept(nom_item, list_dept, "stations_qualite_csv")
+                        # Si le résultat de la requête est correct on ajoute les données au df résultat
+                        # (résultat partiel : les stations reçues sont conservées et l'utilisateur est averti)
+                        if statut_req in (200, 206):
+                            psink.ajouter(df_req)
+                            if statut_req == 206:
+                                self.differer_avertissement(f"La liste des qualitomètres ({item}) n'a été reçue qu'en partie.",
+                                                            "Téléchargement incomplet")
+                        # Si le résultat est incorrect on lève une exception gérée et on avertit l'utilisateur
+                        else:
+                            raise ErreurResultatRequeteIncorrect(f"{item} ({statut_req})")
+                    # TODO : traiter les autres type_item
+                    # Mise à jour du progressbar
+                    num_iteration_progressbar += 1
+                    tache.avancer(num_iteration_progressbar)
+            df_station_qualite = psink.concatener()
+            # Si le df résultat contient des données
+            if len(df_station_qualite) > 0:
+                # Suppression des doublons du df résultat et tri dans l'ordre des codes BSS
+                df_station_qualite = df_station_qualite.drop_duplicates()
+                df_station_qualite = df_station_qualite.sort_values('code_bss')     # En attendant de disposer de id_bss !
+                # TODO : sélection des points demandés par l'utilisateur
+                # Ecriture du df sous forme de csv dans le dossier défini par l'utilisateur
+                self.chemin_station_qualite = os.path.join(self.chemin_sous_dossier_horodate, "Stations_Qualitomètres.csv")
+                self.pio.ecrire_fichier_csv(df_station_qualite, self.chemin_station_qualite)
+                # Ecriture directe du df dans le geopackage (ajout au geopackage existant ou création du geopackage)
+                # avec reprojection dans la projection demandée par l'utilisateur
+                self.ecrire_couche_geopackage(self.chemin_geopackage, df_station_qualite, "Stations_Qualitomètres", "EPSG:4326", epsg_reproj,
+                                              ajouter_couche=os.path.isfile(self.chemin_geopackage),
+                                              champ_x="longitude", champ_y="latitude")
+            else:
+                self.differer_message(
+                    "La requête vers Hubeau n'a renvoyé aucun résultat : " +
+                    "il n'existe aucun qualitomètre dans la sélection effectuée.",
+                    Qgis.Warning)
 
-            num_iteration_progressbar += 1
-            self.dockwidget.progressBarStations.setValue(num_iteration_progressbar)
+        # Les couches du geopackage sont ajoutées à la carte à la fin de la tâche, dans le thread de l'interface
+        tache.differer(self.afficher_stations, self.chemin_geopackage, "Hubeau_" + self.horodate)
+        num_iteration_progressbar += 1
+        tache.avancer(num_iteration_progressbar)
+
+    def afficher_stations(self, chemin_geopackage, nom_groupe):
+        """
+        Ajout de toutes les couches du geopackage des stations dans un groupe de couches horodaté
+        placé en tête de l'arborescence des couches (thread de l'interface).
+        :param chemin_geopackage: (str) chemin du geopackage des stations
+        :param nom_groupe: (str) nom du groupe de couches, horodaté comme le sous-dossier résultat
+        :return: None
+        """
+        # Instanciation de l'arborescence des groupes de couches via son noeud racine (root)
+        self.root = QgsProject.instance().layerTreeRoot()
+        # Création du groupe de couche associé à la requête, horodaté comme le sous-dossier résultat
+        groupe_couches = self.root.insertGroup(0, nom_groupe)
+        # Lecture du geopackage et ajout de toutes les couches dans un groupe de couches horodaté
+        self.lire_toutes_couches_geopackage(chemin_geopackage, groupe_couches, developper_groupe=True)
+
+    def terminer_telecharger_point(self, tache):
+        """
+        Fin de la tâche de téléchargement des points d'eau (thread de l'interface) :
+        ajout des couches à la carte, messages à l'utilisateur et réinitialisation des widgets.
+        :param tache: (Pick_Task) tâche Qgis terminée
+        :return: None
+        """
+        try:
+            self.terminer_tache(tache)
             self.iface.messageBar().pushMessage("Le téléchargement des points d'eau est terminé.")
+        except Exception as erreur:
+            self.signaler_erreur_telecharger_point(erreur)
+        # Fin systématique de la méthode, qu'il y ait une erreur ou non
+        finally:
+            self.dockwidget.progressBarStations.reset()
+            self.dockwidget.pb_annulerStations.setEnabled(False)
+            self.activer_boutons_telechargement(True)
 
-        # Gestion des erreurs
+    def signaler_erreur_telecharger_point(self, erreur):
+        """
+        Signale à l'utilisateur une erreur du téléchargement des points d'eau.
+        :param erreur: (Exception) erreur levée avant ou pendant la tâche de téléchargement
+        :return: None
+        """
+        try:
+            raise erreur
         except ErreurListWidgetPointVide:
             self.iface.messageBar().pushMessage("La liste des points d'eau et groupes de points d'eau à télécharger est vide ! " +
                                                 "le téléchargement des points d'eau n'a pas été effectué...",
@@ -417,8 +472,8 @@ class Pick_Pg_Data():
             self.iface.messageBar().pushMessage("Le chemin du dossier devant contenir les résultat n'existe pas : " +
                                                 "le téléchargement des points d'eau n'a pas été effectué...",
                                                 Qgis.Critical)
-        except ErreurResultatRequeteIncorrect:
-            self.iface.messageBar().pushMessage("Résultat incorrect de la requête " + item + " (" + str(statut_req) + ") : " +
+        except ErreurResultatRequeteIncorrect as erreur_requete:
+            self.iface.messageBar().pushMessage("Résultat incorrect de la requête " + str(erreur_requete) + " : " +
                                                 "le téléchargement des points d'eau est incomplet...",
                                                 Qgis.Critical)
         except ErreurInterruptionUtilisateur:
@@ -437,13 +492,6 @@ class Pick_Pg_Data():
                                                "le téléchargement des points d'eau n'a pas été effectué...",
                                                 Qgis.Critical)
 
-        # Fin systématique de la méthode, qu'il y ait une erreur ou non
-        finally:
-            self.dockwidget.progressBarStations.reset()
-            self.dockwidget.pb_annulerStations.setEnabled(False)
-            self.dockwidget.pbt_telechargerPoints.setEnabled(True)
-            self.dockwidget.pbt_telechargerData.setEnabled(True)
-
     def choisir_groupe_parametre_pickeau(self, index):
         nom_groupe = self.dockwidget.cbx_choisirParametreGroupePickEau.itemText(index)
         if nom_groupe != "":
@@ -676,18 +724,15 @@ class Pick_Pg_Data():
         le nom de la couche de points doit contenir "Piézomètre" ou "Qualitomètre" et
         ses attributs "code_bss", "x", "y" (piézomètre) ou "code_bss", "longitude", "latitude" (qualitomètre)
         doivent exister.
+        Le téléchargement est effectué dans une tâche Qgis (voir executer_telecharger_data_qualite
+        et terminer_telecharger_data).
         :return:
         """
 
         telecharger_data_piezometre = False
         telecharger_data_qualitometre = False
-        # Définition du flag d'interruption des boucles de requete par appui sur le bouton 'Interrompre'
-        self.stop = False
-        # L'ensemble de la fonction est inclus dans un bloc try de niveau le plus haut pour capturer
-        # tous les types d'erreurs gérés (par "raise") : chaque erreur gérée rencontrée est remontée
-        # jusqu'à ce niveau et passée au bloc "except" correspondant (voir en bas de la fonction).
-        # Il est possible d'insérer des structures try - except de niveau inférieur, chaque except de niveau
-        # inférieur devant lever par "raise" une exception gérée qui remontera jusqu'au niveau supérieur.
+        # Toutes les erreurs gérées (par "raise") rencontrées avant le lancement de la tâche sont remontées
+        # jusqu'à ce niveau et signalées à l'utilisateur (voir signaler_erreur_telecharger_data).
         try:
 
             # Détermination du nom et des attributs des points sélectionnés de la couche courante
@@ -771,11 +816,6 @@ class Pick_Pg_Data():
             list_code_parametre_groupe_qualite = list(set(list_code_parametre_groupe_qualite))
             list_code_parametre_qualite = list(set(list_code_parametre_qualite) - set(list_code_parametre_groupe_qualite))
 
-            if len(list_code_parametre_qualite) > 200:
-                raise ErreurNombreParametreQualiteTropGrand
-            if len(list_code_groupe_qualite) > 200:
-                raise ErreurNombreGroupeQualiteTropGrand
-
             # Calcul du nombre de requêtes total
             if telecharger_data_piezometre == True:
                 if len(list_code_parametre_quantite) > 0:
@@ -784,233 +824,257 @@ class Pick_Pg_Data():
                     raise ErreurListeParametreQuantiteIncorrecte
             elif telecharger_data_qualitometre == True:
                 if (len(list_code_groupe_qualite) > 0) or (len(list_code_parametre_qualite) > 0):
-                    nb_req = len(list_tup_qualitometre) * (len(list_code_groupe_qualite) + 1) # ajout de 1 pour les codes paramètre passés en une fois (limitation à 200)
+                    # Construction de la liste des requêtes à envoyer : lots de qualitomètres croisés avec des lots
+                    # de groupes ou de paramètres (200 codes au plus), selon la stratégie qui minimise le nombre de requêtes
+                    list_code_qualitometre = [tup_qualitometre[0] for tup_qualitometre in list_tup_qualitometre]
+                    list_args_requete = self.pplan.planifier_requetes_qualite(list_code_qualitometre,
+                                                                              list_code_groupe_qualite,
+                                                                              list_code_parametre_qualite,
+                                                                              list_code_parametre_groupe_qualite)
+                    nb_req = len(list_args_requete)
                 else:
                     raise ErreurListeParametreQualiteIncorrecte
+        except Exception as erreur:
+            self.signaler_erreur_telecharger_data(erreur)
+            return
 
-            # Fixe les bornes min et max du progressBar en fonction du nombre total de requêtes à envoyer
-            self.dockwidget.progressBar.setRange(0, nb_req + 2)     # On ajoute 2 pour créer une étape de début et de fin de procédure
-            num_iteration_progressbar = 1
-            self.dockwidget.progressBar.setValue(num_iteration_progressbar)
-            # Active le bouton d'interruption des calculs et désactive les boutons de téléchargement
-            # des points et données pour éviter des déclenchements successifs intempestifs
+        if telecharger_data_qualitometre == True:
+            # Active le bouton d'interruption des calculs et lance la tâche de téléchargement :
+            # la progression compte une étape par requête, plus une étape de début et de fin de procédure
             self.dockwidget.pb_annuler.setEnabled(True)
-            self.dockwidget.pbt_telechargerPoints.setEnabled(False)
-            self.dockwidget.pbt_telechargerData.setEnabled(False)
-
-            # if telecharger_data_piezometre == True:
-            #     # Boucle sur les piézomètres sélectionnés
-            #     df_data_piezo = pd.DataFrame()
-            #     for code_bss, coord_x, coord_y in list_tup_piezometre:
-            #         self.controler_interruption_utilisateur()
-            #         # Boucle sur les paramètres demandés (uniquement piézo pour l'instant !)
-            #         for code_parametre in list_code_parametre_quantite:
-            #             self.controler_interruption_utilisateur()
-            #             # On lance la requête Hubeau
-            #             df_req, statut_req = self.preq.requete_hubeau_par_point(code_bss, [], [code_parametre], "chroniques_piezo_csv")
-            #             # Si le résultat de la requête est correct on ajoute les données au df résultat
-            #             if statut_req == 200:
-            #                 df_req["x_wgs84"] = coord_x
-            #                 df_req["y_wgs84"] = coord_y
-            #                 if len(df_data_piezo) > 0:
-            #                     df_data_piezo = df_data_piezo.append(df_req)
-            #                 else:
-            #                     df_data_piezo = df_req
-            #             # Si le résultat est incorrect on lève une exception gérée et on avertit l'utilisateur
-            #             else:
-            #                 raise ErreurResultatRequeteIncorrect
-            #             # Mise à jour du progressbar
-            #             num_iteration_progressbar += 1
-            #             self.dockwidget.progressBar.setValue(num_iteration_progressbar)
-
-            #     # Si le df résultat pour les chroniques piézométriques contient des données
-            #     if len(df_data_piezo) > 0:
-
-            #         # Suppression des doublons du df résultat (doublons ADES) et tri
-            #         df_data_piezo = df_data_piezo.drop_duplicates()
-            #         df_data_piezo = df_data_piezo.sort_values(['code_bss', 'date_mesure'])     # En attendant de disposer de id_bss !
-
-            #         # Création du sous-dossier qui contiendra les résultats d'analyse et le geopackage des points correspondantes
-            #         nb_point = str(df_data_piezo['code_bss'].unique().shape[0])
-            #         horodate_resultat = datetime.datetime.now().strftime('%y%m%d%H%M%S')
-            #         nom_dossier_resultat = f"Résultats_Piézométrie_{nb_point}_points_{horodate_resultat}"
-            #         chemin_dossier_resultat = os.path.join(chemin_dossier_geopackage, nom_dossier_resultat)
-            #         os.mkdir(chemin_dossier_resultat)
-            #         chemin_geopackage_resultat = os.path.join(chemin_dossier_resultat, nom_dossier_resultat + '.gpkg')
-
-            #         # Création du groupe qui contiendra les couches de points par paramètre
-            #         groupe_parent_couche_courante = self.iface.layerTreeView().currentGroupNode()
-            #         groupe_couche = groupe_parent_couche_courante.addGroup(nom_dossier_resultat)
-
-            #         # Création du df des métadonnées des points d'eau et écriture d'un csv temporaire
-            #         df_infos = df_data_piezo[self.preq.list_col_metadata_niveaux_nappes_chroniques_csv +
-            #                                  ['x_wgs84', 'y_wgs84']]
-            #         df_infos['code_param'] = ''
-            #         df_infos['nom_param'] = 'Niveaux_Piézométriques'
-            #         df_infos = df_infos.drop_duplicates()
-            #         chemin_csv_temp = os.path.join(chemin_dossier_resultat, "Temp.csv")
-            #         self.pio.ecrire_fichier_csv(df_infos, chemin_csv_temp)
-
-            #         # Lecture du fichier csv temporaire qui vient d'être écrit sur le disque et création d'une couche qgis temporaire sans ajout à la carte
-            #         couche_infos = self.lire_couche_csv(chemin_csv_temp, "Couche_Temporaire", ";",
-            #                                             champ_x="x_wgs84", champ_y="y_wgs84", epsg="EPSG:4326", ajouter_carte=False)
-
-            #         # Ecriture de la couche qgis en mémoire dans un nouveau geopackage avec reprojection dans la projection demandée par l'utilisateur
-            #         self.ecrire_couche_geopackage(chemin_geopackage_resultat, couche_infos, "Points_Niveaux_Piézométriques", "EPSG:4326", epsg_reproj, ajouter_couche=False)
-
-            #         # Lecture du geopackage et ajout de la nouvelle couche dans le nouveau groupe de couches des résultats
-            #         self.lire_couche_geopackage(chemin_geopackage_resultat, "Points_Niveaux_Piézométriques", groupe_couche, developper_groupe=False)
-
-            #         # Création du df des niveaux piézométriques et écriture au format csv
-            #         df_resultat = df_data_piezo[['code_bss'] + self.preq.list_col_data_niveaux_nappes_chroniques_csv]
-            #         df_resultat['commentaire'] = 'Correct'  # Ajout d'un champ commentaire pour que l'utilisateur puisse commenter chaque analyse
-            #         nom_csv_resultat = f"Données_Niveaux_{horodate_resultat}.csv"
-            #         chemin_csv_resultat = os.path.join(chemin_dossier_resultat, nom_csv_resultat)
-            #         self.pio.ecrire_fichier_csv(df_resultat, chemin_csv_resultat)
-
-            #         # Lecture du fichier csv des niveaux piézométriques qui vient d'être écrit sur le disque et création d'une couche qgis temporaire sans ajout à la carte
-            #         couche_donnees_niveaux = self.lire_couche_csv(chemin_csv_resultat, "Couche_Temporaire_Data_Niveaux", ";", ajouter_carte=False)
-
-            #         # Ajout de la couche des analyses chimiques dans le geopackage déjà existant
-            #         self.ecrire_couche_geopackage(chemin_geopackage_resultat, couche_donnees_niveaux, nom_csv_resultat, ajouter_couche=True)
-
-            #         # Lecture du geopackage et ajout de la nouvelle couche des analyses chimiques dans le nouveau groupe de couches des résultats
-            #         self.lire_couche_geopackage(chemin_geopackage_resultat, nom_csv_resultat, groupe_couche, developper_groupe=False)
-
-            #     else:
-            #         self.iface.messageBar().pushMessage(
-            #             "La requête vers Hubeau n'a renvoyé aucun résultat : " +
-            #             "il n'existe aucune chronique piézométrique correspondant à la sélection de points effectuée.",
-            #             Qgis.Warning)
-
-            if telecharger_data_qualitometre == True:
-
-                # Boucle sur les qualitomètres sélectionnés
-                df_data_qualite = pd.DataFrame()
-                for code_bss, coord_x, coord_y in list_tup_qualitometre:
-                    self.controler_interruption_utilisateur()
-
-                    # Boucle sur les groupes de paramètres demandés
-                    for code_groupe in list_code_groupe_qualite:
-                        self.controler_interruption_utilisateur()
-                        # On lance la requête Hubeau
-                        df_req, statut_req = self.preq.requete_hubeau_par_point(code_bss, [code_groupe], [], "analyses_qualite_csv")
-                        # Si le résultat de la requête est correct on ajoute les données au df résultat
-                        if statut_req == 200:
-                            df_req["x_wgs84"] = coord_x
-                            df_req["y_wgs84"] = coord_y
-                            if len(df_data_qualite) > 0:
-                                df_data_qualite = df_data_qualite.append(df_req)
-                            else:
-                                df_data_qualite = df_req
-                        # Si le résultat est incorrect on lève une exception gérée et on avertit l'utilisateur
-                        else:
-                            raise ErreurResultatRequeteIncorrect
-                        # Mise à jour du progressbar
-                        num_iteration_progressbar += 1
-                        self.dockwidget.progressBar.setValue(num_iteration_progressbar)
-
-                    # Requête supplémentaire pour les paramètres qualité demandés individuellement (max 200)
-                    if len(list_code_parametre_qualite) > 0:
-                        self.controler_interruption_utilisateur()
-                        # On lance la requête Hubeau
-                        df_req, statut_req = self.preq.requete_hubeau_par_point(code_bss, [], list_code_parametre_qualite, "analyses_qualite_csv")
-                        # Si le résultat de la requête est correct on ajoute les données au df résultat
-                        if statut_req == 200:
-                            df_req["x_wgs84"] = coord_x
-                            df_req["y_wgs84"] = coord_y
-                            if len(df_data_qualite) > 0:
-                                df_data_qualite = df_data_qualite.append(df_req)
-                            else:
-                                df_data_qualite = df_req
-                        # Si le résultat est incorrect on lève une exception gérée et on avertit l'utilisateur
-                        else:
-                            raise ErreurResultatRequeteIncorrect
-
-                    # Mise à jour du progressbar
-                    num_iteration_progressbar += 1
-                    self.dockwidget.progressBar.setValue(num_iteration_progressbar)
-
-                # Si le df résultat pour les analyses qualité contient des données
-                if len(df_data_qualite) > 0:
-
-                    # Suppression des doublons du df résultat (doublons ADES) et tri
-                    df_data_qualite = df_data_qualite.drop_duplicates()
-                    df_data_qualite = df_data_qualite.sort_values(['code_bss', 'nom_param', 'date_debut_prelevement'])     # En attendant de disposer de id_bss !
-
-                    # Création du sous-dossier qui contiendra les résultats d'analyse et le geopackage des points
-                    nb_point = str(df_data_qualite['code_bss'].unique().shape[0])
-                    nb_param = str(df_data_qualite['nom_param'].unique().shape[0])
-                    horodate_resultat = datetime.datetime.now().strftime('%y%m%d%H%M%S')
-                    nom_dossier_resultat = f"Résultats_Qualité_{nb_point}_points_{nb_param}_parametres_{horodate_resultat}"
-                    chemin_dossier_resultat = os.path.join(chemin_dossier_geopackage, nom_dossier_resultat)
-                    os.mkdir(chemin_dossier_resultat)
-                    chemin_geopackage_resultat = os.path.join(chemin_dossier_resultat, nom_dossier_resultat + '.gpkg')
-
-                    # Création du groupe qui contiendra les couches de points par paramètre
-                    groupe_parent_couche_courante = self.iface.layerTreeView().currentGroupNode()
-                    groupe_couche = groupe_parent_couche_courante.addGroup(nom_dossier_resultat)
-
-                    # Itération sur les paramètres pour créer autant de couches qu'il y a de paramètres
-                    df_resultat = pd.DataFrame()
-                    grp_data_qualite = df_data_qualite.groupby(by=['nom_param'])
-                    for nom_param, df_grp in grp_data_qualite:
-
-                        code_param = str(int(df_grp['code_param'].tolist()[0]))
-                        nom_couche = f"{nom_param}_{code_param}"
-
-                        # Ajout des données du paramètre au df résultat
-                        df_resultat = df_resultat.append(df_grp[['code_bss'] + self.preq.list_col_data_qualite_nappes_analyses_csv])
-
-                        # Création du df des métadonnées des points d'eau et écriture d'un csv temporaire
-                        df_infos_grp = df_grp[self.preq.list_col_metadata_qualite_nappes_analyses_csv +
-                                              ['code_param', 'nom_param', 'x_wgs84', 'y_wgs84']]
-                        df_infos_grp = df_infos_grp.drop_duplicates()
-                        chemin_csv_temp = os.path.join(chemin_dossier_resultat, "Temp.csv")
-                        self.pio.ecrire_fichier_csv(df_infos_grp, chemin_csv_temp)
-
-                        # Lecture du fichier csv temporaire des points qui vient d'être écrit sur le disque et création d'une couche qgis temporaire sans ajout à la carte
-                        couche_points_analyses = self.lire_couche_csv(chemin_csv_temp, "Couche_Temporaire", ";",
-                                                                      champ_x="x_wgs84", champ_y="y_wgs84", epsg="EPSG:4326", ajouter_carte=False)
-
-                        # Ajout de la couche qgis en mémoire à un geopackage avec reprojection dans la projection demandée par l'utilisateur
-                        if os.path.isfile(chemin_geopackage_resultat):
-                            # Ajout de la couche si le geopackage existe déjà
-                            self.ecrire_couche_geopackage(chemin_geopackage_resultat, couche_points_analyses, f"Points_{nom_couche}", "EPSG:4326", epsg_reproj, ajouter_couche=True)
-                        else:
-                            # Sinon création d'un geopackage et ajout de la couche
-                            self.ecrire_couche_geopackage(chemin_geopackage_resultat, couche_points_analyses, f"Points_{nom_couche}", "EPSG:4326", epsg_reproj, ajouter_couche=False)
+            self.lancer_tache("PickEau - Téléchargement des analyses qualité",
+                              lambda tache: self.executer_telecharger_data_qualite(tache, list_args_requete, list_tup_qualitometre,
+                                                                                    chemin_dossier_geopackage, epsg_reproj),
+                              self.terminer_telecharger_data,
+                              self.dockwidget.progressBar, nb_req + 2)
 
-                        # Lecture du geopackage et ajout de la nouvelle couche dans le nouveau groupe de couches des résultats
-                        self.lire_couche_geopackage(chemin_geopackage_resultat, f"Points_{nom_couche}", groupe_couche, developper_groupe=False)
-
-                    # Ecriture du csv des analyses chimiques
-                    nom_csv_resultat = f"Données_Analyses_{horodate_resultat}.csv"
-                    chemin_csv_resultat = os.path.join(chemin_dossier_resultat, nom_csv_resultat)
-                    df_resultat['commentaire'] = 'Correct'  # Ajout d'un champ commentaire pour que l'utilisateur puisse commenter chaque analyse
-                    self.pio.ecrire_fichier_csv(df_resultat, chemin_csv_resultat)
-
-                    # Lecture du fichier csv des analyses chimiques qui vient d'être écrit sur le disque et création d'une couche qgis temporaire sans ajout à la carte
-                    couche_donnees_analyses = self.lire_couche_csv(chemin_csv_resultat, "Couche_Temporaire_Data_Analyses", ";", ajouter_carte=False)
-
-                    # Ajout de la couche des analyses chimiques dans le geopackage déjà existant
-                    self.ecrire_couche_geopackage(chemin_geopackage_resultat, couche_donnees_analyses, nom_csv_resultat, ajouter_couche=True)
-
-                    # Lecture du geopackage et ajout de la nouvelle couche des analyses chimiques dans le nouveau groupe de couches des résultats
-                    self.lire_couche_geopackage(chemin_geopackage_resultat, nom_csv_resultat, groupe_couche, developper_groupe=False)
-
-                else:
-                    self.iface.messageBar().pushMessage(
-                        "La requête vers Hubeau n'a renvoyé aucun résultat : " +
-                        "il n'existe aucune analyse chimique correspondant à la sélection de points effectuée.",
-                        Qgis.Warning)
+    def executer_telecharger_data_qualite(self, tache, list_args_requete, list_tup_qualitometre, chemin_dossier_geopackage, epsg_reproj):
+        """
+        Téléchargement des analyses qualité des qualitomètres sélectionnés et écriture des résultats
+        (hors du thread de l'interface).
+        :param tache: (Pick_Task) tâche Qgis en cours
+        :param list_args_requete: liste des arguments des requêtes (voir Pick_Plan.planifier_requetes_qualite)
+        :param list_tup_qualitometre: liste de tuples (code_bss, longitude, latitude) des qualitomètres sélectionnés
+        :param chemin_dossier_geopackage: (str) dossier du geopackage des stations, qui contiendra le sous-dossier résultat
+        :param epsg_reproj: (str) code epsg de reprojection des points au format du type "EPSG:2154"
+        :return: None
+        """
+        num_iteration_progressbar = 1
+        tache.avancer(num_iteration_progressbar)
+
+        # if telecharger_data_piezometre == True:
+        #     # Boucle sur les piézomètres sélectionnés
+        #     df_data_piezo = pd.DataFrame()
+        #     for code_bss, coord_x, coord_y in list_tup_piezometre:
+        #         self.controler_interruption_utilisateur()
+        #         # Boucle sur les paramètres demandés (uniquement piézo pour l'instant !)
+        #         for code_parametre in list_code_parametre_quantite:
+        #             self.controler_interruption_utilisateur()
+        #             # On lance la requête Hubeau
+        #             df_req, statut_req = self.preq.requete_hubeau_par_point(code_bss, [], [code_parametre], "chroniques_piezo_csv")
+        #             # Si le résultat de la requête est correct on ajoute les données au df résultat
+        #             if statut_req == 200:
+        #                 df_req["x_wgs84"] = coord_x
+        #                 df_req["y_wgs84"] = coord_y
+        #                 if len(df_data_piezo) > 0:
+        #                     df_data_piezo = df_data_piezo.append(df_req)
+        #                 else:
+        #                     df_data_piezo = df_req
+        #             # Si le résultat est incorrect on lève une exception gérée et on avertit l'utilisateur
+        #             else:
+        #                 raise ErreurResultatRequeteIncorrect
+        #             # Mise à jour du progressbar
+        #             num_iteration_progressbar += 1
+        #             self.dockwidget.progressBar.setValue(num_iteration_progressbar)
+
+        #     # Si le df résultat pour les chroniques piézométriques contient des données
+        #     if len(df_data_piezo) > 0:
+
+        #         # Suppression des doublons du df résultat (doublons ADES) et tri
+        #         df_data_piezo = df_data_piezo.drop_duplicates()
+        #         df_data_piezo = df_data_piezo.sort_values(['code_bss', 'date_mesure'])     # En attendant de disposer de id_bss !
+
+        #         # Création du sous-dossier qui contiendra les résultats d'analyse et le geopackage des points correspondantes
+        #         nb_point = str(df_data_piezo['code_bss'].unique().shape[0])
+        #         horodate_resultat = datetime.datetime.now().strftime('%y%m%d%H%M%S')
+        #         nom_dossier_resultat = f"Résultats_Piézométrie_{nb_point}_points_{horodate_resultat}"
+        #         chemin_dossier_resultat = os.path.join(chemin_dossier_geopackage, nom_dossier_resultat)
+        #         os.mkdir(chemin_dossier_resultat)
+        #         chemin_geopackage_resultat = os.path.join(chemin_dossier_resultat, nom_dossier_resultat + '.gpkg')
+
+        #         # Création du groupe qui contiendra les couches de points par paramètre
+        #         groupe_parent_couche_courante = self.iface.layerTreeView().currentGroupNode()
+        #         groupe_couche = groupe_parent_couche_courante.addGroup(nom_dossier_resultat)
+
+        #         # Création du df des métadonnées des points d'eau et écriture d'un csv temporaire
+        #         df_infos = df_data_piezo[self.preq.list_col_metadata_niveaux_nappes_chroniques_csv +
+        #                                  ['x_wgs84', 'y_wgs84']]
+        #         df_infos['code_param'] = ''
+        #         df_infos['nom_param'] = 'Niveaux_Piézométriques'
+        #         df_infos = df_infos.drop_duplicates()
+        #         chemin_csv_temp = os.path.join(chemin_dossier_resultat, "Temp.csv")
+        #         self.pio.ecrire_fichier_csv(df_infos, chemin_csv_temp)
+
+        #         # Lecture du fichier csv temporaire qui vient d'être écrit sur le disque et création d'une couche qgis temporaire sans ajout à la carte
+        #         couche_infos = self.lire_couche_csv(chemin_csv_temp, "Couche_Temporaire", ";",
+        #                                             champ_x="x_wgs84", champ_y="y_wgs84", epsg="EPSG:4326", ajouter_carte=False)
+
+        #         # Ecriture de la couche qgis en mémoire dans un nouveau geopackage avec reprojection dans la projection demandée par l'utilisateur
+        #         self.ecrire_couche_geopackage(chemin_geopackage_resultat, couche_infos, "Points_Niveaux_Piézométriques", "EPSG:4326", epsg_reproj, ajouter_couche=False)
+
+        #         # Lecture du geopackage et ajout de la nouvelle couche dans le nouveau groupe de couches des résultats
+        #         self.lire_couche_geopackage(chemin_geopackage_resultat, "Points_Niveaux_Piézométriques", groupe_couche, developper_groupe=False)
+
+        #         # Création du df des niveaux piézométriques et écriture au format csv
+        #         df_resultat = df_data_piezo[['code_bss'] + self.preq.list_col_data_niveaux_nappes_chroniques_csv]
+        #         df_resultat['commentaire'] = 'Correct'  # Ajout d'un champ commentaire pour que l'utilisateur puisse commenter chaque analyse
+        #         nom_csv_resultat = f"Données_Niveaux_{horodate_resultat}.csv"
+        #         chemin_csv_resultat = os.path.join(chemin_dossier_resultat, nom_csv_resultat)
+        #         self.pio.ecrire_fichier_csv(df_resultat, chemin_csv_resultat)
+
+        #         # Lecture du fichier csv des niveaux piézométriques qui vient d'être écrit sur le disque et création d'une couche qgis temporaire sans ajout à la carte
+        #         couche_donnees_niveaux = self.lire_couche_csv(chemin_csv_resultat, "Couche_Temporaire_Data_Niveaux", ";", ajouter_carte=False)
+
+        #         # Ajout de la couche des analyses chimiques dans le geopackage déjà existant
+        #         self.ecrire_couche_geopackage(chemin_geopackage_resultat, couche_donnees_niveaux, nom_csv_resultat, ajouter_couche=True)
+
+        #         # Lecture du geopackage et ajout de la nouvelle couche des analyses chimiques dans le nouveau groupe de couches des résultats
+        #         self.lire_couche_geopackage(chemin_geopackage_resultat, nom_csv_resultat, groupe_couche, developper_groupe=False)
+
+        #     else:
+        #         self.iface.messageBar().pushMessage(
+        #             "La requête vers Hubeau n'a renvoyé aucun résultat : " +
+        #             "il n'existe aucune chronique piézométrique correspondant à la sélection de points effectuée.",
+        #             Qgis.Warning)
+
+        # Envoi en parallèle des requêtes par qualitomètre : les résultats corrects sont collectés,
+        # les qualitomètres des requêtes en échec sont signalés en fin de téléchargement.
+        # Chaque résultat reçu est séparé en schéma en étoile : seuls les champs de la table des faits sont collectés
+        # pour chaque analyse, les métadonnées des stations et les libellés des codes ne sont conservés qu'une fois.
+        pnorm = Pick_Norm(self.preq.list_col_metadata_qualite_nappes_analyses_csv,
+                          self.preq.list_col_data_qualite_nappes_analyses_csv,
+                          self.preq.dict_col_libelle_qualite_nappes_analyses_csv)
+        df_fait, df_echec = self.telecharger_par_point(tache, list_args_requete, num_iteration_progressbar,
+                                                       fonction_morceau=pnorm.separer)
+        num_iteration_progressbar += len(list_args_requete)
+        chemin_dossier_resultat = None
+
+        # Si le df résultat pour les analyses qualité contient des données
+        if len(df_fait) > 0:
+
+            # Suppression des doublons de la table des faits (doublons ADES) et tri (analyses regroupées par paramètre)
+            df_fait = df_fait.drop_duplicates()
+            df_fait = df_fait.sort_values(['code_param', 'code_bss', 'date_debut_prelevement'])     # En attendant de disposer de id_bss !
+
+            # Table des stations (une ligne par station) avec les coordonnées de chaque qualitomètre
+            # (répartition des résultats des requêtes multi-stations) et table des nomenclatures
+            df_station = self.pplan.rattacher_coordonnees(pnorm.lire_stations(), list_tup_qualitometre)
+            df_nomenclature = pnorm.lire_nomenclatures()
+
+            # Création du sous-dossier qui contiendra les résultats d'analyse et le geopackage des points
+            nb_point = str(df_fait['code_bss'].unique().shape[0])
+            nb_param = str(df_fait['code_param'].unique().shape[0])
+            horodate_resultat = datetime.datetime.now().strftime('%y%m%d%H%M%S')
+            nom_dossier_resultat = f"Résultats_Qualité_{nb_point}_points_{nb_param}_parametres_{horodate_resultat}"
+            chemin_dossier_resultat = os.path.join(chemin_dossier_geopackage, nom_dossier_resultat)
+            os.mkdir(chemin_dossier_resultat)
+            chemin_geopackage_resultat = os.path.join(chemin_dossier_resultat, nom_dossier_resultat + '.gpkg')
+
+            # Ecriture de la table des stations dans un nouveau geopackage avec reprojection dans la projection demandée par l'utilisateur
+            self.ecrire_couche_geopackage(chemin_geopackage_resultat, df_station, self.nom_table_stations_analyses, "EPSG:4326", epsg_reproj,
+                                          ajouter_couche=False, champ_x="x_wgs84", champ_y="y_wgs84")
+            # Ecriture de la table des nomenclatures
+            self.ecrire_couche_geopackage(chemin_geopackage_resultat, df_nomenclature, self.nom_table_nomenclatures_analyses, ajouter_couche=True)
+
+            # Création du df des points d'eau par paramètre (une ligne par point et par paramètre)
+            # et écriture en une seule fois avec reprojection dans la projection demandée par l'utilisateur
+            df_infos = df_fait[['code_bss', 'code_param']].drop_duplicates()
+            df_infos = df_infos.merge(pnorm.lire_libelles('code_param'), on='code_param', how='left')
+            df_infos = df_infos.merge(df_station[['code_bss', 'x_wgs84', 'y_wgs84']], on='code_bss', how='left')
+            df_infos['code_param'] = pnorm.encoder_colonne(df_infos['code_param'])
+            self.ecrire_couche_geopackage(chemin_geopackage_resultat, df_infos, self.nom_table_points_parametres, "EPSG:4326", epsg_reproj,
+                                          ajouter_couche=True, champ_x="x_wgs84", champ_y="y_wgs84")
+
+            # Liste des couches du geopackage à ajouter à la carte à la fin de la tâche
+            list_nom_couche = []
+            # Couches de points par paramètre : vues filtrées de la table des points par paramètre
+            # (nom de la couche = "Points_<nom_param>_<code_param>", recherché par le module pick_page_graphique)
+            dict_vue = {}
+            df_parametre = df_infos[['nom_param', 'code_param']].drop_duplicates(subset=['nom_param']).sort_values('nom_param')
+            for nom_param, code_param in df_parametre.itertuples(index=False):
+                nom_couche = f"Points_{nom_param}_{code_param}"
+                list_nom_couche.append(nom_couche)
+                dict_vue[nom_couche] = (self.nom_table_points_parametres,
+                                        "\"nom_param\" = '" + str(nom_param).replace("'", "''") + "'")
+
+            # Ecriture du csv des analyses chimiques à plat (champs des csv Hubeau, analyses regroupées par paramètre) :
+            # le schéma en étoile n'est conservé que dans le geopackage
+            nom_csv_resultat = f"Données_Analyses_{horodate_resultat}.csv"
+            chemin_csv_resultat = os.path.join(chemin_dossier_resultat, nom_csv_resultat)
+            df_csv = pnorm.reconstituer_donnees(df_fait).sort_values(['nom_param', 'code_bss', 'date_debut_prelevement'])
+            df_csv['commentaire'] = 'Correct'  # Ajout d'un champ commentaire pour que l'utilisateur puisse commenter chaque analyse
+            self.pio.ecrire_fichier_csv(df_csv, chemin_csv_resultat)
+            del df_csv
+
+            # Table des faits des analyses chimiques (codes encodés en entiers ou catégories)
+            df_resultat = pnorm.encoder_faits(df_fait)
+            del df_fait
+            df_resultat['commentaire'] = 'Correct'
+
+            # Ajout de la table des analyses chimiques dans le geopackage déjà existant (écriture directe du df)
+            # et indexation des champs filtrés pour le tracé des graphiques
+            self.ecrire_couche_geopackage(chemin_geopackage_resultat, df_resultat, nom_csv_resultat, ajouter_couche=True)
+            UtilitaireCouches.creer_index_geopackage(chemin_geopackage_resultat, nom_csv_resultat, self.list_champ_index_analyses)
+
+            list_nom_couche.append(nom_csv_resultat)
+
+            # Vue à plat des analyses (présentation des csv Hubeau) : table des faits jointe aux stations et aux nomenclatures
+            UtilitaireCouches.creer_vue_geopackage(chemin_geopackage_resultat, f"Vue_Analyses_{horodate_resultat}",
+                                                   pnorm.construire_requete_vue(nom_csv_resultat,
+                                                                                self.nom_table_stations_analyses,
+                                                                                self.nom_table_nomenclatures_analyses,
+                                                                                ['commentaire']))
+
+            # Les couches du geopackage sont ajoutées à la carte à la fin de la tâche, dans le thread de l'interface
+            tache.differer(self.afficher_resultat, chemin_geopackage_resultat, nom_dossier_resultat, list_nom_couche, dict_vue)
 
-            num_iteration_progressbar += 1
-            self.dockwidget.progressBar.setValue(num_iteration_progressbar)
-            self.iface.messageBar().pushMessage("Le téléchargement des données est terminé.")
-            # os.remove(chemin_csv_infos)
+        else:
+            self.differer_message(
+                "La requête vers Hubeau n'a renvoyé aucun résultat : " +
+                "il n'existe aucune analyse chimique correspondant à la sélection de points effectuée.",
+                Qgis.Warning)
+
+        num_iteration_progressbar += 1
+        tache.avancer(num_iteration_progressbar)
+        self.differer_message("Le téléchargement des données est terminé.")
+        self.signaler_echecs(df_echec, chemin_dossier_resultat)
+        # os.remove(chemin_csv_infos)
+
+    def terminer_telecharger_data(self, tache):
+        """
+        Fin de la tâche de téléchargement des analyses qualité (thread de l'interface) :
+        ajout des couches à la carte, messages à l'utilisateur et réinitialisation des widgets.
+        :param tache: (Pick_Task) tâche Qgis terminée
+        :return: None
+        """
+        try:
+            self.terminer_tache(tache)
+        except Exception as erreur:
+            self.signaler_erreur_telecharger_data(erreur)
+        # Fin systématique de la méthode, qu'il y ait une erreur ou non
+        finally:
+            self.dockwidget.progressBar.reset()
+            self.dockwidget.pb_annuler.setEnabled(False)
+            self.activer_boutons_telechargement(True)
 
-        # Gestion des erreurs
+    def signaler_erreur_telecharger_data(self, erreur):
+        """
+        Signale à l'utilisateur une erreur du téléchargement des données.
+        :param erreur: (Exception) erreur levée avant ou pendant la tâche de téléchargement
+        :return: None
+        """
+        try:
+            raise erreur
         except ErreurAucuneCoucheSelectionnee:
             self.iface.messageBar().pushMessage("Aucune couche Qgis de stations Hubeau n'est active ! " +
                                                 "Veuillez activer une couche de stations Hubeau et sélectionner au moins une station...",
@@ -1035,14 +1099,6 @@ class Pick_Pg_Data():
             self.iface.messageBar().pushMessage("La liste des paramètres et groupes de paramètres à télécharger est vide ! " +
                                                 "Le téléchargement des données n'a pas été effectué...",
                                                 Qgis.Critical)
-        except ErreurNombreGroupeQualiteTropGrand:
-            self.iface.messageBar().pushMessage("Hubeau n'accepte pas le téléchargement de plus de 200 groupes de paramètres qualité : " +
-                                                "le téléchargement des données n'a pas été effectué...",
-                                                Qgis.Critical)
-        except ErreurNombreParametreQualiteTropGrand:
-            self.iface.messageBar().pushMessage("Hubeau n'accepte pas le téléchargement de plus de 200 paramètres qualité : " +
-                                                "le téléchargement des données n'a pas été effectué...",
-                                                Qgis.Critical)
         except ErreurListeParametreQuantiteIncorrecte:
             self.iface.messageBar().pushMessage("Aucun paramètre quantité n'est sélectionné ! " +
                                                 "Le téléchargement des données n'a pas été effectué...",
@@ -1067,32 +1123,120 @@ class Pick_Pg_Data():
                                                 "le téléchargement des données est probablement incomplet ou n'a pas été effectué...",
                                                 Qgis.Critical)
 
-        # Fin systématique de la méthode, qu'il y ait une erreur ou non
-        finally:
-            self.dockwidget.progressBar.reset()
-            self.dockwidget.pb_annuler.setEnabled(False)
-            self.dockwidget.pbt_telechargerPoints.setEnabled(True)
-            self.dockwidget.pbt_telechargerData.setEnabled(True)
-
     def obtenir_liste_item_listwidget(self, listwidget):
         list_item = []
         for i in range(listwidget.count()):
             list_item.append(listwidget.item(i).text())
         return list_item
 
+    def ignorer_cache(self, ignorer):
+        """
+        [ Connectée à 'chk_ignorerCache' ]
+        Active ou désactive le contournement du cache disque des réponses http.
+        """
+        self.preq.pcache.ignorer = ignorer
+
     def stop_iteration(self):
-        # Flag d'interruption de la boucle par appui sur le bouton 'Interrompre'
-        self.stop = True
+        # Demande d'interruption de la tâche de téléchargement en cours par appui sur le bouton 'Interrompre'
+        if self.tache is not None:
+            self.tache.cancel()
+        # Les requêtes en attente dans le moteur de téléchargement ne sont plus envoyées
+        self.pdownload.interrompre()
 
     def controler_interruption_utilisateur(self):
-        # Traitement des événements pour permettre l'interruption par l'utilisateur
-        QCoreApplication.processEvents()
-        # Flag d'interruption de la boucle par appui sur le bouton 'Interrompre'
-        if (self.stop is True):
-            self.stop = False
-            self.dockwidget.progressBar.reset()
-            self.dockwidget.pb_annuler.setEnabled(False)
+        # Contrôle, dans la tâche de téléchargement, de la demande d'interruption par le bouton 'Interrompre'
+        # (la tâche s'exécute hors du thread de l'interface : il n'est plus nécessaire de traiter les événements)
+        if (self.tache is not None) and self.tache.isCanceled():
+            raise ErreurInterruptionUtilisateur
+
+    def lancer_tache(self, description, fonction_travail, fonction_fin, barre_progression, nb_etapes):
+        """
+        Lance une tâche de téléchargement dans le gestionnaire de tâches de Qgis, hors du thread de l'interface.
+        Les boutons de téléchargement sont désactivés jusqu'à la fin de la tâche pour éviter des déclenchements
+        successifs intempestifs ; ils doivent être réactivés par la fonction de fin.
+        :param description: (str) description de la tâche affichée dans le gestionnaire de tâches de Qgis
+        :param fonction_travail: fonction exécutée hors du thread de l'interface, appelée avec la tâche en paramètre
+        :param fonction_fin: fonction exécutée dans le thread de l'interface, appelée avec la tâche en paramètre
+        :param barre_progression: (QProgressBar) barre de progression du téléchargement
+        :param nb_etapes: (int) nombre d'étapes du téléchargement correspondant à une progression de 100 %
+        :return: None
+        """
+        self.activer_boutons_telechargement(False)
+        barre_progression.setRange(0, 100)
+        barre_progression.setValue(0)
+        self.tache = Pick_Task(description, fonction_travail, fonction_fin)
+        self.tache.definir_nb_etapes(nb_etapes)
+        # La progression et le volume des données reçues sont émis depuis le thread de la tâche
+        # et reçus dans le thread de l'interface
+        barre_progression.setFormat("%p%")
+        self.tache.progressChanged.connect(lambda progression: barre_progression.setValue(int(progression)))
+        self.tache.volume_recu.connect(lambda nb_lignes, nb_octets: barre_progression.setFormat(
+            f"%p% - {nb_lignes} lignes ({nb_octets / (1024 * 1024):.1f} Mo)"))
+        QgsApplication.taskManager().addTask(self.tache)
+
+    def terminer_tache(self, tache):
+        """
+        Début commun des fonctions de fin des tâches de téléchargement (thread de l'interface) :
+        remonte l'erreur éventuelle de la tâche, sinon exécute les opérations différées par la tâche
+        (ajout des couches à la carte, messages à l'utilisateur).
+        :param tache: (Pick_Task) tâche Qgis terminée
+        :return: None
+        """
+        self.tache = None
+        if tache.exception is not None:
+            raise tache.exception
+        # Tâche interrompue avant son démarrage
+        if not tache.succes:
             raise ErreurInterruptionUtilisateur
+        tache.executer_actions_fin()
+
+    def activer_boutons_telechargement(self, activer):
+        """
+        Active ou désactive les boutons de téléchargement des points et des données.
+        :param activer: (bool) True pour activer les boutons, False pour les désactiver
+        :return: None
+        """
+        self.dockwidget.pbt_telechargerPoints.setEnabled(activer)
+        self.dockwidget.pbt_telechargerData.setEnabled(activer)
+        self.dockwidget.pbt_telechargerData_pizo.setEnabled(activer)
+
+    def differer_message(self, *args):
+        """
+        Affiche un message dans la barre de messages de Qgis à la fin de la tâche de téléchargement en cours.
+        :param args: arguments de QgsMessageBar.pushMessage
+        :return: None
+        """
+        self.tache.differer(lambda: self.iface.messageBar().pushMessage(*args))
+
+    def differer_avertissement(self, *args):
+        """
+        Affiche un avertissement dans la barre de messages de Qgis à la fin de la tâche de téléchargement en cours.
+        :param args: arguments de QgsMessageBar.pushWarning
+        :return: None
+        """
+        self.tache.differer(lambda: self.iface.messageBar().pushWarning(*args))
+
+    def afficher_resultat(self, chemin_geopackage, nom_groupe, list_nom_couche, dict_vue=None):
+        """
+        Ajout des couches d'un geopackage résultat dans un nouveau groupe de couches créé dans le groupe courant
+        de l'arborescence des couches (thread de l'interface).
+        :param chemin_geopackage: (str) chemin du geopackage résultat
+        :param nom_groupe: (str) nom du groupe de couches (nom du sous-dossier résultat)
+        :param list_nom_couche: liste des noms des couches à lire dans le geopackage
+        :param dict_vue: (dict) couches définies comme vues filtrées d'une table du geopackage :
+                         clé = nom de la couche / valeur = (nom de la table, filtre)
+        :return: None
+        """
+        if dict_vue is None:
+            dict_vue = {}
+        # Création du groupe qui contiendra les couches de points par paramètre
+        groupe_parent_couche_courante = self.iface.layerTreeView().currentGroupNode()
+        groupe_couche = groupe_parent_couche_courante.addGroup(nom_groupe)
+        # Lecture du geopackage et ajout des couches dans le nouveau groupe de couches des résultats
+        for nom_couche in list_nom_couche:
+            nom_table, filtre = dict_vue.get(nom_couche, (None, ""))
+            self.lire_couche_geopackage(chemin_geopackage, nom_couche, groupe_couche, developper_groupe=False,
+                                        nom_table=nom_table, filtre=filtre)
 
     def lire_couche_csv(self, chemin_csv, nom_couche_qgis, separateur, champ_x='', champ_y='', epsg='', ajouter_carte=True):
         """
@@ -1124,7 +1268,7 @@ class Pick_Pg_Data():
             uri += "&xField=" + champ_x
             uri += "&yField=" + champ_y
             uri += "&crs=" + epsg
-            uri += "&spatialIndex=no"
+            uri += "&spatialIndex=yes"
             uri += "&subsetIndex=no"
             uri += "&watchFile=no"
         # Lecture du csv et création de la couche
@@ -1136,17 +1280,28 @@ class Pick_Pg_Data():
             QgsProject.instance().addMapLayers([layer])
         return layer
 
-    def ecrire_couche_geopackage(self, chemin_geopackage, qgs_vector_layer, layer_name, epsg_origine="", epsg_destination="", ajouter_couche=False):
+    def ecrire_couche_geopackage(self, chemin_geopackage, qgs_vector_layer, layer_name, epsg_origine="", epsg_destination="", ajouter_couche=False,
+                                 champ_x="", champ_y=""):
         """
-        Ecrit une couche Qgis dans un geopackage existant ou à créer.
+        Ecrit une couche Qgis (ou un dataframe) dans un geopackage existant ou à créer.
+        Un dataframe est écrit directement dans le geopackage (UtilitaireCouches.ecrire_dataframe_geopackage),
+        sans passer par un csv temporaire ni par une couche Qgis : les types des colonnes sont conservés.
         :param chemin_geopackage: (str) chemin du geopackage existant ou à créer
-        :param qgs_vector_layer: (QgsVectorLayer) objet couche vecteur à écrire dans le geopackage
+        :param qgs_vector_layer: (QgsVectorLayer | DataFrame) objet couche vecteur ou dataframe à écrire dans le geopackage
         :param layer_name: (str) nom de la couche vecteur à écrire dans le geopackage
         :param epsg_origine="": (str) code epsg d'origine de la couche vecteur au format du type "EPSG:2154"
         :param epsg_destination="": (str) code epsg de reprojection de la couche vecteur au format du type "EPSG:2154"
         :param ajouter_couche=False: (bool) indique s'il faut ajouter la couche à un geopackage existant (True) ou créer le geopackage (False)
+        :param champ_x="": (str) nom du champ de longitude du dataframe (couche de points uniquement)
+        :param champ_y="": (str) nom du champ de latitude du dataframe (couche de points uniquement)
         :return: None
         """
+        if isinstance(qgs_vector_layer, pd.DataFrame):
+            UtilitaireCouches.ecrire_dataframe_geopackage(chemin_geopackage, layer_name, qgs_vector_layer, champ_x, champ_y,
+                                                          epsg_origine if epsg_origine != "" else 4326,
+                                                          epsg_destination if epsg_destination != "" else None,
+                                                          ajouter_couche)
+            return
         options = QgsVectorFileWriter.SaveVectorOptions()
         options.driverName = "GPKG"
         options.layerName = layer_name
@@ -1160,17 +1315,22 @@ class Pick_Pg_Data():
             options.actionOnExistingFile = QgsVectorFileWriter.CreateOrOverwriteLayer
         QgsVectorFileWriter.writeAsVectorFormat(qgs_vector_layer, chemin_geopackage, options)
 
-    def lire_couche_geopackage(self, chemin_geopackage, nom_couche, qgs_layer_tree_group, developper_groupe=False):
+    def lire_couche_geopackage(self, chemin_geopackage, nom_couche, qgs_layer_tree_group, developper_groupe=False,
+                               nom_table=None, filtre=""):
         """
         Lecture d'un geopackage et ajout d'une couche dans un groupe de couches.
         :param chemin_geopackage: (str) chemin du geopackage existant ou à créer
         :param nom_couche: (str) nom de la couche à lire dans le geopackage
         :param qgs_layer_tree_group: (QgsLayerTreeGroup) noeud de type groupe de l'arbre des noeuds (QgsLayerTree)
         :param developper_groupe: (bool) indique si le groupe doit être développé (True) ou non (False)
+        :param nom_table: (str) nom de la table à lire dans le geopackage si elle diffère du nom de la couche (vue filtrée)
+        :param filtre: (str) filtre attributaire de la couche (p.ex "nom_param" = 'Nitrates'), "" = aucun filtre
         :return: None
         """
-        gpkg = ogr.Open(chemin_geopackage)
-        gpkg_layer = QgsVectorLayer(chemin_geopackage + "|layername=" + nom_couche, nom_couche, 'ogr')
+        uri = chemin_geopackage + "|layername=" + (nom_table if nom_table is not None else nom_couche)
+        if filtre != "":
+            uri += "|subset=" + filtre
+        gpkg_layer = QgsVectorLayer(uri, nom_couche, 'ogr')
         if not gpkg_layer.isValid():
             raise ErreurCreationCoucheQgis
         QgsProject.instance().addMapLayer(gpkg_layer, False)
@@ -1242,13 +1402,6 @@ class Pick_Pg_Data():
         """
         Lancement du téléchargement des donnees piezometrique et gestion des messages d'erreurs
         """
-        # Gestion de la progress bar
-        self.stop = False
-        self.dockwidget.pbt_telechargerData_pizo.setEnabled(True)
-        num_iteration_progressbar = 1  # une seule requete pour hubeau
-        nb_req = num_iteration_progressbar + 2  # une seule requete pour hubeau ajoute 2 pour les etapes d ajouts
-        self.dockwidget.progressBar.setRange(0, nb_req)
-
         # Vérifier sélection
         couche_courante = self.iface.activeLayer()
         if (couche_courante):
@@ -1256,7 +1409,7 @@ class Pick_Pg_Data():
                 list_tup_piezometre = self.obtenir_liste_attribut_point_selectionne(couche_courante, ["code_bss", "x", "y"])
                 if len(list_tup_piezometre) > 0:
                     list_tup_piezometre = list(set(list_tup_piezometre))  # élimination des doublons éventuels
-                    self.lancer_telecharger_data_piezometre(list_tup_piezometre, couche_courante, num_iteration_progressbar, nb_req)
+                    self.lancer_telecharger_data_piezometre(list_tup_piezometre, couche_courante)
                 else:
                     self.iface.messageBar().pushWarning("Aucune station sélectionnée.", "Téléchargement impossible")
             else:
@@ -1265,134 +1418,300 @@ class Pick_Pg_Data():
             self.iface.messageBar().pushWarning("Aucune couche sélectionnée. Sélectionner une couche Stations Piézomètres.", "Téléchargement impossible")
 
     def lancer_telecharger_data_piezometre(self, list_tup_piezometre: list,
-                                           couche_courante: QgsVectorLayer,
-                                           num_iteration_progressbar: int,
-                                           nb_req: int):
+                                           couche_courante: QgsVectorLayer):
         """
-        Téléchargement des données et ajout à la carte
+        Préparation des requêtes puis lancement du téléchargement des données dans une tâche Qgis
+        (voir executer_telecharger_data_piezometre et terminer_telecharger_data_piezometre)
 
         :param list_tup_piezometre: liste des piezometre
         :type list_tup_piezometre: list
 
         :param couche_courante: couche vecteur selectionnee
         :type couche_courante: QgsVectorLayer
+        """
+        # Construction de la liste des requêtes à envoyer : une requête par lot de piézomètres et par paramètre
+        # (un seul paramètre quantité possible actuellement : uniquement piézo pour l'instant !)
+        list_filtre = [([], [code_parametre]) for code_parametre in self.pconfig.list_lex_parametre_quantite]
+        list_code_piezometre = [tup_piezometre[0] for tup_piezometre in list_tup_piezometre]
+
+        # Téléchargement incrémental : recherche du dernier résultat piézométrique du dossier des stations
+        # et lecture de la date de la dernière mesure déjà téléchargée pour chaque piézomètre
+        dict_resultat_existant = None
+        dict_date_debut = None
+        if self.dockwidget.chk_telechargementIncremental.isChecked():
+            chemin_dossier_stations = UtilitaireCouches.get_chemin_dossier_geopackage_depuis_couche(couche_courante)
+            dict_resultat_existant = UtilitaireCouches.rechercher_dernier_resultat(chemin_dossier_stations, "Résultats_Piézométrie_",
+                                                                                   "Données_Niveaux_")
+            if dict_resultat_existant is not None:
+                dict_date_debut = UtilitaireCouches.lire_dates_max_geopackage(dict_resultat_existant["chemin_geopackage"],
+                                                                              dict_resultat_existant["nom_table_donnees"],
+                                                                              "code_bss", "date_mesure")
+
+        list_args_requete = self.pplan.planifier_requetes_par_point(list_code_piezometre, list_filtre, "chroniques_piezo_csv", dict_date_debut)
+
+        # Dossier du geopackage des stations (qui contiendra le sous-dossier résultat) et projection demandée par l'utilisateur
+        chemin_fichier_geopackage = UtilitaireCouches.get_chemin_fichier_geopackage(couche_courante)
+        # chemin_dossier_geopackage = self.get_chemin_dossier_geopackage(chemin_fichier_geopackage)
+        chemin_dossier_geopackage = UtilitaireCouches.get_chemin_dossier_geopackage(chemin_fichier_geopackage)
+        epsg_reproj = self.get_epsg_selectionnee()
+
+        # Active le bouton d'interruption des calculs et lance la tâche de téléchargement :
+        # la progression compte une étape par requête, plus une étape de début et de fin de procédure
+        self.dockwidget.pb_annuler.setEnabled(True)
+        self.lancer_tache("PickEau - Téléchargement des chroniques piézométriques",
+                          lambda tache: self.executer_telecharger_data_piezometre(tache, list_args_requete, list_tup_piezometre,
+                                                                                  dict_date_debut, dict_resultat_existant,
+                                                                                  chemin_dossier_geopackage, epsg_reproj),
+                          self.terminer_telecharger_data_piezometre,
+                          self.dockwidget.progressBar, len(list_args_requete) + 2)
+
+    def executer_telecharger_data_piezometre(self, tache, list_args_requete, list_tup_piezometre, dict_date_debut,
+                                             dict_resultat_existant, chemin_dossier_geopackage, epsg_reproj):
+        """
+        Téléchargement des chroniques piézométriques et écriture des résultats (hors du thread de l'interface)
 
-        :param num_iteration_progressbar: etape du tölöchargement
-        :type num_iteration_progressbar: int
-
-        :param nb_req: Nombre d'etape total du téléchargement
-        :type nb_req: int
+        :param tache: tâche Qgis en cours
+        :type tache: Pick_Task
 
-        :return: url dossier
-        :rtype: str
-        """
+        :param list_args_requete: liste des arguments des requêtes (voir Pick_Plan.planifier_requetes_par_point)
+        :type list_args_requete: list
 
-        try:
-            self.dockwidget.pb_annuler.setEnabled(True)
-            self.dockwidget.progressBar.setRange(num_iteration_progressbar, nb_req)
-            df_data_piezo = pd.DataFrame()
-            for code_bss, coord_x, coord_y in list_tup_piezometre:
-                self.controler_interruption_utilisateur()
-                # Boucle sur les paramètres demandés (uniquement piézo pour l'instant !)
-                # Un seul paramètre quantite possible actuellement
-                list_code_parametre_quantite = self.pconfig.list_lex_parametre_quantite
-                for code_parametre in list_code_parametre_quantite:
-                    self.controler_interruption_utilisateur()
-                    if (self.stop is False):  # control interuption
-                        # On lance la requête Hubeau
-                        df_req, statut_req = self.preq.requete_hubeau_par_point(code_bss, [], [code_parametre], "chroniques_piezo_csv")
-                        # Si le résultat de la requête est correct on ajoute les données au df résultat
-                        if statut_req == 200:
-                            df_req["x_wgs84"] = coord_x
-                            df_req["y_wgs84"] = coord_y
-                            if len(df_data_piezo) > 0:
-                                df_data_piezo = df_data_piezo.append(df_req)
-                            else:
-                                df_data_piezo = df_req
-                        # Si le résultat est incorrect on lève une exception gérée et on avertit l'utilisateur
-                        else:
-                            raise ErreurResultatRequeteIncorrect
-                        # Mise à jour du progressbar
-                        num_iteration_progressbar += 1
-                        self.dockwidget.progressBar.setValue(num_iteration_progressbar)
+        :param list_tup_piezometre: liste de tuples (code_bss, x, y) des piézomètres sélectionnés
+        :type list_tup_piezometre: list
 
-            # Si le df résultat pour les chroniques piézométriques contient des données
-            self.dockwidget.pb_annuler.setEnabled(False)  # dernière étape oú il est possible d'annuler
-            self.controler_interruption_utilisateur()
-            if (self.stop is False):
-                if len(df_data_piezo) > 0:
+        :param dict_date_debut: date de la dernière mesure déjà téléchargée par piézomètre (None si téléchargement complet)
+        :type dict_date_debut: dict
 
-                    chemin_fichier_geopackage = UtilitaireCouches.get_chemin_fichier_geopackage(couche_courante)
-                    # chemin_dossier_geopackage = self.get_chemin_dossier_geopackage(chemin_fichier_geopackage)
-                    chemin_dossier_geopackage = UtilitaireCouches.get_chemin_dossier_geopackage(chemin_fichier_geopackage)
+        :param dict_resultat_existant: dernier résultat piézométrique (voir UtilitaireCouches.rechercher_dernier_resultat), None si téléchargement complet
+        :type dict_resultat_existant: dict
 
-                    # Suppression des doublons du df résultat (doublons ADES) et tri
-                    df_data_piezo = df_data_piezo.drop_duplicates()
-                    df_data_piezo = df_data_piezo.sort_values(['code_bss', 'date_mesure'])     # En attendant de disposer de id_bss !
+        :param chemin_dossier_geopackage: dossier du geopackage des stations, qui contiendra le sous-dossier résultat
+        :type chemin_dossier_geopackage: str
 
-                    # Création du sous-dossier qui contiendra les résultats d'analyse et le geopackage des points correspondantes
-                    nb_point = str(df_data_piezo['code_bss'].unique().shape[0])
-                    horodate_resultat = datetime.datetime.now().strftime('%y%m%d%H%M%S')
-                    nom_dossier_resultat = f"Résultats_Piézométrie_{nb_point}_points_{horodate_resultat}"
-                    chemin_dossier_resultat = os.path.join(chemin_dossier_geopackage, nom_dossier_resultat)
-                    os.mkdir(chemin_dossier_resultat)
-                    chemin_geopackage_resultat = os.path.join(chemin_dossier_resultat, nom_dossier_resultat + '.gpkg')
+        :param epsg_reproj: code epsg de reprojection des points au format du type "EPSG:2154"
+        :type epsg_reproj: str
+        """
+        num_iteration_progressbar = 1
+        tache.avancer(num_iteration_progressbar)
+
+        # Envoi en parallèle des requêtes par piézomètre : les résultats corrects sont collectés,
+        # les piézomètres des requêtes en échec sont signalés en fin de téléchargement
+        df_data_piezo, df_echec = self.telecharger_par_point(tache, list_args_requete, num_iteration_progressbar)
+        num_iteration_progressbar += len(list_args_requete)
+        chemin_dossier_resultat = None
+        # Répartition des résultats des requêtes multi-stations : ajout des coordonnées de chaque piézomètre
+        df_data_piezo = self.pplan.rattacher_coordonnees(df_data_piezo, list_tup_piezometre)
+        # Téléchargement incrémental : élimination des mesures déjà présentes dans le dernier résultat
+        # (le dernier jour de chaque piézomètre est demandé à nouveau : ses mesures sont comparées aux mesures enregistrées)
+        if dict_resultat_existant is not None:
+            list_champ_comparaison = ["code_bss", "date_mesure", "niveau_nappe_eau"]
+            df_existant = UtilitaireCouches.lire_lignes_dates_max_geopackage(dict_resultat_existant["chemin_geopackage"],
+                                                                             dict_resultat_existant["nom_table_donnees"],
+                                                                             "code_bss", "date_mesure", list_champ_comparaison)
+            df_data_piezo = self.pplan.filtrer_donnees_nouvelles(df_data_piezo, dict_date_debut, "date_mesure",
+                                                                 df_existant, list_champ_comparaison)
+
+        # Dernière étape où il est possible d'annuler
+        self.controler_interruption_utilisateur()
+
+        # Téléchargement incrémental : ajout des nouvelles mesures au dernier résultat
+        if dict_resultat_existant is not None:
+            self.ajouter_data_piezometre_incremental(df_data_piezo, dict_resultat_existant)
+            chemin_dossier_resultat = os.path.dirname(dict_resultat_existant["chemin_geopackage"])
+
+        # Si le df résultat pour les chroniques piézométriques contient des données
+        elif len(df_data_piezo) > 0:
+
+            # Suppression des doublons du df résultat (doublons ADES) et tri
+            df_data_piezo = df_data_piezo.drop_duplicates()
+            df_data_piezo = df_data_piezo.sort_values(['code_bss', 'date_mesure'])     # En attendant de disposer de id_bss !
+
+            # Création du sous-dossier qui contiendra les résultats d'analyse et le geopackage des points correspondantes
+            nb_point = str(df_data_piezo['code_bss'].unique().shape[0])
+            horodate_resultat = datetime.datetime.now().strftime('%y%m%d%H%M%S')
+            nom_dossier_resultat = f"Résultats_Piézométrie_{nb_point}_points_{horodate_resultat}"
+            chemin_dossier_resultat = os.path.join(chemin_dossier_geopackage, nom_dossier_resultat)
+            os.mkdir(chemin_dossier_resultat)
+            chemin_geopackage_resultat = os.path.join(chemin_dossier_resultat, nom_dossier_resultat + '.gpkg')
+
+            # Création du df des métadonnées des points d'eau
+            df_infos = df_data_piezo[self.preq.list_col_metadata_niveaux_nappes_chroniques_csv + ['x_wgs84', 'y_wgs84']]
+            df_infos['code_param'] = ''
+            df_infos['nom_param'] = 'Niveaux_Piézométriques'
+            df_infos = df_infos.drop_duplicates()
+
+            # Ecriture directe du df dans un nouveau geopackage avec reprojection dans la projection demandée par l'utilisateur
+            self.ecrire_couche_geopackage(chemin_geopackage_resultat, df_infos, "Points_Niveaux_Piézométriques", "EPSG:4326", epsg_reproj,
+                                          ajouter_couche=False, champ_x="x_wgs84", champ_y="y_wgs84")
+
+            # Création du df des niveaux piézométriques et écriture au format csv
+            df_resultat = df_data_piezo[['code_bss'] + self.preq.list_col_data_niveaux_nappes_chroniques_csv]
+            df_resultat['commentaire'] = 'Correct'  # Ajout d'un champ commentaire pour que l'utilisateur puisse commenter chaque analyse
+            nom_csv_resultat = f"Données_Niveaux_{horodate_resultat}.csv"
+            chemin_csv_resultat = os.path.join(chemin_dossier_resultat, nom_csv_resultat)
+            self.pio.ecrire_fichier_csv(df_resultat, chemin_csv_resultat)
+
+            # Ajout de la table des niveaux piézométriques dans le geopackage déjà existant (écriture directe du df)
+            # et indexation des champs filtrés pour le tracé des graphiques
+            self.ecrire_couche_geopackage(chemin_geopackage_resultat, df_resultat, nom_csv_resultat, ajouter_couche=True)
+            UtilitaireCouches.creer_index_geopackage(chemin_geopackage_resultat, nom_csv_resultat, self.list_champ_index_niveaux)
+
+            # Les couches du geopackage sont ajoutées à la carte à la fin de la tâche, dans le thread de l'interface
+            tache.differer(self.afficher_resultat, chemin_geopackage_resultat, nom_dossier_resultat,
+                           ["Points_Niveaux_Piézométriques", nom_csv_resultat])
+
+            self.differer_message("Le téléchargement des données est terminé.", "Données disponibles")
 
-                    # Création du groupe qui contiendra les couches de points par paramètre
-                    groupe_parent_couche_courante = self.iface.layerTreeView().currentGroupNode()
-                    groupe_couche = groupe_parent_couche_courante.addGroup(nom_dossier_resultat)
+        else:
+            self.differer_avertissement(
+                """La requête vers Hubeau n'a renvoyé aucun résultat :
+                il n'existe aucune chronique piézométrique correspondant à la sélection de points effectuée."""
+            )
 
-                    # Création du df des métadonnées des points d'eau et écriture d'un csv temporaire
-                    df_infos = df_data_piezo[self.preq.list_col_metadata_niveaux_nappes_chroniques_csv + ['x_wgs84', 'y_wgs84']]
-                    df_infos['code_param'] = ''
-                    df_infos['nom_param'] = 'Niveaux_Piézométriques'
-                    df_infos = df_infos.drop_duplicates()
-                    chemin_csv_temp = os.path.join(chemin_dossier_resultat, "Temp.csv")
-                    self.pio.ecrire_fichier_csv(df_infos, chemin_csv_temp)
+        tache.avancer(tache.nb_etapes)  # progress bar 100%
+        self.signaler_echecs(df_echec, chemin_dossier_resultat)
 
-                    # Lecture du fichier csv temporaire qui vient d'être écrit sur le disque et création d'une couche qgis temporaire sans ajout à la carte
-                    couche_infos = self.lire_couche_csv(chemin_csv_temp, "Couche_Temporaire", ";",
-                                                        champ_x="x_wgs84", champ_y="y_wgs84", epsg="EPSG:4326", ajouter_carte=False)
+    def terminer_telecharger_data_piezometre(self, tache):
+        """
+        Fin de la tâche de téléchargement des chroniques piézométriques (thread de l'interface) :
+        ajout des couches à la carte, messages à l'utilisateur et réinitialisation des widgets
 
-                    # Ecriture de la couche qgis en mémoire dans un nouveau geopackage avec reprojection dans la projection demandée par l'utilisateur
-                    epsg_reproj = self.get_epsg_selectionnee()
-                    self.ecrire_couche_geopackage(chemin_geopackage_resultat, couche_infos, "Points_Niveaux_Piézométriques", "EPSG:4326", epsg_reproj, ajouter_couche=False)
+        :param tache: tâche Qgis terminée
+        :type tache: Pick_Task
+        """
+        try:
+            self.terminer_tache(tache)
+        except ErreurInterruptionUtilisateur:
+            self.iface.messageBar().pushMessage("Opération interrompue par l'utilisateur : " +
+                                                "le téléchargement des données est incomplet...",
+                                                Qgis.Critical)
+        except ErreurCreationCoucheQgis:
+            self.iface.messageBar().pushMessage("La couche Qgis n'est pas valide et n'a pas été créée.",
+                                                Qgis.Critical)
+        except Exception:
+            self.iface.messageBar().pushMessage("Erreur inconnue : " +
+                                                "le téléchargement des données est probablement incomplet ou n'a pas été effectué...",
+                                                Qgis.Critical)
+        finally:
+            self.dockwidget.progressBar.reset()
+            self.dockwidget.pb_annuler.setEnabled(False)
+            self.activer_boutons_telechargement(True)
 
-                    # Lecture du geopackage et ajout de la nouvelle couche dans le nouveau groupe de couches des résultats
-                    self.lire_couche_geopackage(chemin_geopackage_resultat, "Points_Niveaux_Piézométriques", groupe_couche, developper_groupe=False)
+    def telecharger_par_point(self, tache, list_args_requete, num_iteration_progressbar, fonction_morceau=None):
+        """
+        Envoie en parallèle les requêtes Hubeau par point et collecte leurs résultats au fur et à mesure de leur réception :
+        les résultats corrects sont ajoutés à un collecteur (pick_collecte.Pick_Sink) et concaténés en une seule fois,
+        les stations des requêtes restées en échec (après les renvois prévus par la politique d'envoi des requêtes)
+        ou reçues en partie (résultats partiels conservés) sont listées pour être signalées en fin de téléchargement.
 
-                    # Création du df des niveaux piézométriques et écriture au format csv
-                    df_resultat = df_data_piezo[['code_bss'] + self.preq.list_col_data_niveaux_nappes_chroniques_csv]
-                    df_resultat['commentaire'] = 'Correct'  # Ajout d'un champ commentaire pour que l'utilisateur puisse commenter chaque analyse
-                    nom_csv_resultat = f"Données_Niveaux_{horodate_resultat}.csv"
-                    chemin_csv_resultat = os.path.join(chemin_dossier_resultat, nom_csv_resultat)
-                    self.pio.ecrire_fichier_csv(df_resultat, chemin_csv_resultat)
+        :param tache: tâche Qgis en cours (progression et volume des données reçues)
+        :type tache: Pick_Task
 
-                    # Lecture du fichier csv des niveaux piézométriques qui vient d'être écrit sur le disque et création d'une couche qgis temporaire sans ajout à la carte
-                    couche_donnees_niveaux = self.lire_couche_csv(chemin_csv_resultat, "Couche_Temporaire_Data_Niveaux", ";", ajouter_carte=False)
+        :param list_args_requete: liste des arguments des requêtes (voir Pick_Plan.planifier_requetes_par_point)
+        :type list_args_requete: list
 
-                    # Ajout de la couche des analyses chimiques dans le geopackage déjà existant
-                    self.ecrire_couche_geopackage(chemin_geopackage_resultat, couche_donnees_niveaux, nom_csv_resultat, ajouter_couche=True)
+        :param num_iteration_progressbar: étape de la barre de progression atteinte avant l'envoi des requêtes
+        :type num_iteration_progressbar: int
 
-                    # Lecture du geopackage et ajout de la nouvelle couche des analyses chimiques dans le nouveau groupe de couches des résultats
-                    self.lire_couche_geopackage(chemin_geopackage_resultat, nom_csv_resultat, groupe_couche, developper_groupe=False)
+        :param fonction_morceau: fonction appliquée à chaque df reçu avant sa collecte (p.ex Pick_Norm.separer),
+                                 None = df collectés tels quels
+        :type fonction_morceau: function
 
-                    self.dockwidget.progressBar.setValue(nb_req)  # progress bar 100%
+        :return: tuple (df des données reçues, df des stations en échec avec le statut de la requête)
+        :rtype: tuple
+        """
+        psink = Pick_Sink(fonction_volume=tache.signaler_volume)
+        list_echec = []
+
+        def collecter_resultat(index_requete, resultat):
+            # Requête non envoyée (interruption demandée par l'utilisateur)
+            if resultat is None:
+                return
+            df_req, statut_req = resultat
+            if statut_req in (200, 206):
+                psink.ajouter(df_req if fonction_morceau is None else fonction_morceau(df_req))
+            if statut_req != 200:
+                code_point = list_args_requete[index_requete][0]
+                list_code_point = [code_point] if isinstance(code_point, str) else code_point
+                for code_point in list_code_point:
+                    list_echec.append((code_point, "206 (résultat partiel)" if statut_req == 206 else str(statut_req)))
+
+        self.pdownload.executer(self.preq.requete_hubeau_par_point,
+                                list_args_requete,
+                                fonction_controle=self.controler_interruption_utilisateur,
+                                fonction_progression=lambda nb_requete_terminee:
+                                    tache.avancer(num_iteration_progressbar + nb_requete_terminee),
+                                fonction_resultat=collecter_resultat)
+        df_echec = pd.DataFrame(list_echec, columns=['code_bss', 'statut_requete']).drop_duplicates()
+        return (psink.concatener(), df_echec)
+
+    def signaler_echecs(self, df_echec, chemin_dossier_resultat=None):
+        """
+        Signale à l'utilisateur les stations dont le téléchargement est resté en échec ou n'est que partiel
+        et écrit leur liste dans le dossier résultat (fichier Echecs_Téléchargement.csv).
 
-                    self.iface.messageBar().pushMessage("Le téléchargement des données est terminé.", "Données disponibles")
+        :param df_echec: df des stations en échec (voir telecharger_par_point)
+        :type df_echec: DataFrame
 
-                else:
-                    self.iface.messageBar().pushWarning(
-                        """La requête vers Hubeau n'a renvoyé aucun résultat :
-                        il n'existe aucune chronique piézométrique correspondant à la sélection de points effectuée."""
-                    )
+        :param chemin_dossier_resultat: dossier résultat du téléchargement (None si aucun dossier n'a été créé)
+        :type chemin_dossier_resultat: str
+        """
+        if len(df_echec) == 0:
+            return
+        list_code_bss = sorted(df_echec['code_bss'].unique())
+        message = f"{len(list_code_bss)} station(s) n'ont pas pu être téléchargées entièrement : " + ", ".join(list_code_bss[:10])
+        if len(list_code_bss) > 10:
+            message += "..."
+        if (chemin_dossier_resultat is not None) and os.path.isdir(chemin_dossier_resultat):
+            chemin_csv_echec = os.path.join(chemin_dossier_resultat, "Echecs_Téléchargement.csv")
+            self.pio.ecrire_fichier_csv(df_echec, chemin_csv_echec)
+            message += " (liste complète dans " + chemin_csv_echec + ")"
+        self.differer_avertissement(message, "Téléchargement incomplet")
+
+    def ajouter_data_piezometre_incremental(self, df_data_piezo, dict_resultat_existant):
+        """
+        Ajoute les nouvelles mesures piézométriques (et les nouveaux piézomètres) au geopackage du dernier résultat
+        piézométrique, puis recharge les couches correspondantes du projet.
 
-            self.dockwidget.progressBar.reset()
+        :param df_data_piezo: nouvelles mesures (avec les coordonnées x_wgs84 et y_wgs84 des piézomètres)
+        :type df_data_piezo: DataFrame
 
-        except ErreurInterruptionUtilisateur:
-            self.iface.messageBar().pushMessage("Opération interrompue par l'utilisateur : " +
-                                                "le téléchargement des données est incomplet...",
-                                                Qgis.Critical)
+        :param dict_resultat_existant: résultat de la fonction UtilitaireCouches.rechercher_dernier_resultat
+        :type dict_resultat_existant: dict
+        """
+        chemin_geopackage_resultat = dict_resultat_existant["chemin_geopackage"]
+        if len(df_data_piezo) == 0:
+            self.differer_message("Aucune nouvelle mesure piézométrique depuis le dernier téléchargement.",
+                                  "Données à jour")
+            return
+
+        df_data_piezo = df_data_piezo.drop_duplicates()
+        df_data_piezo = df_data_piezo.sort_values(['code_bss', 'date_mesure'])
+
+        # Ajout des piézomètres absents du dernier résultat à la couche de points
+        set_code_bss_existant = UtilitaireCouches.lire_valeurs_distinctes_geopackage(chemin_geopackage_resultat,
+                                                                                     "Points_Niveaux_Piézométriques", "code_bss")
+        df_infos = df_data_piezo[self.preq.list_col_metadata_niveaux_nappes_chroniques_csv + ['x_wgs84', 'y_wgs84']].drop_duplicates()
+        df_infos = df_infos[~df_infos['code_bss'].isin(set_code_bss_existant)]
+        df_infos['code_param'] = ''
+        df_infos['nom_param'] = 'Niveaux_Piézométriques'
+        if len(df_infos) > 0:
+            UtilitaireCouches.ajouter_lignes_geopackage(chemin_geopackage_resultat, "Points_Niveaux_Piézométriques", df_infos,
+                                                        champ_x="x_wgs84", champ_y="y_wgs84")
+
+        # Ajout des nouvelles mesures à la table des niveaux piézométriques
+        df_resultat = df_data_piezo[['code_bss'] + self.preq.list_col_data_niveaux_nappes_chroniques_csv]
+        df_resultat['commentaire'] = 'Correct'
+        nb_mesure = UtilitaireCouches.ajouter_lignes_geopackage(chemin_geopackage_resultat,
+                                                                dict_resultat_existant["nom_table_donnees"], df_resultat)
+        # Index créé si le dernier résultat a été téléchargé par une version précédente de PickEau
+        UtilitaireCouches.creer_index_geopackage(chemin_geopackage_resultat, dict_resultat_existant["nom_table_donnees"],
+                                                 self.list_champ_index_niveaux)
+
+        # Les couches du projet sont rechargées à la fin de la tâche, dans le thread de l'interface
+        self.tache.differer(UtilitaireCouches.recharger_couches_geopackage, chemin_geopackage_resultat)
+        self.differer_message(f"{nb_mesure} nouvelles mesures ajoutées au dernier téléchargement.",
+                              "Données disponibles")
 
     def get_epsg_selectionnee(self) -> str:
         """
@@ -17,9 +17,13 @@ from qgis.utils import plugins
 
 
 from functools import partial
-import re
 import json
 import importlib
+import uuid
+import numpy as np
+
+from .pick_echantillonnage import Pick_Lod
+from .pick_series import Pick_Store
 
 # Add by Bgrenard --> improve it later
 plotly_installee = True
@@ -89,6 +93,18 @@ class Pick_Pg_Graph():
             self.point_layer = None
             self.ecraser_graphique = True
             self.plot_path = None
+            # Le code html du graphique n'est lu qu'à l'affichage de l'onglet du code html de DataPlotly
+            self.raw_plot_text_a_charger = False
+
+            # Sous-échantillonnage des longues chroniques avant leur tracé (niveau de détail selon la largeur du graphique)
+            dict_config_graphique = self.ptools.lire_fichier_config()["graphique"]
+            self.plod = Pick_Lod(dict_config_graphique)
+
+            # Chroniques en mémoire des tables de données (lues une seule fois par table puis filtrées par des masques)
+            self.memoire_series = dict_config_graphique["memoire_series"]
+            self.pstore = Pick_Store()
+            self.set_id_couche_surveillee = set()
+            self.list_condition = []
 
             # Widgets de filtre sur les données
             date_debut = QDate.fromString('01/01/1900', 'dd/MM/yyyy')
@@ -129,6 +145,8 @@ class Pick_Pg_Graph():
             # Connecte le widget statusBarMessage de DataPlotly à la fonction de sélection des points sur la carte
             # (DataPlotly envoie par ce biais les informations sur la couche et le point sélectionné)
             self.dataPlotlyDockwidget.plot_view.statusBarMessage.connect(self.selectionner_data_et_points)
+            # Connecte le changement de page de DataPlotly à la lecture du code html (onglet du code html brut)
+            self.dataPlotlyDockwidget.stackedPlotWidget.currentChanged.connect(self.charger_raw_plot_text)
 
     # ==========================================================================
     # Fonctions de mise en page
@@ -204,12 +222,8 @@ class Pick_Pg_Graph():
             if len(list_code_bss) > 0:
                 # Si le type de graphique est de type 'scatter' (détourné pour tracer des courbes temporelles)
                 if self.type_graphique == 'scatter':
-                    # Boucle sur tous les points sélectionnés
-                    for code_bss in list_code_bss:
-                        # Filtre la table de données selon le code bss du point
-                        self.construire_filtre_donnee([code_bss])
-                        # Appel de la fonction de tracé de graphique sur DataPlotly
-                        self.tracer_graphique_dataplotly(id_point=code_bss)
+                    # Tracé groupé : une seule requête sur la table de données pour tous les points sélectionnés
+                    self.tracer_graphique_groupe(list_code_bss)
 
                 # Si le type de graphique est de type boxplot
                 elif self.type_graphique == 'box':
@@ -228,6 +242,41 @@ class Pick_Pg_Graph():
                                                 Qgis.Critical)
 
 
+    def tracer_graphique_groupe(self, list_code_bss):
+        """
+        Trace une courbe par point sélectionné à partir d'une seule lecture de la table de données :
+        les lignes de tous les points sont filtrées et lues en une fois, regroupées par code bss en mémoire,
+        puis les courbes sont ajoutées à DataPlotly et la mise en page n'est construite qu'une fois.
+        :param list_code_bss: (list) codes bss des points sélectionnés
+        """
+        point_code, x_time, y_data = self.lire_champs_donnee()
+        # Filtre la table de données selon les codes bss de tous les points
+        self.construire_filtre_donnee(list_code_bss)
+        dict_colonne = self.lire_donnees_filtrees([point_code, x_time, y_data])
+
+        # Regroupement des lignes par code bss : tri stable (l'ordre des lignes d'un point est conservé)
+        # puis recherche des bornes de chaque code bss dans les codes triés
+        array_code = dict_colonne[point_code].astype(str)
+        array_ordre = np.argsort(array_code, kind='stable')
+        array_code_trie = array_code[array_ordre]
+
+        # Effacement unique des graphiques précédents avant l'ajout de toutes les courbes
+        self.verifier_chargement_plugins()
+        if self.ecraser_graphique == True:
+            self.vider_graphiques_dataplotly()
+
+        # Une courbe par point, dans l'ordre de la sélection (codes bss en double ignorés)
+        for code_bss in dict.fromkeys(list_code_bss):
+            debut = np.searchsorted(array_code_trie, str(code_bss), side='left')
+            fin = np.searchsorted(array_code_trie, str(code_bss), side='right')
+            array_index = array_ordre[debut:fin]
+            dict_colonne_point = {champ: valeurs[array_index] for champ, valeurs in dict_colonne.items()}
+            self.tracer_graphique_dataplotly(id_point=code_bss, dict_colonne=dict_colonne_point, creer_graphique=False)
+
+        # Construction de la mise en page avec toutes les courbes ajoutées
+        self.createPlotDataPlotly()
+
+
     def rechercher_data_layer(self):
         """
         Fonction de recherche de la couche de données associée
@@ -348,8 +397,7 @@ class Pick_Pg_Graph():
                     # couche_data.removeSelection()
                     # Définit le type de données
                     type_data = dict_graph["type_data"]
-                    # Définit le nom du paramètre
-                    nom_parametre = dict_graph["nom_parametre"]
+                    code_parametre = dict_graph["code_parametre"]
 
         except:
             dic_status = None
@@ -368,32 +416,25 @@ class Pick_Pg_Graph():
                     couche_data.selectByIds([dic_status['fidd']])
                 elif dic_status['type'] == 'box':
                     if type_data == 'analyse':
-                        expr = f'"{dic_status["field"]}" = \'{dic_status["id"]}\' AND "nom_param" = \'{nom_parametre}\''
+                        code_param = self.convertir_valeur_champ(couche_data, "code_param", code_parametre)
+                        expr = f'"{dic_status["field"]}" = \'{dic_status["id"]}\' AND "code_param" = {QgsExpression.quotedValue(code_param)}'
                     else:
                         # build the expression from the js dic_status (customdata)
                         expr = f'"{dic_status["field"]}" = \'{dic_status["id"]}\''
                     # set the iterator with the expression as filter in feature request
                     request = QgsFeatureRequest().setFilterExpression(expr)
-                    it = couche_data.getFeatures(request)
-                    couche_data.selectByIds([f.id() for f in it])
-
-            list_code_param = []
-            list_code_bss = []
-
-            # Obtient la liste des lignes sélectionnées de la table de données
-            iter_selected_rows = couche_data.getSelectedFeatures()
-            # Boucle sur chaque ligne pour sélectionner la liste des codes paramètre et des codes bss
-            # en supprimant les doublons
-            for row in iter_selected_rows:
-                if 'Données_Analyses_' in couche_data.name():
-                    list_code_param.append(row['code_param'])
-                    list_code_bss.append(row['code_bss'])
-                elif 'Données_Niveaux_' in couche_data.name():
-                    list_code_param.append("Niveaux")
-                    list_code_bss.append(row['code_bss'])
-            # Suppression des doublons des listes de points et de paramètres
-            list_code_param = list(set(list_code_param))
-            list_code_bss = list(set(list_code_bss))
+                    couche_data.selectByIds(self.extraire_colonnes(couche_data, request, [])["id"].tolist())
+
+            # Lecture des codes paramètre et des codes bss des lignes sélectionnées de la table de données
+            # et suppression des doublons
+            request = QgsFeatureRequest().setFilterFids(couche_data.selectedFeatureIds())
+            if 'Données_Analyses_' in couche_data.name():
+                dict_colonne = self.extraire_colonnes(couche_data, request, ['code_param', 'code_bss'])
+                list_code_param = list(set(dict_colonne['code_param'].tolist()))
+            else:
+                dict_colonne = self.extraire_colonnes(couche_data, request, ['code_bss'])
+                list_code_param = ["Niveaux"] if len(dict_colonne['code_bss']) > 0 else []
+            list_code_bss = list(set(dict_colonne['code_bss'].tolist()))
 
             # Pour chaque code paramètre de la liste
             for code_param in list_code_param:
@@ -412,7 +453,7 @@ class Pick_Pg_Graph():
                             self.iface.layerTreeView().setCurrentLayer(point_layer)
                             break
                 # Sélectionne par une expression les points bss de la couche de points
-                expr = f'("code_bss" IN ({str(list_code_bss)[1:-1]}))'
+                expr = f'("code_bss" IN ({", ".join(QgsExpression.quotedValue(code_bss) for code_bss in list_code_bss)}))'
                 couche_point.selectByExpression(expr, QgsVectorLayer.SetSelection)
 
         except:
@@ -474,6 +515,115 @@ class Pick_Pg_Graph():
     #         point_layer.selectByExpression(expr, QgsVectorLayer.SetSelection)
 
 
+    @staticmethod
+    def extraire_colonnes(couche, request, list_champ):
+        """
+        Lecture en une seule requête des valeurs de quelques champs des lignes d'une couche :
+        seuls les champs demandés (et ceux de l'expression de filtre) sont lus, sans les géométries.
+        :param couche: (QgsVectorLayer) couche à lire
+        :param request: (QgsFeatureRequest) requête (filtre) des lignes à lire, non modifiée
+        :param list_champ: (list) noms des champs à lire
+        :return: (dict) clé = nom du champ ou "id" (identifiants des lignes) / valeur = numpy array des valeurs
+        """
+        request = QgsFeatureRequest(request)
+        request.setFlags(request.flags() | QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes(list_champ, couche.fields())
+        list_index = [couche.fields().lookupField(champ) for champ in list_champ]
+        list_id = []
+        list_list_valeur = [[] for champ in list_champ]
+        for feature in couche.getFeatures(request):
+            list_id.append(feature.id())
+            attributs = feature.attributes()
+            for list_valeur, index in zip(list_list_valeur, list_index):
+                list_valeur.append(attributs[index])
+        dict_colonne = {"id": np.array(list_id, dtype=np.int64)}
+        for champ, list_valeur in zip(list_champ, list_list_valeur):
+            try:
+                dict_colonne[champ] = np.array(list_valeur)
+            except (TypeError, ValueError):
+                dict_colonne[champ] = np.array(list_valeur, dtype=object)
+        return dict_colonne
+
+    def lire_champs_series(self):
+        """
+        Renvoie les champs de la table de données conservés en mémoire : champs tracés et champs des filtres.
+        :return: (tuple) liste des champs clés de l'index, liste de tous les champs
+        """
+        point_code, x_time, y_data = self.lire_champs_donnee()
+        if self.type_data == 'niveau':
+            return [point_code], [point_code, x_time, y_data, 'qualification', 'commentaire']
+        return [point_code, 'code_param'], [point_code, 'code_param', x_time, y_data, 'code_qualification', 'commentaire']
+
+    def lire_donnees_filtrees(self, list_champ):
+        """
+        Lit les colonnes des lignes de la table de données qui vérifient le filtre courant (voir construire_filtre_donnee).
+        Si les chroniques en mémoire sont activées, la table est lue une seule fois (toutes les lignes) puis filtrée
+        en mémoire ; les chroniques de la table sont invalidées à la modification de ses lignes (commentaires).
+        :param list_champ: (list) noms des champs à lire
+        :return: (dict) clé = nom du champ ou "id" / valeur = numpy array des valeurs (voir extraire_colonnes)
+        """
+        if not self.memoire_series:
+            return self.extraire_colonnes(self.data_layer, self.request, list_champ)
+        id_couche = self.data_layer.id()
+        if not self.pstore.contient(id_couche):
+            list_champ_cle, list_champ_serie = self.lire_champs_series()
+            dict_colonne = self.extraire_colonnes(self.data_layer, QgsFeatureRequest(), list_champ_serie)
+            self.pstore.charger(id_couche, dict_colonne, list_champ_cle)
+            # Invalidation des chroniques à la modification des lignes (ou à l'annulation des modifications)
+            # et à la suppression de la couche
+            if id_couche not in self.set_id_couche_surveillee:
+                self.set_id_couche_surveillee.add(id_couche)
+                self.data_layer.attributeValueChanged.connect(partial(self.invalider_series, id_couche))
+                self.data_layer.afterRollBack.connect(partial(self.invalider_series, id_couche))
+                self.data_layer.willBeDeleted.connect(partial(self.invalider_series, id_couche))
+        return self.pstore.filtrer(id_couche, self.list_condition, list_champ)
+
+    def invalider_series(self, id_couche, *args):
+        """
+        Supprime de la mémoire les chroniques d'une table de données (connectée aux signaux de modification de la couche).
+        :param id_couche: (str) id de la couche de données
+        :param args: arguments des signaux (ignorés)
+        """
+        self.pstore.invalider(id_couche)
+
+    @staticmethod
+    def convertir_valeur_champ(couche, champ, valeur):
+        """
+        Convertit une valeur lue comme du texte (p.ex code du paramètre extrait du nom de la couche de points)
+        dans le type du champ de la couche : les codes de la table des analyses sont enregistrés en entiers ou en texte
+        selon leur encodage (voir pick_normalisation.Pick_Norm.encoder_colonne).
+        :param couche: (QgsVectorLayer) couche de données
+        :param champ: (str) nom du champ
+        :param valeur: (str) valeur à convertir
+        :return: valeur du type du champ (int ou float si le champ est numérique, str sinon)
+        """
+        index_champ = couche.fields().indexOf(champ)
+        if (index_champ >= 0) and couche.fields().at(index_champ).isNumeric():
+            valeur_numerique = float(valeur)
+            return int(valeur_numerique) if valeur_numerique.is_integer() else valeur_numerique
+        return str(valeur)
+
+    @staticmethod
+    def construire_expression(list_condition):
+        """
+        Traduit une liste de conditions (champ, opérateur, valeur) en expression de filtre Qgis.
+        Les valeurs sont échappées : l'expression n'est composée que de champs, de constantes et d'opérateurs
+        de comparaison pour pouvoir être traduite en sql et exécutée par OGR / sqlite
+        (utilisation des index des tables de données, voir UtilitaireCouches.creer_index_geopackage)
+        :param list_condition: (list) tuples (champ, opérateur, valeur), voir pick_series.Pick_Store
+        :return: (str) expression de filtre (chaîne vide si aucune condition)
+        """
+        list_expr = []
+        for champ, operateur, valeur in list_condition:
+            if operateur == "IN":
+                liste_valeur = ", ".join(QgsExpression.quotedValue(v) for v in valeur)
+                list_expr.append(f'("{champ}" IN ({liste_valeur}))')
+            elif operateur == "NOT NULL":
+                list_expr.append(f'("{champ}" IS NOT NULL)')
+            else:
+                list_expr.append(f'("{champ}" {operateur} {QgsExpression.quotedValue(valeur)})')
+        return " AND ".join(list_expr)
+
     def construire_filtre_donnee(self, list_code_bss):
         """
         Filtre les lignes de la couche de données selon les points
@@ -484,75 +634,74 @@ class Pick_Pg_Graph():
         date_fin = self.graphDockwidget.de_dateFinChronique.date().toString('yyyy-MM-dd')
         qualification = self.graphDockwidget.cbx_choisirQualificationAdes.currentText()
         commentaire = self.graphDockwidget.cbx_choisirCommentairePickEau.currentText()
+        # Liste des conditions du filtre (champ, opérateur, valeur) : elle est traduite en expression de filtre
+        # de la couche (voir construire_expression) et appliquée aux chroniques en mémoire (voir lire_donnees_filtrees)
+        list_condition = []
 
         if len(list_code_bss) > 0:
 
             # Si les données sont des analyses chimiques
             if self.type_data == "analyse":
 
-                # Construction du fragment principal de l'expression de filtre
-                expr_principal = f'("code_bss" IN ({str(list_code_bss)[1:-1]})) \
-                                 AND ("code_param" = {self.code_parametre}) \
-                                 AND ("date_debut_prelevement" >= \'{date_debut}\') \
-                                 AND ("date_debut_prelevement" <= \'{date_fin}\')'
-
-                # Construction du fragment de filtre concernant la qualification ADES des données
+                # Conditions principales : points, paramètre et période
+                # (code du paramètre comparé dans le type du champ : entier ou texte)
+                code_param = self.convertir_valeur_champ(self.data_layer, "code_param", self.code_parametre)
+                list_condition += [("code_bss", "IN", list(list_code_bss)),
+                                   ("code_param", "=", code_param),
+                                   ("date_debut_prelevement", ">=", date_debut),
+                                   ("date_debut_prelevement", "<=", date_fin)]
+
+                # Condition concernant la qualification ADES des données
+                # (la table des analyses ne contient que le code de la qualification, libellés dans la table des nomenclatures)
+                dict_code = self.pconfig.dict_code_qualification_ades
                 if qualification == 'Correcte uniquement':
-                    expr_qualification = ' AND ("nom_qualification" LIKE \'Correcte\')'
-                elif qualification == 'Toutes':
-                    expr_qualification = ''
+                    list_condition.append(("code_qualification", "=", dict_code["Correcte"]))
                 elif qualification == 'Exclure incorrecte':
-                    expr_qualification = ' AND ("nom_qualification" NOT LIKE \'Incorrecte\')'
+                    list_condition.append(("code_qualification", "<>", dict_code["Incorrecte"]))
                 elif qualification == 'Exclure incertaine':
-                    expr_qualification = ' AND ("nom_qualification" NOT LIKE \'Incertaine\')'
+                    list_condition.append(("code_qualification", "<>", dict_code["Incertaine"]))
                 elif qualification == 'Exclure non définissable':
-                    expr_qualification = ' AND ("nom_qualification" NOT LIKE \'Qualification non définissable\')'
+                    list_condition.append(("code_qualification", "<>", dict_code["Qualification non définissable"]))
 
-                # Construction du fragment de filtre concernant la validité du résultat
-                expr_resultat = ' AND ("resultat" IS NOT NULL)'
+                # Condition concernant la validité du résultat
+                list_condition.append(("resultat", "NOT NULL", None))
 
             # Si les données sont des niveaux piézométriques
             if self.type_data == "niveau":
 
-                # Construction du fragment principal de l'expression de filtre
-                expr_principal = f'("code_bss" IN ({str(list_code_bss)[1:-1]})) \
-                     AND ("date_mesure" >= \'{date_debut}\') \
-                     AND ("date_mesure" <= \'{date_fin}\')'
+                # Conditions principales : points et période
+                list_condition += [("code_bss", "IN", list(list_code_bss)),
+                                   ("date_mesure", ">=", date_debut),
+                                   ("date_mesure", "<=", date_fin)]
 
-                # Construction du fragment de filtre concernant la qualification ADES des données
-                if qualification == 'Toutes':
-                    expr_qualification = ''
-                elif qualification == 'Correcte uniquement':
-                    expr_qualification = ' AND ("qualification" LIKE \'Correcte\')'
+                # Condition concernant la qualification ADES des données
+                if qualification == 'Correcte uniquement':
+                    list_condition.append(("qualification", "LIKE", 'Correcte'))
                 elif qualification == 'Exclure incorrecte':
-                    expr_qualification = ' AND ("qualification" NOT LIKE \'Incorrecte\')'
+                    list_condition.append(("qualification", "NOT LIKE", 'Incorrecte'))
                 elif qualification == 'Exclure incertaine':
-                    expr_qualification = ' AND ("qualification" NOT LIKE \'Incertaine\')'
+                    list_condition.append(("qualification", "NOT LIKE", 'Incertaine'))
                 elif qualification == 'Exclure non définissable':
-                    expr_qualification = ' AND ("qualification" NOT LIKE \'Qualification non définissable\')'
+                    list_condition.append(("qualification", "NOT LIKE", 'Qualification non définissable'))
 
-                # Construction du fragment de filtre concernant la validité du résultat
-                expr_resultat = ' AND ("niveau_nappe_eau" IS NOT NULL)'
+                # Condition concernant la validité du résultat
+                list_condition.append(("niveau_nappe_eau", "NOT NULL", None))
 
-            # Construction du fragment de filtre concernant le commentaire PickEau des données
+            # Condition concernant le commentaire PickEau des données
             if commentaire == 'Correct uniquement':
-                expr_commentaire = ' AND ("commentaire" LIKE \'Correct\')'
-            elif commentaire == 'Tous':
-                expr_commentaire = ''
+                list_condition.append(("commentaire", "LIKE", 'Correct'))
             elif commentaire == 'Exclure aberrant':
-                expr_commentaire = ' AND ("commentaire" NOT LIKE \'Aberrant\')'
+                list_condition.append(("commentaire", "NOT LIKE", 'Aberrant'))
             elif commentaire == 'Exclure douteux':
-                expr_commentaire = ' AND ("commentaire" NOT LIKE \'Douteux\')'
-            # expr_commentaire = ''
-
-            # Concaténation des fragments d'expression de filtre
-            expr = expr_principal + expr_qualification + expr_commentaire + expr_resultat
+                list_condition.append(("commentaire", "NOT LIKE", 'Douteux'))
 
-        else:
-            expr = ''
+        self.list_condition = list_condition
+        expr = self.construire_expression(list_condition)
 
         # Construit la requête qui sera utilisée pour obtenir les lignes correspondant au filtre
+        # (tables de données sans géométrie)
         self.request = QgsFeatureRequest().setFilterExpression(expr)
+        self.request.setFlags(QgsFeatureRequest.NoGeometry)
 
         # Filtrage de la couche
         # self.data_layer.setSubsetString(expr)
@@ -566,11 +715,26 @@ class Pick_Pg_Graph():
     # ==========================================================================
 
 
-    def tracer_graphique_dataplotly(self, id_point=''):
+    def lire_champs_donnee(self):
+        """
+        Renvoie les noms des champs de la table de données en fonction du type de donnée.
+        :return: (tuple) champ du code du point, champ de la date (x) et champ de la valeur (y)
+        """
+        if self.type_data == 'niveau':
+            return 'code_bss', 'date_mesure', 'niveau_nappe_eau'
+        return 'code_bss', 'date_debut_prelevement', 'resultat'
+
+
+    def tracer_graphique_dataplotly(self, id_point='', dict_colonne=None, creer_graphique=True):
         """
         Trace un graphique dans le plugin DataPlotly en lui passant un dictionnaire
         qui contient son type et la référence des données à tracer ainsi que
         toutes les propriétés du graphique (plot_prop) et de sa mise en page (layout_prop)
+        :param id_point: (str) code bss du point de la courbe (graphique de type scatter)
+        :param dict_colonne: (dict) colonnes déjà lues des lignes du graphique (voir extraire_colonnes),
+                             None pour lire les lignes filtrées de la table de données
+        :param creer_graphique: (bool) construit la mise en page DataPlotly ; False pour ajouter
+                                plusieurs graphiques avant de construire une seule fois la mise en page
         """
         # Appel de la fonction de vérification du chargement des plugins
         self.verifier_chargement_plugins()
@@ -578,6 +742,10 @@ class Pick_Pg_Graph():
         self.dataPlotlyDockwidget.show()
         # Mise au premier plan de l'onglet du dockwidget DataPlotly
         self.dataPlotlyDockwidget.raise_()
+        # Effacement éventuel des graphiques précédents avant l'ajout du graphique
+        # (le tracé groupé efface les graphiques une seule fois avant l'ajout de toutes les courbes)
+        if creer_graphique and self.ecraser_graphique == True:
+            self.vider_graphiques_dataplotly()
 
         # ===================================
 
@@ -585,10 +753,8 @@ class Pick_Pg_Graph():
         # avec passage d'un dictionnaire personnalisé de propriétés du graphique
 
         # Nom des champs de données en fonction du type de donnée
+        point_code, x_time, y_data = self.lire_champs_donnee()
         if self.type_data == 'niveau':
-            point_code = 'code_bss'
-            x_time = 'date_mesure'
-            y_data = 'niveau_nappe_eau'
             titre_graphique = 'Niveau piézométrique'
             if self.type_graphique == 'scatter':
                 legende = f'Niveau - {id_point}'
@@ -597,9 +763,6 @@ class Pick_Pg_Graph():
                 legende = 'Niveau'
                 self.nom_graphique = str(self.dataPlotlyDockwidget.idx) + ' Boxplot ' + legende
         elif self.type_data == 'analyse':
-            point_code = 'code_bss'
-            x_time = 'date_debut_prelevement'
-            y_data = 'resultat'
             titre_graphique = f'{self.nom_parametre} ({self.code_parametre})'
             if self.type_graphique == 'scatter':
                 legende = f'{self.nom_parametre} - {id_point}'
@@ -622,14 +785,17 @@ class Pick_Pg_Graph():
         if self.type_graphique == 'scatter':
             plot_input_dic['plot_prop']['x_name'] = x_time
             plot_input_dic['plot_prop']['y_name'] = y_data
-            # Données x et y du graphique
-            xx = [i[x_time] for i in self.data_layer.getFeatures(self.request)]
-            yy = [i[y_data] for i in self.data_layer.getFeatures(self.request)]
-            plot_input_dic['plot_prop']['x'] = xx
-            plot_input_dic['plot_prop']['y'] = yy
+            # Données x et y du graphique (champs x et y des lignes filtrées lus en une seule requête)
+            if dict_colonne is None:
+                dict_colonne = self.lire_donnees_filtrees([x_time, y_data])
+            # Réduction du nombre de points tracés selon la largeur du graphique : les id des lignes sont
+            # sous-échantillonnés avec les valeurs (sélection par clic sur le graphique inchangée)
+            dict_colonne = self.plod.sous_echantillonner(dict_colonne, x_time, y_data,
+                                                         self.dataPlotlyDockwidget.plot_view.width())
+            plot_input_dic['plot_prop']['x'] = dict_colonne[x_time].tolist()
+            plot_input_dic['plot_prop']['y'] = dict_colonne[y_data].tolist()
             # Id des points pour l'interaction entre le graphique et la table attributaire
-            ids = [i.id() for i in self.data_layer.getFeatures(self.request)]
-            plot_input_dic['plot_prop']['featureIds'] = ids
+            plot_input_dic['plot_prop']['featureIds'] = dict_colonne["id"].tolist()
             # Autres propriétés du graphique
             plot_input_dic['plot_prop']['marker_size'] = 7
             plot_input_dic['plot_prop']['marker'] = 'lines+markers'
@@ -640,14 +806,15 @@ class Pick_Pg_Graph():
         elif self.type_graphique == 'box':
             plot_input_dic['plot_prop']['x_name'] = point_code
             plot_input_dic['plot_prop']['y_name'] = y_data
-            # Données x et y du graphique
-            xx = [i[point_code] for i in self.data_layer.getFeatures(self.request)]
-            yy = [i[y_data] for i in self.data_layer.getFeatures(self.request)]
-            plot_input_dic['plot_prop']['x'] = xx
-            plot_input_dic['plot_prop']['y'] = yy
+            # Données x et y du graphique (champs x et y des lignes filtrées lus en une seule requête)
+            dict_colonne = self.lire_donnees_filtrees([point_code, y_data])
+            xx = dict_colonne[point_code]
+            plot_input_dic['plot_prop']['x'] = xx.tolist()
+            plot_input_dic['plot_prop']['y'] = dict_colonne[y_data].tolist()
             # Pour l'interaction entre le graphique et la table attributaire :
             # Id des box classés par la variable x de groupement + propriété 'custom' non commentée dans DataPlotly
-            plot_input_dic['plot_prop']['featureBox'] = sorted(set(xx), key=xx.index)
+            _, array_index_premier = np.unique(xx, return_index=True)
+            plot_input_dic['plot_prop']['featureBox'] = xx[np.sort(array_index_premier)].tolist()
             plot_input_dic['plot_prop']['custom'] = [point_code]
             # Affichage de statistiques supplémentaires sur les boxplots
             plot_input_dic['plot_prop']['box_outliers'] = 'suspectedoutliers'
@@ -757,15 +924,22 @@ class Pick_Pg_Graph():
         # initialize plot properties and build them
         self.plotobject.buildTrace()
 
+        # unique name for each plot trace (name is idx_plot, e.g. 1_scatter)
+        self.dataPlotlyDockwidget.pid = ('{}_{}'.format(str(self.dataPlotlyDockwidget.idx), plot_input_dic["plot_type"]))
+
+        # Uid de la trace défini par PickEau (et non tiré au hasard par Plotly) : Plotly conserve l'uid
+        # d'une trace dans le code html, ce qui permet de retrouver le graphique associé à un clic
+        # sans relire le code html créé par Plotly. Le pid n'est pas unique (le compteur idx de DataPlotly
+        # est réinitialisé à l'effacement des graphiques) : l'uid est donc tiré au hasard
+        uid_plotly = 'pickeau_' + uuid.uuid4().hex
+        self.plotobject.trace[0].uid = uid_plotly
+
         # Pour analyser le contenu de l'objet trace renvoyé par Plotly
         # trace = self.plotobject.trace
 
         # initialize layout properties and build them
         self.plotobject.buildLayout()
 
-        # unique name for each plot trace (name is idx_plot, e.g. 1_scatter)
-        self.dataPlotlyDockwidget.pid = ('{}_{}'.format(str(self.dataPlotlyDockwidget.idx), plot_input_dic["plot_type"]))
-
         # create default dictionary that contains all the plot and properties
         self.dataPlotlyDockwidget.plot_traces[self.dataPlotlyDockwidget.pid] = self.plotobject
 
@@ -777,7 +951,7 @@ class Pick_Pg_Graph():
                       "id_couche_data": self.data_layer.id(),
                       "type_data": self.type_data,
                       "pid_dataplotly": self.dataPlotlyDockwidget.pid,
-                      "uid_plotly": ""} # sera défini plus bas après la création de la trace par Plotly
+                      "uid_plotly": uid_plotly}
 
         # Ajoute un item dans le dictionnaire des graphiques
         # self.dict_graph_dataplotly[self.nom_graphique] = self.dataPlotlyDockwidget.pid
@@ -797,22 +971,23 @@ class Pick_Pg_Graph():
         self.dataPlotlyDockwidget.update_btn.setEnabled(True)
 
         # Appel de la fonction équivalente à la fonction createPlot de la classe DataPlotlyDockWidget
-        self.createPlotDataPlotly()
+        if creer_graphique:
+            self.createPlotDataPlotly()
 
 
     def createPlotDataPlotly(self):
         """
         Fonction équivalente à la fonction createPlot de la classe DataPlotlyDockWidget
         qui permet de tracer un graphique sur la mise en page de DataPlotly
+        (les graphiques précédents sont effacés avant l'ajout du graphique si l'option d'écrasement est active,
+        voir vider_graphiques_dataplotly)
         """
         # set the correct index page of the widget
         self.dataPlotlyDockwidget.stackedPlotWidget.setCurrentIndex(1)
         # highlight the correct plot row in the listwidget
         self.dataPlotlyDockwidget.listWidget.setCurrentRow(2)
 
-        # Effacement éventuel des graphiques précédents
         if self.ecraser_graphique == True:
-            self.dataPlotlyDockwidget.clearPlotView()
             disposition_graphique = 'Empiler'
         else:
             disposition_graphique = self.graphDockwidget.cbx_choisirDispositionGraphe.currentText()
@@ -871,31 +1046,40 @@ class Pick_Pg_Graph():
         plot_url = QUrl.fromLocalFile(self.plot_path)
         self.dataPlotlyDockwidget.plot_view.load(plot_url)
         self.dataPlotlyDockwidget.layoutw.addWidget(self.dataPlotlyDockwidget.plot_view)
+        # Le code html (dont la taille croît avec le nombre de points tracés) n'est relu depuis le disque
+        # qu'à l'affichage de l'onglet du code html : les uid des traces sont définis par PickEau
+        # à leur création (voir tracer_graphique_dataplotly)
         self.dataPlotlyDockwidget.raw_plot_text.clear()
+        self.raw_plot_text_a_charger = True
+        self.charger_raw_plot_text()
+
+
+    def charger_raw_plot_text(self, *args):
+        """
+        Lecture du code html du dernier graphique tracé dans l'onglet du code html brut de DataPlotly,
+        uniquement si cet onglet est affiché et que le code html n'a pas encore été lu
+        :param args: arguments du signal currentChanged du stackedPlotWidget de DataPlotly (non utilisés)
+        """
+        if not self.raw_plot_text_a_charger or self.plot_path is None:
+            return
+        page_courante = self.dataPlotlyDockwidget.stackedPlotWidget.currentWidget()
+        if page_courante is None or not page_courante.isAncestorOf(self.dataPlotlyDockwidget.raw_plot_text):
+            return
         with open(self.plot_path, 'r') as myfile:
-            plot_text = myfile.read()
-        self.dataPlotlyDockwidget.raw_plot_text.setPlainText(plot_text)
+            self.dataPlotlyDockwidget.raw_plot_text.setPlainText(myfile.read())
+        self.raw_plot_text_a_charger = False
 
-        # ===================================
 
-        # A chaque appel des fonctions buildFigure, buildFigures ou buildSubPlots de DataPlotly,
-        # donc à chaque appel de la fonction createPlotDataPlotly de PickEau, les uid de chaque trace
-        # sont recréés par Plotly. On les recherche donc les nouveaux uid dans le texte html
-        # nouvellement créé par Plotly et on les modifie dans le dict des graphiques PickEau
-
-        # Capture du texte décrivant la mise en page
-        match = re.search('Plotly.newPlot\((.*)\)', plot_text)
-        # Ajout de crochets pour en faire un chaîne représentant une liste python
-        substr = "[" + match.group(1) + "]"
-        # Transformation de la str en liste de dict par json
-        list_text_plot = json.loads(substr)
-        # 1er élément = id Plotly du graphique, 2ème élément = liste des dict de graphique, etc.
-        list_dict_plot = list_text_plot[1]
-        # On parcourt simultanément le dict PickEau des infos sur les graphiques et la liste Plotly des dict de graphique
-        for (nom_graph, dict_graph), dict_plot in zip(self.dict_graph_dataplotly.items(), list_dict_plot):
-            # Ajout des uid dans le dict PickEau des graphiques (la correspondance est correcte
-            # car depuis la version 3.6 de Python l'ordre d'ajout des items dans un dict est conservé !)
-            dict_graph["uid_plotly"] = dict_plot["uid"]
+    def vider_graphiques_dataplotly(self):
+        """
+        Effacement de tous les graphiques de la mise en page DataPlotly et des informations PickEau associées
+        (dictionnaire des graphiques et combobox de choix d'un graphique), pour qu'aucun graphique effacé
+        ne soit retrouvé lors d'un clic sur le graphique
+        """
+        self.dataPlotlyDockwidget.clearPlotView()
+        self.dict_graph_dataplotly = {}
+        self.graphDockwidget.cbx_choisirGraphiqueDataPlotly.clear()
+        self.graphDockwidget.cbx_choisirGraphiqueDataPlotly.addItems(["Tous"])
 
 
     def effacer_graphique(self):
@@ -913,15 +1097,10 @@ class Pick_Pg_Graph():
         nom_graphique_combobox = self.graphDockwidget.cbx_choisirGraphiqueDataPlotly.currentText()
 
         if nom_graphique_combobox == "Tous":
-            # Effacement des graphiques existants
-            self.dataPlotlyDockwidget.clearPlotView()
+            # Effacement des graphiques existants, de la combobox et du dictionnaire des graphiques DataPlotly
+            self.vider_graphiques_dataplotly()
             # Réinitialise le compteur de graphiques
             self.dataPlotlyDockwidget.idx = 1
-            # Vide la combobox des graphiques DataPlotly
-            self.graphDockwidget.cbx_choisirGraphiqueDataPlotly.clear()
-            self.graphDockwidget.cbx_choisirGraphiqueDataPlotly.addItems(["Tous"])
-            # Vide le dictionnaire associé à la combobox des noms de graphiques DataPlotly
-            self.dict_graph_dataplotly = {}
         else:
             # Obtient l'identifiant du graphique
             # pid_graphique = self.dict_graph_dataplotly[nom_graphique_combobox]
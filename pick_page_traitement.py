@@ -5,13 +5,32 @@ email: l.vaute@brgm.fr
 copyright: (C) 2019 by BRGM
 
 Module de PickEau : traitement par lot de chroniques =
-téléchargement sur Hubeau de statistiques et de tendances.
+téléchargement sur Hubeau de statistiques et calcul des tendances.
 """
 
+import datetime
+from osgeo import ogr
 from PyQt5.QtWidgets import QDockWidget, QAction, QFileDialog, QMessageBox
 from qgis.core import *
 from qgis.gui import QgsProjectionSelectionWidget
 
+from .pick_tache import Pick_Task
+from .pick_tendance import Pick_Trend, ErreurInterruptionCalcul
+from .utilitaires.utilitaire_couches import UtilitaireCouches
+
+
+# Définition des exceptions gérées par les fonctions des classes du module
+class Error(Exception):
+   """Base class for other exceptions."""
+   pass
+class ErreurCoucheResultatTendance(Error):
+   """Exception gérée levée lorsque la couche Qgis active n'appartient pas
+   à un geopackage résultat de téléchargement de données créé par PickEau."""
+   pass
+class ErreurMethodeTendance(Error):
+   """Exception gérée levée lorsque la méthode de calcul des tendances choisie n'est pas disponible."""
+   pass
+
 class Pick_Pg_Proc():
     """
     Classe liée à la page 3 de l'objet tabWidget de l'interface de PickEau :
@@ -35,14 +54,155 @@ class Pick_Pg_Proc():
         self.ptools = ptools
         self.dockwidget = dockwidget
 
+        # Calcul des tendances par lots (voir configuration "tendance")
+        self.ptrend = Pick_Trend(self.ptools.lire_fichier_config()["tendance"])
+        self.tache = None
+        # Tables des geopackages résultats : clé = début du nom de la table de données /
+        # valeur = (table des stations, champs clés des chroniques, champ date, champ valeur)
+        self.dict_table_tendance = {
+            "Données_Analyses_": ("Stations_Paramètres", ["code_bss", "code_param"], "date_debut_prelevement", "resultat"),
+            "Données_Niveaux_": ("Points_Niveaux_Piézométriques", ["code_bss"], "date_mesure", "niveau_nappe_eau")}
+
         # Condition utilisée pour le test de certaines fonctions de la classe lorsque l'accès aux objets de l'interface est impossible
         if not self.dockwidget is None:
 
-            pass
-
-    def fonction_a_venir(self):
-
-        pass
+            # Méthodes de calcul des tendances
+            self.dockwidget.cbx_choisirTendance.addItems(self.pconfig.list_lex_tendance)
+            self.dockwidget.cbx_choisirTendance.setCurrentText("Mann-Kendall")
+            self.dockwidget.pbt_calculerTendances.clicked.connect(self.calculer_tendances)
+
+    def calculer_tendances(self):
+        """
+        Fonction qui s'exécute sur appui du bouton 'pbt_calculerTendances' : calcule les tendances de toutes
+        les chroniques (une par point et par paramètre) du geopackage résultat de la couche active,
+        dans une tâche Qgis hors du thread de l'interface.
+        """
+        try:
+            if self.dockwidget.cbx_choisirTendance.currentText() != "Mann-Kendall":
+                raise ErreurMethodeTendance
+            # Geopackage résultat de la couche active et table de données qu'il contient
+            couche = self.iface.activeLayer()
+            chemin_geopackage = None if couche is None else UtilitaireCouches.get_chemin_fichier_geopackage(couche)
+            if chemin_geopackage is None:
+                raise ErreurCoucheResultatTendance
+            gpkg = ogr.Open(chemin_geopackage)
+            list_nom_table = [] if gpkg is None else [layer.GetName() for layer in gpkg]
+            gpkg = None
+            list_table_donnee = [(nom_table, prefixe) for nom_table in list_nom_table
+                                 for prefixe in self.dict_table_tendance if nom_table.startswith(prefixe)]
+            if len(list_table_donnee) == 0:
+                raise ErreurCoucheResultatTendance
+            nom_table_donnee, prefixe = list_table_donnee[0]
+            # Groupe de couches de la couche active, qui recevra les couches des tendances
+            noeud_couche = QgsProject.instance().layerTreeRoot().findLayer(couche.id())
+            groupe_couche = noeud_couche.parent() if noeud_couche is not None else QgsProject.instance().layerTreeRoot()
+            epsg_reproj = self.dockwidget.qgs_projection.crs().authid()
+        except ErreurMethodeTendance:
+            self.iface.messageBar().pushMessage("Seule la méthode Mann-Kendall (test de Mann-Kendall et pente de Sen) " +
+                                                "est disponible pour le calcul des tendances.", Qgis.Warning)
+            return
+        except ErreurCoucheResultatTendance:
+            self.iface.messageBar().pushMessage("Activez une couche d'un résultat de téléchargement de données PickEau " +
+                                                "(cliquez sur son nom dans la liste des couches) pour calculer les tendances !",
+                                                Qgis.Critical)
+            return
+
+        self.dockwidget.pbt_calculerTendances.setEnabled(False)
+        self.dockwidget.progressBar.setRange(0, 100)
+        self.dockwidget.progressBar.setValue(0)
+        self.tache = Pick_Task("PickEau - Calcul des tendances",
+                               lambda tache: self.executer_calculer_tendances(tache, chemin_geopackage, nom_table_donnee,
+                                                                             prefixe, epsg_reproj, groupe_couche),
+                               self.terminer_calculer_tendances)
+        self.tache.definir_nb_etapes(100)
+        self.tache.progressChanged.connect(lambda progression: self.dockwidget.progressBar.setValue(int(progression)))
+        QgsApplication.taskManager().addTask(self.tache)
+
+    def executer_calculer_tendances(self, tache, chemin_geopackage, nom_table_donnee, prefixe, epsg_reproj, groupe_couche):
+        """
+        Lecture des chroniques, calcul des tendances et écriture de la table des tendances et de la couche
+        des points des tendances dans le geopackage résultat (hors du thread de l'interface).
+        :param tache: (Pick_Task) tâche Qgis en cours
+        :param chemin_geopackage: (str) chemin du geopackage résultat
+        :param nom_table_donnee: (str) nom de la table de données dans le geopackage
+        :param prefixe: (str) début du nom de la table de données (clé de dict_table_tendance)
+        :param epsg_reproj: (str) code epsg de la couche des points au format du type "EPSG:2154"
+        :param groupe_couche: (QgsLayerTreeGroup) groupe de couches qui recevra les couches des tendances
+        :return: None
+        """
+        nom_table_station, list_champ_cle, champ_date, champ_valeur = self.dict_table_tendance[prefixe]
+
+        # Lecture des chroniques : les données commentées comme aberrantes sont écartées
+        df_donnee = UtilitaireCouches.lire_table_geopackage(chemin_geopackage, nom_table_donnee,
+                                                            list_champ_cle + [champ_date, champ_valeur, "commentaire"])
+        df_donnee = df_donnee[df_donnee["commentaire"] != "Aberrant"]
+        tache.avancer(10)
+
+        # Calcul des tendances de toutes les chroniques par blocs (répartis sur plusieurs processus),
+        # progression de 10 à 90 % au fil des blocs calculés, interruption possible entre deux blocs
+        df_tendance = self.ptrend.calculer(df_donnee, list_champ_cle, champ_date, champ_valeur,
+                                           fonction_progression=lambda nb_bloc, nb_total: tache.avancer(10 + 80 * nb_bloc / max(1, nb_total)),
+                                           fonction_interruption=tache.isCanceled)
+        tache.avancer(90)
+
+        # Ajout du nom du paramètre et des coordonnées des points
+        list_champ_station = ["code_bss", "x_wgs84", "y_wgs84"] + (["code_param", "nom_param"] if "code_param" in list_champ_cle else [])
+        df_station = UtilitaireCouches.lire_table_geopackage(chemin_geopackage, nom_table_station, list_champ_station)
+        df_station = df_station.drop_duplicates(subset=list_champ_cle)
+        df_tendance = df_tendance.merge(df_station, on=list_champ_cle, how="left")
+
+        # Ecriture de la table des tendances et de la couche des points des tendances (reprojetée)
+        horodate = datetime.datetime.now().strftime('%y%m%d%H%M%S')
+        nom_table_tendance = f"Tendances_{horodate}"
+        nom_couche_tendance = f"Stations_Tendances_{horodate}"
+        UtilitaireCouches.ecrire_dataframe_geopackage(chemin_geopackage, nom_table_tendance, df_tendance, ajouter_couche=True)
+        UtilitaireCouches.ecrire_dataframe_geopackage(chemin_geopackage, nom_couche_tendance, df_tendance,
+                                                      champ_x="x_wgs84", champ_y="y_wgs84",
+                                                      epsg_origine=4326, epsg_destination=epsg_reproj, ajouter_couche=True)
+        tache.avancer(100)
+
+        tache.differer(self.afficher_tendances, chemin_geopackage, [nom_couche_tendance, nom_table_tendance], groupe_couche)
+        tache.differer(lambda: self.iface.messageBar().pushMessage(
+            f"Tendances calculées pour {len(df_tendance)} chroniques " +
+            f"(au moins {self.ptrend.nb_min_valeurs} valeurs après agrégation) : " +
+            ", ".join(f"{nb} {tendance}" for tendance, nb in df_tendance["tendance"].value_counts().items()),
+            Qgis.Info))
+
+    def terminer_calculer_tendances(self, tache):
+        """
+        Fonction de fin de la tâche de calcul des tendances (thread de l'interface).
+        :param tache: (Pick_Task) tâche Qgis terminée
+        :return: None
+        """
+        try:
+            self.tache = None
+            if tache.exception is not None:
+                raise tache.exception
+            if tache.succes:
+                tache.executer_actions_fin()
+            else:
+                self.iface.messageBar().pushMessage("Calcul des tendances interrompu.", Qgis.Critical)
+        except ErreurInterruptionCalcul:
+            self.iface.messageBar().pushMessage("Calcul des tendances interrompu.", Qgis.Warning)
+        except Exception:
+            self.iface.messageBar().pushMessage("Erreur inconnue : les tendances n'ont pas été calculées...", Qgis.Critical)
+        finally:
+            self.dockwidget.progressBar.reset()
+            self.dockwidget.pbt_calculerTendances.setEnabled(True)
+
+    def afficher_tendances(self, chemin_geopackage, list_nom_couche, groupe_couche):
+        """
+        Ajout des couches des tendances dans le groupe de couches du résultat (thread de l'interface).
+        :param chemin_geopackage: (str) chemin du geopackage résultat
+        :param list_nom_couche: liste des noms des couches à lire dans le geopackage
+        :param groupe_couche: (QgsLayerTreeGroup) groupe de couches du résultat
+        :return: None
+        """
+        for nom_couche in list_nom_couche:
+            gpkg_layer = QgsVectorLayer(chemin_geopackage + "|layername=" + nom_couche, nom_couche, 'ogr')
+            if gpkg_layer.isValid():
+                QgsProject.instance().addMapLayer(gpkg_layer, False)
+                groupe_couche.addLayer(gpkg_layer).setExpanded(False)
 
 
 if __name__ == '__main__':
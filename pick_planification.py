@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+copyright: (C) 2019 by BRGM
+
+Module PickEau contenant une classe Pick_Plan permettant :
+    - de regrouper les stations sélectionnées en requêtes Hubeau multi-stations,
+    - de découper les listes de paramètres et de groupes qualité en lots acceptés par Hubeau (200 codes maximum),
+    - de répartir les résultats des requêtes multi-stations par station (coordonnées des points),
+    - de planifier les requêtes d'un téléchargement incrémental (données à partir de la dernière date par station).
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class Pick_Plan():
+    """
+    Classe Pick_Plan : planification des requêtes Hubeau par point.
+    Hubeau accepte une liste de codes de stations séparés par des virgules (code_bss, bss_id) :
+    les stations sélectionnées sont regroupées par lots dont la taille est bornée
+        - par la longueur maximum de l'url de la requête,
+        - par le nombre maximum de codes d'une liste Hubeau (200 codes),
+    ce qui divise le nombre de requêtes envoyées par la taille des lots.
+    Le nombre de lignes d'un lot n'est pas borné ici : au-delà de la profondeur maximum des résultats servis
+    par Hubeau (page x size), la requête est découpée en fenêtres de dates à la lecture de la réponse
+    (voir Pick_Req.lire_pages_hubeau_csv).
+    Les listes de codes paramètres et groupes qualité sont découpées en lots de 200 codes au plus (limite Hubeau).
+    Cette classe prend en paramètres deux instances des classes Pick_Req et Pick_Tools :
+        - Pick_Req : construction des requêtes Hubeau (longueur des urls)
+        - Pick_Tools : lecture du fichier de configuration
+    """
+    def __init__(self, preq, ptools):
+
+        self.preq = preq
+        self.ptools = ptools
+
+        # Lecture du fichier de configuration : bornes des lots de stations
+        dict_config = self.ptools.lire_fichier_config()["telechargement"]
+        self.longueur_max_url = dict_config["longueur_max_url"]
+        self.nb_max_codes_requete = dict_config["nb_max_codes_requete"]
+
+    def grouper_stations(self, list_code_point, list_code_groupe, list_code_parametre, type_requete, date_debut=''):
+        """
+        Regroupe les codes de stations en lots pour une requête Hubeau donnée (groupes et paramètres fixés).
+        Un lot est borné par la longueur maximum de l'url et par le nombre maximum de codes d'une liste Hubeau.
+        :param list_code_point: liste des codes des stations (code_bss)
+        :param list_code_groupe: liste des codes SANDRE des groupes de paramètres de la requête
+        :param list_code_parametre: liste des codes SANDRE des paramètres de la requête
+        :param type_requete: type de requête ("analyses_qualite_csv" | "chroniques_piezo_csv")
+        :param date_debut: date de début des données demandées (vide = toutes), prise en compte dans la longueur de l'url
+        :return: liste de listes de codes de stations (un lot = une requête)
+        """
+        # Longueur de l'url sans station : chaque station ajoute son code et le séparateur %2C
+        longueur_url = len(self.preq.construire_requete_hubeau_par_point([], list_code_groupe, list_code_parametre, type_requete, date_debut))
+
+        list_lot = []
+        lot = []
+        longueur_lot = longueur_url
+        for code_point in list_code_point:
+            longueur_code = len(code_point) + 3
+            if (len(lot) > 0) and ((len(lot) >= self.nb_max_codes_requete) or (longueur_lot + longueur_code > self.longueur_max_url)):
+                list_lot.append(lot)
+                lot = []
+                longueur_lot = longueur_url
+            lot.append(code_point)
+            longueur_lot += longueur_code
+        if len(lot) > 0:
+            list_lot.append(lot)
+        return list_lot
+
+    def planifier_requetes_par_point(self, list_code_point, list_filtre, type_requete, dict_date_debut=None):
+        """
+        Construit la liste des arguments des requêtes Hubeau multi-stations
+        (arguments de Pick_Req.requete_hubeau_par_point).
+        En téléchargement incrémental, les stations déjà téléchargées sont triées par date de début puis regroupées :
+        chaque lot est demandé à partir de la date la plus ancienne de ses stations, jour compris (les données déjà
+        téléchargées de chaque station sont éliminées ensuite par filtrer_donnees_nouvelles).
+        Les stations sans date de début sont regroupées à part et téléchargées entièrement.
+        :param list_code_point: liste des codes des stations (code_bss)
+        :param list_filtre: liste de tuples (liste de codes groupe, liste de codes paramètre) : un tuple = une requête
+                            pour chaque lot de stations
+        :param type_requete: type de requête ("analyses_qualite_csv" | "chroniques_piezo_csv")
+        :param dict_date_debut: dictionnaire clé = code station / valeur = date de la dernière donnée déjà téléchargée
+                                ("aaaa-mm-jj"), None pour un téléchargement complet
+        :return: liste de tuples (liste de codes stations, liste de codes groupe, liste de codes paramètre,
+                                  type de requête, date de début)
+        """
+        # Tri des codes pour des requêtes reproductibles d'un téléchargement à l'autre
+        list_code_point = sorted(set(list_code_point))
+        if dict_date_debut:
+            list_list_code_point = [[code for code in list_code_point if code not in dict_date_debut],
+                                    sorted([code for code in list_code_point if code in dict_date_debut],
+                                           key=lambda code: dict_date_debut[code])]
+        else:
+            dict_date_debut = {}
+            list_list_code_point = [list_code_point]
+
+        list_args_requete = []
+        for list_code_groupe, list_code_parametre in list_filtre:
+            for list_code_partition in list_list_code_point:
+                if len(list_code_partition) == 0:
+                    continue
+                date_debut_partition = dict_date_debut.get(list_code_partition[0], '')
+                for lot in self.grouper_stations(list_code_partition, list_code_groupe, list_code_parametre,
+                                                 type_requete, date_debut_partition):
+                    # Les stations étant triées par date, la première date du lot est la plus ancienne
+                    date_debut = dict_date_debut.get(lot[0], '')
+                    list_args_requete.append((lot, list_code_groupe, list_code_parametre, type_requete, date_debut))
+        return list_args_requete
+
+    def decouper_liste_code(self, list_code):
+        """
+        Découpe une liste de codes (paramètres ou groupes) en lots acceptés par Hubeau.
+        :param list_code: liste de codes SANDRE
+        :return: liste de listes de codes (nb_max_codes_requete codes au plus par liste)
+        """
+        list_code = sorted(set(list_code))
+        return [list_code[i:i + self.nb_max_codes_requete] for i in range(0, len(list_code), self.nb_max_codes_requete)]
+
+    def planifier_requetes_qualite(self, list_code_point, list_code_groupe, list_code_parametre, list_code_parametre_groupe):
+        """
+        Construit la liste des arguments des requêtes Hubeau d'analyses qualité en minimisant le nombre total de requêtes.
+        Deux stratégies sont comparées :
+            - par groupe : lots de groupes d'une part, lots des paramètres demandés individuellement d'autre part
+              (Hubeau considère l'intersection des groupes ET des paramètres : ils ne peuvent pas être mélangés),
+            - par paramètre : les groupes sont remplacés par la liste de leurs paramètres, et l'ensemble des paramètres
+              est découpé en lots.
+        La stratégie retenue est celle qui envoie le moins de requêtes, lots de stations compris.
+        :param list_code_point: liste des codes des stations (code_bss)
+        :param list_code_groupe: liste des codes SANDRE des groupes de paramètres demandés
+        :param list_code_parametre: liste des codes SANDRE des paramètres demandés individuellement
+        :param list_code_parametre_groupe: liste des codes SANDRE des paramètres des groupes demandés
+        :return: liste de tuples (liste de codes stations, liste de codes groupe, liste de codes paramètre, type de requête)
+        """
+        # Stratégie par groupe
+        list_filtre_groupe = [(lot, []) for lot in self.decouper_liste_code(list_code_groupe)]
+        list_filtre_groupe += [([], lot) for lot in self.decouper_liste_code(list_code_parametre)]
+        list_args_groupe = self.planifier_requetes_par_point(list_code_point, list_filtre_groupe, "analyses_qualite_csv")
+
+        # Stratégie par paramètre (impossible si les paramètres d'un groupe sont inconnus)
+        if (len(list_code_groupe) > 0) and (len(list_code_parametre_groupe) == 0):
+            return list_args_groupe
+        list_filtre_parametre = [([], lot) for lot in self.decouper_liste_code(list_code_parametre + list_code_parametre_groupe)]
+        list_args_parametre = self.planifier_requetes_par_point(list_code_point, list_filtre_parametre, "analyses_qualite_csv")
+
+        # A nombre égal de requêtes, les requêtes par groupe sont préférées (urls plus courtes)
+        if len(list_args_parametre) < len(list_args_groupe):
+            return list_args_parametre
+        return list_args_groupe
+
+    @staticmethod
+    def normaliser_valeurs(serie):
+        """
+        Normalise les valeurs d'un champ pour comparer des données reçues de Hubeau et des données lues
+        dans un geopackage : nombres arrondis si toutes les valeurs sont numériques, texte sinon
+        (dates au format "aaaa-mm-jj", OGR renvoyant les dates au format "aaaa/mm/jj").
+        :param serie: (Series) valeurs d'un champ
+        :return: (Series) valeurs normalisées
+        """
+        serie_numerique = pd.to_numeric(serie, errors='coerce')
+        if serie_numerique.notna().sum() == serie.notna().sum():
+            return serie_numerique.astype(float).round(6)
+        return serie.astype(str).str.replace('/', '-')
+
+    @classmethod
+    def filtrer_donnees_nouvelles(cls, df_data, dict_date_debut, champ_date, df_existant, list_champ_comparaison):
+        """
+        Elimine d'un df résultat de téléchargement incrémental les données déjà téléchargées :
+            - les données antérieures au dernier jour de données de leur station,
+            - les données du dernier jour identiques (champs list_champ_comparaison) à une donnée déjà téléchargée,
+              les données de ce jour étant demandées à nouveau (mesures du même jour postérieures au téléchargement).
+        :param df_data: df des données reçues (doit contenir le champ code_bss et le champ de date)
+        :param dict_date_debut: dictionnaire clé = code station / valeur = date de la dernière donnée ("aaaa-mm-jj")
+        :param champ_date: nom du champ de date ("date_mesure" | "date_debut_prelevement")
+        :param df_existant: df des données déjà téléchargées du dernier jour de chaque station
+                            (voir UtilitaireCouches.lire_lignes_dates_max_geopackage)
+        :param list_champ_comparaison: champs comparés aux données déjà téléchargées
+                                       (p.ex ["code_bss", "date_mesure", "niveau_nappe_eau"])
+        :return: df des seules données nouvelles
+        """
+        if (len(df_data) == 0) or (not dict_date_debut):
+            return df_data
+        serie_jour = df_data[champ_date].astype(str).str.replace('/', '-').str[:10]
+        serie_date_debut = df_data['code_bss'].map(dict_date_debut).fillna('')
+        masque_nouveau = (serie_jour > serie_date_debut).to_numpy()
+        masque_dernier_jour = (serie_jour == serie_date_debut).to_numpy(copy=True)
+
+        # Données du dernier jour : comparaison aux données déjà téléchargées
+        if masque_dernier_jour.any():
+            df_cle = pd.DataFrame({champ: cls.normaliser_valeurs(df_data.loc[masque_dernier_jour, champ]).to_numpy()
+                                   for champ in list_champ_comparaison})
+            df_cle_existant = pd.DataFrame({champ: cls.normaliser_valeurs(df_existant[champ]).to_numpy()
+                                            for champ in list_champ_comparaison}).drop_duplicates()
+            df_cle['num_ligne'] = np.flatnonzero(masque_dernier_jour)
+            array_ligne_existante = df_cle.merge(df_cle_existant, on=list_champ_comparaison, how='inner')['num_ligne']
+            masque_dernier_jour[array_ligne_existante.to_numpy()] = False
+        return df_data[masque_nouveau | masque_dernier_jour]
+
+    @staticmethod
+    def rattacher_coordonnees(df_data, list_tup_point):
+        """
+        Ajoute à un df résultat de requêtes multi-stations les coordonnées de chaque station (x_wgs84, y_wgs84).
+        :param df_data: df des données reçues (doit contenir le champ code_bss)
+        :param list_tup_point: liste de tuples (code_bss, x, y) des stations sélectionnées
+        :return: df des données avec les champs x_wgs84 et y_wgs84
+        """
+        if len(df_data) == 0:
+            return df_data
+        df_coord = pd.DataFrame(list_tup_point, columns=['code_bss', 'x_wgs84', 'y_wgs84'])
+        df_coord = df_coord.drop_duplicates('code_bss')
+        return df_data.merge(df_coord, on='code_bss', how='left')
+
+
+if __name__ == '__main__':
+
+    print("")
+    print("---------------------------------------------------------------")
+    print("  Test de la classe Pick_Plan du module pick_planification")
+    print("---------------------------------------------------------------")
+    print("")
+
+    from pick_utilitaire import Pick_IO, Pick_Tools
+    from pick_requete import Pick_Req
+
+    pio = Pick_IO()
+    ptools = Pick_Tools()
+    preq = Pick_Req(pio, ptools)
+    pplan = Pick_Plan(preq, ptools)
+
+    list_code = ["0" + str(i) + "-1X-0001/P" for i in range(1000, 1100)]
+    list_args = pplan.planifier_requetes_qualite(list_code, ["49"], [str(i) for i in range(1000, 1450)], ["1340", "1301"])
+    print("Nombre de stations : ", len(list_code))
+    print("Nombre de requêtes : ", len(list_args))
+    print("Longueur max des urls : ", max(len(preq.construire_requete_hubeau_par_point(*args)) for args in list_args))
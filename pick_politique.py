@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+copyright: (C) 2019 by BRGM
+
+Module PickEau contenant une classe Pick_Policy permettant :
+    - de limiter le débit des requêtes envoyées à chaque serveur (seau à jetons par serveur),
+    - de renvoyer les requêtes en échec temporaire (429, 5xx, délai dépassé, connexion perdue)
+      après une attente exponentielle aléatoire.
+"""
+
+import time
+import random
+import threading
+from urllib.parse import urlsplit
+
+import requests
+
+
+class Pick_Policy():
+    """
+    Classe Pick_Policy : politique d'envoi des requêtes http de PickEau.
+    Toutes les requêtes passent par la fonction envoyer, appelée simultanément par les threads du moteur de
+    téléchargement (pick_telechargement.Pick_Download) :
+        - chaque serveur dispose d'un seau de jetons rechargé au débit défini dans la configuration,
+          une requête consommant un jeton (les rafales sont bornées par la capacité du seau),
+        - les requêtes idempotentes (GET) en échec temporaire sont renvoyées jusqu'au nombre maximum de tentatives,
+          après une attente qui double à chaque tentative (bornée, tirée au hasard pour étaler les renvois des threads)
+          ou qui respecte l'en-tête Retry-After renvoyé par le serveur.
+    """
+    # Statuts http des échecs temporaires (trop de requêtes, erreurs serveur et passerelle)
+    list_statut_reessai = [429, 500, 502, 503, 504]
+
+    def __init__(self, dict_config_politique):
+        """
+        Constructeur de la classe Pick_Policy
+        :param dict_config_politique: (dict) section "politique_requetes" du fichier de configuration
+        """
+        self.dict_debit = dict_config_politique["nb_requetes_par_seconde"]
+        self.capacite_rafale = dict_config_politique["capacite_rafale"]
+        self.nb_max_tentatives = max(1, dict_config_politique["nb_max_tentatives"])
+        self.delai_initial = dict_config_politique["delai_initial"]
+        self.delai_max = dict_config_politique["delai_max"]
+        # Dictionnaire clé = serveur / valeur = [nombre de jetons disponibles, date du dernier rechargement]
+        self.dict_seau = {}
+        self.verrou = threading.Lock()
+
+    def attendre_jeton(self, serveur):
+        """
+        Attend qu'un jeton soit disponible dans le seau du serveur et le consomme.
+        :param serveur: (str) nom du serveur (p.ex "hubeau.eaufrance.fr")
+        :return: None
+        """
+        debit = self.dict_debit.get(serveur, self.dict_debit["defaut"])
+        while True:
+            with self.verrou:
+                maintenant = time.monotonic()
+                jetons, date_maj = self.dict_seau.get(serveur, [self.capacite_rafale, maintenant])
+                jetons = min(self.capacite_rafale, jetons + (maintenant - date_maj) * debit)
+                if jetons >= 1:
+                    self.dict_seau[serveur] = [jetons - 1, maintenant]
+                    return
+                self.dict_seau[serveur] = [jetons, maintenant]
+                attente = (1 - jetons) / debit
+            time.sleep(attente)
+
+    def calculer_delai_attente(self, num_tentative, reponse=None):
+        """
+        Calcule l'attente avant de renvoyer une requête en échec temporaire.
+        :param num_tentative: (int) numéro de la tentative qui vient d'échouer (à partir de 0)
+        :param reponse: (requests.Response) réponse du serveur (None en cas d'erreur de connexion)
+        :return: (float) attente en secondes
+        """
+        # Le serveur indique lui-même l'attente souhaitée (429 / 503)
+        if (reponse is not None) and ("Retry-After" in reponse.headers):
+            try:
+                return min(self.delai_max, float(reponse.headers["Retry-After"]))
+            except ValueError:
+                pass
+        # Attente exponentielle bornée, tirée au hasard entre la moitié et la totalité de l'attente
+        delai = min(self.delai_max, self.delai_initial * (2 ** num_tentative))
+        return random.uniform(delai / 2, delai)
+
+    def envoyer(self, fonction_requete, methode, url, **kwargs):
+        """
+        Envoie une requête http en appliquant la limitation de débit et, pour les requêtes GET, les renvois.
+        :param fonction_requete: fonction d'envoi (p.ex requests.Session.request) appelée avec (methode, url, **kwargs)
+        :param methode: (str) méthode http ("GET", "POST"...)
+        :param url: (str) url de la requête
+        :param kwargs: paramètres supplémentaires passés à la fonction d'envoi
+        :return: (requests.Response) dernière réponse du serveur ;
+                 l'exception de connexion de la dernière tentative est remontée si aucune réponse n'a été reçue
+        """
+        serveur = urlsplit(url).netloc.lower()
+        # Les requêtes non idempotentes (POST) ne sont envoyées qu'une fois
+        nb_tentatives = self.nb_max_tentatives if methode == "GET" else 1
+        for num_tentative in range(nb_tentatives):
+            self.attendre_jeton(serveur)
+            derniere_tentative = (num_tentative == nb_tentatives - 1)
+            try:
+                reponse = fonction_requete(methode, url, **kwargs)
+            except (requests.Timeout, requests.ConnectionError):
+                if derniere_tentative:
+                    raise
+                time.sleep(self.calculer_delai_attente(num_tentative))
+                continue
+            if (reponse.status_code not in self.list_statut_reessai) or derniere_tentative:
+                return reponse
+            # Libération de la connexion de la réponse en échec (réponse éventuellement reçue en flux ;
+            # une réponse sans flux, p.ex reconstituée depuis le cache, n'a pas de connexion à libérer)
+            if reponse.raw is not None:
+                reponse.close()
+            time.sleep(self.calculer_delai_attente(num_tentative, reponse))
+
+
+if __name__ == '__main__':
+
+    print("")
+    print("---------------------------------------------------------------")
+    print("  Test de la classe Pick_Policy du module pick_politique")
+    print("---------------------------------------------------------------")
+    print("")
+
+    ppolicy = Pick_Policy({"nb_requetes_par_seconde": {"defaut": 20},
+                           "capacite_rafale": 5,
+                           "nb_max_tentatives": 3,
+                           "delai_initial": 0.1,
+                           "delai_max": 1})
+
+    # Limitation de débit : 5 requêtes en rafale puis 20 requêtes par seconde
+    debut = time.time()
+    for i in range(25):
+        ppolicy.attendre_jeton("hubeau.eaufrance.fr")
+    print("25 jetons en (s) : ", round(time.time() - debut, 2))
+
+    # Renvois : deux réponses 503 puis une réponse correcte
+    list_statut = [503, 503, 200]
+
+    def requete_test(methode, url, **kwargs):
+        reponse = requests.models.Response()
+        reponse.status_code = list_statut.pop(0)
+        return reponse
+
+    print("Statut final : ", ppolicy.envoyer(requete_test, "GET", "https://hubeau.eaufrance.fr").status_code)
@@ -11,13 +11,24 @@ Module PickEau contenant une classe pick_requete permettant :
 """
 
 import requests
+import urllib3
+from requests.adapters import HTTPAdapter
 import pandas as pd
-from io import StringIO
+from io import BytesIO
 import os
+import re
 import xmltodict
 import gzip
 import json
 import csv
+try:
+    from .pick_cache import Pick_Cache
+    from .pick_collecte import Pick_Sink
+    from .pick_politique import Pick_Policy
+except ImportError:     # exécution du module hors Qgis (voir le test en fin de module)
+    from pick_cache import Pick_Cache
+    from pick_collecte import Pick_Sink
+    from pick_politique import Pick_Policy
 
 class Pick_Req():
     """
@@ -54,16 +65,215 @@ class Pick_Req():
         self.ip_ades_unites_parametres_support_liquide_xml = dict_adresses_ip['ip_ades']['unites_parametres_support_liquide_xml']
         self.ip_ades_parametres_xml = dict_adresses_ip['ip_ades']['parametres_xml']
 
+        # Lecture du fichier de configuration : nombre de requêtes envoyées simultanément lors des téléchargements
+        dict_config = self.ptools.lire_fichier_config()
+        self.nb_requetes_simultanees = dict_config["telechargement"]["nb_requetes_simultanees"]
+        # Délais maximum (s) d'établissement de la connexion et d'attente de la réponse du serveur
+        self.delai_requete = (dict_config["telechargement"]["delai_connexion"],
+                              dict_config["telechargement"]["delai_lecture"])
+        # Profondeur maximum des résultats servis par Hubeau (page x size) : au-delà, la page suivante est refusée
+        self.profondeur_max_hubeau = dict_config["telechargement"]["profondeur_max_hubeau"]
+        # Paramètre de date de début des requêtes par point et champ de date correspondant des csv Hubeau
+        # (téléchargement incrémental et découpage des requêtes en fenêtres de dates, voir lire_pages_hubeau_csv)
+        self.dict_parametre_date = {"analyses_qualite_csv": ("date_debut_prelevement", "date_debut_prelevement"),
+                                    "chroniques_piezo_csv": ("date_debut_mesure", "date_mesure")}
+
+        # Session http partagée par toutes les requêtes du plugin (connexions conservées et réutilisées)
+        self.session = self.creer_session()
+
+        # Politique d'envoi des requêtes : limitation du débit par serveur et renvoi des requêtes en échec temporaire
+        self.ppolicy = Pick_Policy(dict_config["politique_requetes"])
+
+        # Cache disque des réponses des requêtes peu changeantes (stations Hubeau, référentiels Sandre et Ades)
+        dict_config_cache = dict_config["cache"]
+        dossier_cache = dict_config_cache["dossier"] or os.path.join(self.dossier_plugin, "cache")
+        self.pcache = Pick_Cache(dossier_cache, dict_config_cache["taille_max_mo"], dict_config_cache["durees_vie"])
+
         # Définition des listes de champs renvoyés par les requêtes et permettant de construire les df résultats
         self.list_col_metadata_niveaux_nappes_chroniques_csv = dict_adresses_ip["list_col_metadata_niveaux_nappes_chroniques_csv"]
         self.list_col_data_niveaux_nappes_chroniques_csv = dict_adresses_ip["list_col_data_niveaux_nappes_chroniques_csv"]
         self.list_col_metadata_qualite_nappes_analyses_csv = dict_adresses_ip["list_col_metadata_qualite_nappes_analyses_csv"]
         self.list_col_data_qualite_nappes_analyses_csv = dict_adresses_ip["list_col_data_qualite_nappes_analyses_csv"]
+        # Champs code des analyses qualité et champ libellé correspondant (libellés stockés dans une table de nomenclatures)
+        self.dict_col_libelle_qualite_nappes_analyses_csv = dict_adresses_ip["dict_col_libelle_qualite_nappes_analyses_csv"]
 
         # Définition des listes de champs demandés et passés aux requetes
         self.list_col_niveaux_nappes_chroniques_csv = self.list_col_metadata_niveaux_nappes_chroniques_csv + self.list_col_data_niveaux_nappes_chroniques_csv
         self.list_col_qualite_nappes_analyses_csv = self.list_col_metadata_qualite_nappes_analyses_csv + self.list_col_data_qualite_nappes_analyses_csv
 
+        # Définition des types des champs des csv Hubeau passés à pandas (pas d'inférence de type à la lecture) :
+        # les champs sont lus comme du texte (codes conservés tels quels, p.ex "01001"), sauf les champs numériques
+        dict_type_numerique = dict_adresses_ip["dict_type_col_numerique_csv"]
+        self.dict_type_col_csv = {nom_col: dict_type_numerique.get(nom_col, str)
+                                  for nom_col in self.list_col_niveaux_nappes_chroniques_csv + self.list_col_qualite_nappes_analyses_csv}
+
+
+    def creer_session(self):
+        """
+        Crée la session http partagée par toutes les requêtes envoyées par PickEau (Hubeau, Sandre, Ades, Piceau, forge).
+        Les connexions sont conservées ouvertes (keep-alive) et réutilisées d'une requête à l'autre vers un même serveur,
+        ce qui évite de renégocier une connexion TCP + TLS pour chacune des centaines de requêtes par point.
+        Le pool de connexions par serveur est dimensionné sur le nombre de requêtes envoyées simultanément.
+        :return: session http (requests.Session)
+        """
+        session = requests.Session()
+        adaptateur = HTTPAdapter(pool_connections=10, pool_maxsize=self.nb_requetes_simultanees)
+        session.mount("https://", adaptateur)
+        session.mount("http://", adaptateur)
+        # Demande de réponses compressées (les csv Hubeau sont fortement compressibles)
+        session.headers.update({"Accept-Encoding": "gzip, deflate"})
+        return session
+
+    def envoyer_requete(self, url, methode="GET", type_cache=None, **kwargs):
+        """
+        Envoie une requête http par la session partagée, avec le délai maximum par défaut défini dans la configuration.
+        :param url: url de la requête
+        :param methode: méthode http ("GET", "POST"...)
+        :param type_cache: type de cache des requêtes GET (clé de cache.durees_vie dans la configuration),
+                           None pour ne pas utiliser le cache
+        :param kwargs: paramètres supplémentaires passés à requests (headers, json, auth, stream, timeout...)
+        :return: réponse du serveur (requests.Response)
+        """
+        kwargs.setdefault("timeout", self.delai_requete)
+        if (type_cache is not None) and (methode == "GET"):
+            return self.pcache.envoyer_requete(self.envoyer_requete_serveur, url, type_cache, **kwargs)
+        return self.envoyer_requete_serveur(url, methode, **kwargs)
+
+    def envoyer_requete_serveur(self, url, methode="GET", **kwargs):
+        """
+        Envoie une requête http au serveur par la session partagée, selon la politique d'envoi des requêtes
+        (limitation du débit par serveur, renvoi des requêtes GET en échec temporaire).
+        :param url: url de la requête
+        :param methode: méthode http ("GET", "POST"...)
+        :param kwargs: paramètres supplémentaires passés à requests
+        :return: réponse du serveur (requests.Response)
+        """
+        return self.ppolicy.envoyer(self.session.request, methode, url, **kwargs)
+
+    def iterer_pages_hubeau(self, requete, type_cache=None):
+        """
+        Générateur qui envoie une requête csv sur le serveur Hubeau et renvoie les pages de la réponse au fur et à mesure
+        de leur réception, en suivant le lien 'next' (en-tête http Link) renvoyé par Hubeau tant que la réponse est
+        partielle (statut 206). Le paramètre size des adresses Hubeau définit ainsi la taille d'une page et non plus
+        le nombre maximum de résultats d'une requête.
+        Hubeau ne sert pas les résultats au-delà de la profondeur maximum (page x size) : la page suivante n'est pas
+        demandée si elle dépasse cette profondeur.
+        :param requete: url de la première page de la requête Hubeau
+        :param type_cache: type de cache des pages (None pour ne pas utiliser le cache)
+        :return: itérateur de tuples ( dataframe de la page (DataFrame), statut de la requête (int | "erreur de connexion") ).
+                 En cas d'erreur sur une page, le dernier tuple renvoyé contient un df vide et le statut en erreur.
+                 Si la profondeur maximum est atteinte, le dernier tuple renvoyé contient un df vide et le statut 206
+                 (résultats restant à recevoir).
+        """
+        url_page = requete
+        nb_lignes = 0
+        taille_page = 0
+        while url_page:
+            # Envoi de la requête de la page au serveur Hubeau et réception de la réponse
+            # (la connexion a déjà été retentée selon la politique d'envoi des requêtes)
+            # Les pages non mises en cache sont reçues en flux et lues au fur et à mesure de leur réception
+            flux = (type_cache is None)
+            try:
+                reponse = self.envoyer_requete(url_page, type_cache=type_cache, stream=flux)
+            except requests.RequestException:
+                yield (pd.DataFrame(), "erreur de connexion")
+                return
+            statut_requete = reponse.status_code
+
+            # Réponse complète (200) ou partielle (206) : les deux statuts sont corrects
+            if statut_requete not in (200, 206):
+                reponse.close()
+                yield (pd.DataFrame(), statut_requete)
+                return
+
+            try:
+                df_page = self.lire_reponse_csv(reponse, flux)
+            except (requests.RequestException, urllib3.exceptions.HTTPError):
+                yield (pd.DataFrame(), "erreur de connexion")
+                return
+            finally:
+                reponse.close()
+            yield (df_page, 200)
+
+            # Adresse de la page suivante (absente sur la dernière page), dans la limite de la profondeur maximum
+            url_page = reponse.links.get('next', {}).get('url')
+            nb_lignes += len(df_page)
+            taille_page = max(taille_page, len(df_page))
+            if url_page and (nb_lignes + taille_page > self.profondeur_max_hubeau):
+                yield (pd.DataFrame(), 206)
+                return
+
+    def lire_reponse_csv(self, reponse, flux=True):
+        """
+        Lit par pandas le csv contenu dans une réponse Hubeau, sans copie intermédiaire du contenu :
+            - réponse reçue en flux (stream=True) : lecture directe du flux d'octets décompressé,
+            - réponse issue du cache (contenu déjà en mémoire) : lecture des octets du contenu.
+        Les types des champs connus sont imposés (voir dict_type_col_csv) pour éviter leur inférence par pandas.
+        :param reponse: réponse du serveur Hubeau (requests.Response) de statut 200 ou 206
+        :param flux: True si la réponse a été reçue en flux (requête envoyée avec stream=True)
+        :return: dataframe de la page (DataFrame), vide si la réponse est vide
+        """
+        if flux:
+            # Décompression gzip / deflate à la volée par urllib3
+            reponse.raw.decode_content = True
+            fileobject = reponse.raw
+        else:
+            fileobject = BytesIO(reponse.content)
+        try:
+            return pd.read_csv(fileobject, sep=';', encoding='utf-8', dtype=self.dict_type_col_csv)
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame()
+
+    def lire_pages_hubeau_csv(self, requete, type_cache=None, parametre_date='', champ_date=''):
+        """
+        Envoie une requête csv sur le serveur Hubeau, lit toutes les pages de la réponse
+        et renvoie un tuple contenant le dataframe et le statut de la requête.
+        Lorsque la profondeur maximum de Hubeau est atteinte, la requête est découpée en fenêtres de dates
+        si son paramètre de date de début est fourni (résultats triés par date croissante) : la requête est renvoyée
+        à partir de la dernière date reçue, dont les lignes (éventuellement incomplètes) sont redemandées.
+        Les pages reçues sont conservées si la requête ne peut pas être lue entièrement (profondeur maximum atteinte
+        sans découpage possible, erreur sur une page) : le résultat partiel est renvoyé avec le statut 206.
+        :param requete: url de la requête Hubeau
+        :param type_cache: type de cache des pages (None pour ne pas utiliser le cache)
+        :param parametre_date: paramètre Hubeau de la date de début (p.ex "date_debut_mesure"), vide = pas de découpage
+        :param champ_date: champ de date des csv correspondant au paramètre (p.ex "date_mesure")
+        :return: tuple = ( dataframe des données reçues (DataFrame), statut de la requête
+                           (int : 200 = complet, 206 = partiel | "erreur de connexion") )
+        """
+        psink = Pick_Sink()
+        statut_requete = 200
+        url_fenetre = requete
+        date_fenetre = ''
+        while url_fenetre:
+            list_df_page = []
+            statut_fenetre = 200
+            for df_page, statut_page in self.iterer_pages_hubeau(url_fenetre, type_cache):
+                if statut_page == 200:
+                    list_df_page.append(df_page)
+                else:
+                    statut_fenetre = statut_page
+            df_fenetre = pd.concat(list_df_page, ignore_index=True, sort=False) if len(list_df_page) > 0 else pd.DataFrame()
+            url_fenetre = None
+
+            # Profondeur maximum atteinte : fenêtre suivante à partir de la dernière date reçue, si les dates progressent
+            if (statut_fenetre == 206) and (parametre_date != '') and (champ_date in df_fenetre.columns):
+                serie_date = df_fenetre[champ_date].astype(str).str[:10]
+                date_max = serie_date.iloc[-1]
+                if serie_date.is_monotonic_increasing and (date_max > date_fenetre):
+                    df_fenetre = df_fenetre[(serie_date < date_max).to_numpy()]
+                    url_fenetre = re.sub(f"&{parametre_date}=[^&]*", "", requete) + f"&{parametre_date}={date_max}"
+                    date_fenetre = date_max
+                    statut_fenetre = 200
+
+            psink.ajouter(df_fenetre)
+            if statut_fenetre != 200:
+                statut_requete = statut_fenetre
+
+        # Résultat partiel : les pages reçues sont conservées (statut 206), la requête n'est en échec que sans donnée
+        df_data = psink.concatener()
+        if (statut_requete != 200) and (len(df_data) > 0):
+            statut_requete = 206
+        return (df_data, statut_requete)
 
     def requete_hubeau_par_dept(self, nom_administratif, list_dept, type_requete):
         """
@@ -93,55 +303,29 @@ class Pick_Req():
             requete = ''
 
         if requete != '':
-            # Envoi de la requête au serveur ADES et réception de la réponse
-            reponse = requests.get(requete)
-            statut_requete = reponse.status_code
-
-            # En cas de retour correct de la requête
-            if statut_requete == 200:
-
-                # Création d'un fileobject (représentation en mémoire d'un fichier)
-                csv_fileobject = StringIO(reponse.text)
-                # Teste si la réponse est non vide
-                if csv_fileobject.seek(0, os.SEEK_END) > 0:
-                    # Remet le pointeur du fichier au début du fichier texte
-                    csv_fileobject.seek(0)
-                    # Lecture par pandas du fichier texte dans un df
-                    df_requete = pd.read_csv(csv_fileobject, sep=';')
-                    # Ajout au df de champs d'information sur le retour de la requête Hubeau
-                    df_requete['req_administratif'] = nom_administratif
-                    df_requete['req_nb_points_recus'] = len(df_requete)
-                    df_requete['req_statut'] = statut_requete
-                    # Ajout du df au df total
-                    if len(df_data) == 0:
-                        df_data = df_requete
-                    else:
-                        df_data = df_data.append(df_requete)
+            # Envoi de la requête au serveur Hubeau (ou lecture dans le cache) et lecture de toutes les pages de la réponse
+            df_data, statut_requete = self.lire_pages_hubeau_csv(requete, type_cache=type_requete)
+            if (statut_requete in (200, 206)) and (len(df_data) > 0):
+                # Ajout au df de champs d'information sur le retour de la requête Hubeau
+                df_data['req_administratif'] = nom_administratif
+                df_data['req_nb_points_recus'] = len(df_data)
+                df_data['req_statut'] = statut_requete
 
         # Retour de la fonction
         return (df_data, statut_requete)
 
 
-    def requete_hubeau_par_point(self, code_point, list_code_groupe, list_code_parametre, type_requete):
+    def construire_requete_hubeau_par_point(self, code_point, list_code_groupe, list_code_parametre, type_requete, date_debut=''):
         """
-        Envoie une requête sur le serveur Hubeau et renvoie un tuple contenant le dataframe et le statut de la requête
-        NB : pour la qualité, il faut passer en paramètre soit une liste de groupes et une liste vide de paramètres,
-        soit une liste de paramètres et une liste vide de groupes, sinon des paramètres seront manquants car
-        la requête Hubeau considère l'intersection des groupes ET des paramètres.
-        :param code_point:  code du point demandé (code_bss dans la version actuelle de Hubeau car seul code à être
-                            accepté par les deux API eau souterraine
-        :param list_groupe_parametre:  liste des codes SANDRE des groupes de paramètres concernés par la requête
-        :param list_code_parametre:  liste des codes SANDRE des paramètres concernés par la requête
-        :param type_requete:    type de requête possible :
-                                "analyses_qualite_csv"
-                                "chroniques_piezo_csv"
-        :return: tuple = ( dataframe des données reçues (DataFrame), statut de la requête (int | "type de requête inconnu") )
+        Construit l'url d'une requête Hubeau par point (voir requete_hubeau_par_point pour les paramètres).
+        :return: url de la requête (str), vide si le type de requête est inconnu
         """
-        # Création de réponses par défaut pour la fonction
-        df_data = pd.DataFrame()
-        statut_requete = "type de requête inconnu"
-
-        # Construction des str de codes groupe, paramètres sandre et champs demandés acceptées par hubeau
+        # Construction des str de codes points, groupe, paramètres sandre et champs demandés acceptées par hubeau
+        # (Hubeau accepte une liste de points séparés par des virgules)
+        if isinstance(code_point, str):
+            str_code_point = code_point
+        else:
+            str_code_point = '%2C'.join(code_point)
         str_code_groupe = '%2C'.join(list_code_groupe)
         str_code_parametre = '%2C'.join(list_code_parametre)
         str_col_piezo = '%2C'.join(self.list_col_niveaux_nappes_chroniques_csv)
@@ -149,46 +333,68 @@ class Pick_Req():
         # Définition de la requête selon le type de requête passée en paramètre de la fonction
         if (type_requete == "analyses_qualite_csv") and (len(list_code_parametre) > 0):
             requete = (self.ip_hubeau_qualite_nappes_analyses_csv +
-                       "&bss_id=" + code_point +
+                       "&bss_id=" + str_code_point +
                        "&code_param=" + str_code_parametre +
                        "&fields=" + str_col_qualite)  # bss_id accepte aussi le code bss !
         elif (type_requete == "analyses_qualite_csv") and (len(list_code_groupe) > 0):
             requete = (self.ip_hubeau_qualite_nappes_analyses_csv +
-                       "&bss_id=" + code_point +
+                       "&bss_id=" + str_code_point +
                        "&code_groupe_parametre=" + str_code_groupe +
                        "&fields=" + str_col_qualite)  # bss_id accepte aussi le code bss !
         elif type_requete == "chroniques_piezo_csv":
             requete = (self.ip_hubeau_niveaux_nappes_chroniques_csv +
-                       "&code_bss=" + code_point +
+                       "&code_bss=" + str_code_point +
                        "&fields=" + str_col_piezo)  # On ne tient pas compte du paramètre car hubeau ne le gère pas
         else:
             requete = ''
 
+        # Résultats triés par date croissante (découpage des requêtes en fenêtres de dates, voir lire_pages_hubeau_csv)
         if requete != '':
-            # Envoi de la requête au serveur ADES et réception de la réponse
-            reponse = requests.get(requete)
-            statut_requete = reponse.status_code
+            requete += "&sort=asc"
+        # Filtre sur la date de début des données (téléchargement incrémental) : mesures ou prélèvements à partir de cette date
+        if (requete != '') and (date_debut != ''):
+            requete += "&" + self.dict_parametre_date[type_requete][0] + "=" + date_debut
+        return requete
 
-            # En cas de retour correct de la requête
-            if statut_requete == 200:
+    def requete_hubeau_par_point(self, code_point, list_code_groupe, list_code_parametre, type_requete, date_debut=''):
+        """
+        Envoie une requête sur le serveur Hubeau et renvoie un tuple contenant le dataframe et le statut de la requête
+        NB : pour la qualité, il faut passer en paramètre soit une liste de groupes et une liste vide de paramètres,
+        soit une liste de paramètres et une liste vide de groupes, sinon des paramètres seront manquants car
+        la requête Hubeau considère l'intersection des groupes ET des paramètres.
+        :param code_point:  code du point demandé (code_bss dans la version actuelle de Hubeau car seul code à être
+                            accepté par les deux API eau souterraine), ou liste de codes de points envoyés
+                            dans une même requête (voir pick_planification.Pick_Plan)
+        :param list_groupe_parametre:  liste des codes SANDRE des groupes de paramètres concernés par la requête
+        :param list_code_parametre:  liste des codes SANDRE des paramètres concernés par la requête
+        :param type_requete:    type de requête possible :
+                                "analyses_qualite_csv"
+                                "chroniques_piezo_csv"
+        :param date_debut: date (format "aaaa-mm-jj") à partir de laquelle les données sont demandées (vide = toutes)
+        :return: tuple = ( dataframe des données reçues (DataFrame), statut de la requête
+                           (int : 200 = complet, 206 = partiel | "type de requête inconnu") )
+        """
+        # Création de réponses par défaut pour la fonction
+        df_data = pd.DataFrame()
+        statut_requete = "type de requête inconnu"
+
+        # Définition de la requête selon le type de requête passée en paramètre de la fonction
+        requete = self.construire_requete_hubeau_par_point(code_point, list_code_groupe, list_code_parametre, type_requete, date_debut)
 
-                # Création d'un fileobject (représentation en mémoire d'un fichier)
-                csv_fileobject = StringIO(reponse.text)
-                # Teste si la réponse est non vide
-                if csv_fileobject.seek(0, os.SEEK_END) > 0:
-                    # Remet le pointeur du fichier au début du fichier texte
-                    csv_fileobject.seek(0)
-                    # Lecture par pandas du fichier texte dans un df
-                    df_requete = pd.read_csv(csv_fileobject, sep=';')
-                    # Ajout au df de champs d'information sur le retour de la requête Hubeau
-                    df_requete['req_code_param'] = code_point
-                    df_requete['req_nb_data_recues'] = len(df_requete)
-                    df_requete['req_statut'] = statut_requete
-                    # Ajout du df au df total
-                    if len(df_data) == 0:
-                        df_data = df_requete
-                    else:
-                        df_data = df_data.append(df_requete)
+        if requete != '':
+            # Envoi de la requête au serveur Hubeau et lecture de toutes les pages de la réponse
+            # (découpage en fenêtres de dates au-delà de la profondeur maximum de Hubeau)
+            parametre_date, champ_date = self.dict_parametre_date[type_requete]
+            df_data, statut_requete = self.lire_pages_hubeau_csv(requete, parametre_date=parametre_date, champ_date=champ_date)
+            if (statut_requete in (200, 206)) and (len(df_data) > 0):
+                # Ajout au df de champs d'information sur le retour de la requête Hubeau
+                # (pour une requête multi-points, le point demandé est celui de chaque ligne reçue)
+                if isinstance(code_point, str):
+                    df_data['req_code_param'] = code_point
+                else:
+                    df_data['req_code_param'] = df_data['code_bss']
+                df_data['req_nb_data_recues'] = len(df_data)
+                df_data['req_statut'] = statut_requete
 
         # Retour de la fonction
         return (df_data, statut_requete)
@@ -217,13 +423,13 @@ class Pick_Req():
 
         if requete != "":
             # Envoi de la requête au serveur ADES et réception de la réponse
-            reponse = requests.get(requete, stream=True)
+            reponse = self.envoyer_requete(requete, type_cache="sandre")
             statut_requete = reponse.status_code
 
             # Contrôle du retour correct de la requête
             if statut_requete == 200:
-                # Dézippage de la réponse (fileobject)
-                zip_file = gzip.GzipFile(fileobj=reponse.raw)
+                # Dézippage de la réponse (fileobject) : le contenu est déjà décodé d'une éventuelle compression http
+                zip_file = gzip.GzipFile(fileobj=BytesIO(reponse.content))
                 # Lecture du fileobject par pandas
                 df_data = pd.read_csv(zip_file, sep=';')
 
@@ -252,7 +458,7 @@ class Pick_Req():
 
         if requete != "":
             # Envoi de la requête au serveur ADES et réception de la réponse
-            reponse = requests.get(requete)
+            reponse = self.envoyer_requete(requete, type_cache="ades")
             statut_requete = reponse.status_code
 
             # Contrôle du retour correct de la requête
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+copyright: (C) 2019 by BRGM
+
+Module PickEau contenant une classe Pick_Store permettant :
+    - de conserver en mémoire les chroniques d'une table de données (analyses ou niveaux) lues une seule fois,
+      sous forme de numpy arrays triés et indexés par station et paramètre (code_bss, code_param),
+    - de répondre aux filtres du tracé des graphiques (stations, paramètre, dates, qualification, commentaire)
+      par des masques numpy, sans nouvelle requête sur la couche Qgis,
+    - d'invalider les chroniques d'une table lorsque ses lignes sont modifiées (commentaires).
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class Pick_Store():
+    """
+    Classe Pick_Store : chroniques en mémoire des tables de données des groupes de couches résultats.
+    Chaque table est identifiée par l'id de sa couche Qgis. Les filtres sont décrits par une liste de conditions
+    (champ, opérateur, valeur), équivalentes aux fragments de l'expression de filtre de la couche :
+        - "IN" (valeur = liste), "=", "<>", ">=", "<=" : comparaison numérique si la valeur est un nombre,
+          comparaison du texte sinon (dates au format iso),
+        - "LIKE", "NOT LIKE" : égalité de texte sans tenir compte de la casse (motifs sans caractère joker),
+        - "NOT NULL" : valeur renseignée (valeur de la condition ignorée).
+    Comme en sql, une valeur nulle ne vérifie aucune condition de comparaison.
+    """
+    def __init__(self):
+        """
+        Constructeur de la classe Pick_Store
+        """
+        # Dictionnaire clé = id de la couche / valeur = dict des chroniques de la table
+        self.dict_serie = {}
+
+    @staticmethod
+    def convertir_texte(valeur):
+        """
+        Convertit une valeur en texte comparable (les nombres entiers lus comme réels sont écrits sans décimale).
+        :param valeur: valeur d'un champ
+        :return: (str) texte de la valeur
+        """
+        if isinstance(valeur, float) and valeur.is_integer():
+            return str(int(valeur))
+        if hasattr(valeur, "toString"):
+            return valeur.toString("yyyy-MM-dd") if not hasattr(valeur, "time") else valeur.toString("yyyy-MM-ddTHH:mm:ss")
+        return str(valeur)
+
+    @staticmethod
+    def est_nul(valeur):
+        """
+        Indique si une valeur est nulle (None, NaN ou QVariant nul renvoyé par Qgis).
+        :param valeur: valeur d'un champ
+        :return: (bool) True si la valeur est nulle
+        """
+        if valeur is None:
+            return True
+        if isinstance(valeur, float):
+            return np.isnan(valeur)
+        return hasattr(valeur, "isNull") and valeur.isNull() and not hasattr(valeur, "toString")
+
+    @classmethod
+    def normaliser_colonne(cls, valeurs):
+        """
+        Convertit les valeurs d'un champ en série pandas. Les valeurs propres à Qgis (QVariant nul, QDate, QDateTime)
+        sont remplacées par None ou par leur texte ; elles ne sont recherchées que dans les colonnes d'objets
+        de types mélangés, les autres colonnes ne sont pas parcourues.
+        :param valeurs: (numpy array ou Series) valeurs d'un champ
+        :return: (Series) valeurs du champ
+        """
+        serie = pd.Series(valeurs, copy=False)
+        if (serie.dtype == object) and (pd.api.types.infer_dtype(serie, skipna=True) == "mixed"):
+            serie = serie.map(lambda valeur: None if cls.est_nul(valeur)
+                              else cls.convertir_texte(valeur) if hasattr(valeur, "toString") else valeur)
+        return serie
+
+    @classmethod
+    def coder_textes(cls, valeurs):
+        """
+        Code les valeurs d'un champ par leurs textes comparables (voir convertir_texte) : le texte n'est calculé
+        qu'une fois par valeur distincte, chaque valeur est codée par le rang de son texte parmi les textes distincts.
+        :param valeurs: (numpy array) valeurs d'un champ
+        :return: (tuple) numpy array des textes distincts triés, numpy array du rang du texte de chaque valeur
+        """
+        array_code, array_unique = pd.factorize(cls.normaliser_colonne(valeurs))
+        # Les valeurs nulles sont codées -1 par factorize : leur texte est placé en dernier
+        array_texte = np.array([cls.convertir_texte(valeur) for valeur in array_unique] + ["nan"], dtype=str)
+        array_texte_unique, array_rang = np.unique(array_texte, return_inverse=True)
+        return array_texte_unique, array_rang.reshape(-1)[array_code]
+
+    @classmethod
+    def convertir_textes(cls, valeurs):
+        """
+        Convertit les valeurs d'un champ en textes comparables, comme convertir_texte mais pour toute la colonne.
+        :param valeurs: (numpy array) valeurs d'un champ
+        :return: (numpy array) textes des valeurs
+        """
+        array_texte_unique, array_rang = cls.coder_textes(valeurs)
+        return array_texte_unique[array_rang]
+
+    def contient(self, id_couche):
+        """
+        :param id_couche: (str) id de la couche de données
+        :return: (bool) True si les chroniques de la couche sont en mémoire
+        """
+        return id_couche in self.dict_serie
+
+    def charger(self, id_couche, dict_colonne, list_champ_cle):
+        """
+        Conserve en mémoire les colonnes d'une table de données, triées et indexées par les champs clés.
+        :param id_couche: (str) id de la couche de données
+        :param dict_colonne: (dict) clé = nom du champ ou "id" / valeur = numpy array des valeurs
+                             (voir pick_page_graphique.Pick_Pg_Graph.extraire_colonnes)
+        :param list_champ_cle: (list) champs clés de l'index (p.ex ["code_bss", "code_param"])
+        :return: None
+        """
+        # Rang du texte de la clé de chaque ligne puis tri stable : l'ordre des lignes d'une même clé est conservé
+        list_texte_rang = [self.coder_textes(dict_colonne[champ]) for champ in list_champ_cle]
+        list_array_rang = [array_rang for array_texte_unique, array_rang in list_texte_rang]
+        array_ordre = np.lexsort(list_array_rang[::-1]) if len(dict_colonne["id"]) > 0 else np.array([], dtype=np.int64)
+        dict_colonne = {champ: valeurs[array_ordre] for champ, valeurs in dict_colonne.items()}
+        list_array_rang = [array_rang[array_ordre] for array_rang in list_array_rang]
+        # Index : clé = tuple des textes des champs clés / valeur = bornes (début, fin) des lignes de la clé
+        dict_index = {}
+        if len(array_ordre) > 0:
+            array_changement = np.zeros(len(array_ordre), dtype=bool)
+            array_changement[0] = True
+            for array_rang in list_array_rang:
+                array_changement[1:] |= array_rang[1:] != array_rang[:-1]
+            array_debut = np.flatnonzero(array_changement)
+            array_fin = np.append(array_debut[1:], len(array_ordre))
+            list_array_cle = [array_texte_unique[array_rang[array_debut]]
+                              for (array_texte_unique, _), array_rang in zip(list_texte_rang, list_array_rang)]
+            for num_cle, (debut, fin) in enumerate(zip(array_debut, array_fin)):
+                dict_index[tuple(array_cle[num_cle] for array_cle in list_array_cle)] = (debut, fin)
+        self.dict_serie[id_couche] = {"colonnes": dict_colonne,
+                                      "champs_cles": list_champ_cle,
+                                      "index": dict_index}
+
+    def invalider(self, id_couche=None):
+        """
+        Supprime de la mémoire les chroniques d'une couche (de toutes les couches si id_couche vaut None).
+        :param id_couche: (str) id de la couche de données
+        :return: None
+        """
+        if id_couche is None:
+            self.dict_serie = {}
+        else:
+            self.dict_serie.pop(id_couche, None)
+
+    def lire_colonne_comparaison(self, serie, champ, numerique, array_ligne):
+        """
+        Renvoie une colonne préparée pour les comparaisons, limitée aux lignes sélectionnées.
+        :param serie: (dict) chroniques d'une table (voir charger)
+        :param champ: (str) nom du champ
+        :param numerique: (bool) colonne de nombres (float) ou de textes
+        :param array_ligne: (numpy array) numéros des lignes sélectionnées
+        :return: (tuple) numpy array des valeurs, numpy array des valeurs nulles (bool)
+        """
+        valeurs = serie["colonnes"][champ][array_ligne]
+        serie_valeur = self.normaliser_colonne(valeurs)
+        array_nul = pd.isna(serie_valeur).to_numpy(dtype=bool)
+        if numerique:
+            # Les valeurs non numériques sont considérées comme nulles
+            array_valeur = pd.to_numeric(serie_valeur, errors="coerce").to_numpy(dtype=float)
+            array_nul = array_nul | np.isnan(array_valeur)
+        else:
+            array_valeur = self.convertir_textes(serie_valeur)
+        return array_valeur, array_nul
+
+    def filtrer(self, id_couche, list_condition, list_champ):
+        """
+        Renvoie les colonnes des lignes qui vérifient toutes les conditions.
+        Les conditions "IN" et "=" sur les champs clés sont résolues par l'index, les autres par des masques.
+        :param id_couche: (str) id de la couche de données (chroniques chargées par charger)
+        :param list_condition: (list) tuples (champ, opérateur, valeur)
+        :param list_champ: (list) champs à renvoyer
+        :return: (dict) clé = nom du champ ou "id" / valeur = numpy array des valeurs des lignes filtrées
+        """
+        serie = self.dict_serie[id_couche]
+        dict_valeur_cle = {}
+        list_condition_masque = []
+        for champ, operateur, valeur in list_condition:
+            if (champ in serie["champs_cles"]) and (operateur in ("IN", "=")) and (champ not in dict_valeur_cle):
+                list_valeur = valeur if operateur == "IN" else [valeur]
+                dict_valeur_cle[champ] = [self.convertir_texte(v) for v in list_valeur]
+            else:
+                list_condition_masque.append((champ, operateur, valeur))
+
+        # Sélection des lignes par l'index si tous les champs clés sont filtrés, sinon toutes les lignes
+        nb_lignes = len(serie["colonnes"]["id"])
+        if (len(dict_valeur_cle) > 0) and (len(dict_valeur_cle) == len(serie["champs_cles"])):
+            list_cle = [()]
+            for champ in serie["champs_cles"]:
+                list_cle = [cle + (v,) for cle in list_cle for v in dict.fromkeys(dict_valeur_cle[champ])]
+            list_bornes = sorted(serie["index"][cle] for cle in list_cle if cle in serie["index"])
+            array_ligne = np.concatenate([np.arange(debut, fin) for debut, fin in list_bornes]
+                                         or [np.array([], dtype=np.int64)])
+        else:
+            array_ligne = np.arange(nb_lignes)
+            list_condition_masque = [(champ, "IN", list_valeur) for champ, list_valeur in dict_valeur_cle.items()] \
+                                    + list_condition_masque
+
+        # Masques des autres conditions, calculés sur les seules lignes sélectionnées
+        masque = np.ones(len(array_ligne), dtype=bool)
+        for champ, operateur, valeur in list_condition_masque:
+            numerique = isinstance(valeur, (int, float)) and not isinstance(valeur, bool)
+            array_valeur, array_nul = self.lire_colonne_comparaison(serie, champ, numerique, array_ligne)
+            if operateur == "NOT NULL":
+                masque &= ~array_nul
+                continue
+            if operateur == "IN":
+                masque_condition = np.isin(array_valeur, [self.convertir_texte(v) for v in valeur])
+            elif operateur in ("LIKE", "NOT LIKE"):
+                masque_condition = np.char.lower(array_valeur) == str(valeur).lower()
+                if operateur == "NOT LIKE":
+                    masque_condition = ~masque_condition
+            else:
+                if not numerique:
+                    valeur = self.convertir_texte(valeur)
+                if operateur == "=":
+                    masque_condition = array_valeur == valeur
+                elif operateur == "<>":
+                    masque_condition = array_valeur != valeur
+                elif operateur == ">=":
+                    masque_condition = array_valeur >= valeur
+                elif operateur == "<=":
+                    masque_condition = array_valeur <= valeur
+                else:
+                    raise ValueError(f"Opérateur de filtre inconnu : {operateur}")
+            masque &= masque_condition & ~array_nul
+        array_ligne = array_ligne[masque]
+        return {champ: serie["colonnes"][champ][array_ligne] for champ in ["id"] + list(list_champ)}
+
+
+if __name__ == '__main__':
+
+    print("")
+    print("---------------------------------------------------------------")
+    print("  Test de la classe Pick_Store du module pick_series")
+    print("---------------------------------------------------------------")
+    print("")
+
+    pstore = Pick_Store()
+    pstore.charger("Données_Analyses",
+                   {"id": np.arange(1, 7),
+                    "code_bss": np.array(["B2", "B1", "B2", "B1", "B1", "B3"], dtype=object),
+                    "code_param": np.array([1340, 1340, 1340, 1301, 1340, 1340], dtype=object),
+                    "date_debut_prelevement": np.array(["2020-01-01", "2020-02-01", "2021-01-01",
+                                                        "2020-01-01", "2019-01-01", "2020-01-01"], dtype=object),
+                    "resultat": np.array([10.0, None, 12.0, 8.0, 9.0, 30.0], dtype=object),
+                    "code_qualification": np.array([1, 1, 3, 1, 1, 1], dtype=object),
+                    "commentaire": np.array(["Correct", "Correct", "Correct", "Correct", "Aberrant", "Correct"], dtype=object)},
+                   ["code_bss", "code_param"])
+    list_condition = [("code_bss", "IN", ["B1", "B2"]), ("code_param", "=", 1340),
+                      ("date_debut_prelevement", ">=", "2019-06-01"), ("date_debut_prelevement", "<=", "2020-12-31"),
+                      ("code_qualification", "<>", 3), ("commentaire", "NOT LIKE", "aberrant"), ("resultat", "NOT NULL", None)]
+    print("Lignes filtrées (id 1 attendu) : ", pstore.filtrer("Données_Analyses", list_condition, ["code_bss", "resultat"]))
+    print("Toutes les lignes (6 attendues) : ", len(pstore.filtrer("Données_Analyses", [], ["code_bss"])["id"]))
+    pstore.invalider("Données_Analyses")
+    print("Chroniques invalidées : ", not pstore.contient("Données_Analyses"))
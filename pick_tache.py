@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+copyright: (C) 2019 by BRGM
+
+Module PickEau contenant une classe Pick_Task permettant :
+    - d'exécuter un téléchargement (requêtes, écriture des fichiers et des geopackages) dans une tâche Qgis,
+      hors du thread de l'interface qui reste ainsi disponible pendant tout le téléchargement,
+    - de transmettre l'avancement du téléchargement à la barre de progression par le signal progressChanged,
+      et le volume des données reçues par le signal volume_recu,
+    - de différer à la fin de la tâche, dans le thread de l'interface, les opérations qui ne peuvent être
+      effectuées que dans ce thread (ajout des couches à la carte, messages à l'utilisateur).
+"""
+
+from PyQt5.QtCore import pyqtSignal
+from qgis.core import QgsTask
+
+
+class Pick_Task(QgsTask):
+    """
+    Classe Pick_Task : tâche Qgis de téléchargement de PickEau.
+    La tâche est ajoutée au gestionnaire de tâches de Qgis (QgsApplication.taskManager()) :
+        - la fonction de travail est exécutée dans un thread du gestionnaire (méthode run),
+          elle reçoit la tâche en paramètre pour contrôler l'interruption (isCanceled), faire avancer
+          la barre de progression (avancer) et différer les opérations sur l'interface (differer),
+        - la fonction de fin est appelée dans le thread de l'interface (méthode finished) avec la tâche en paramètre :
+          elle dispose de l'éventuelle exception levée par la fonction de travail et exécute les opérations différées.
+    """
+    # Signal émis depuis le thread de la tâche : nombre de lignes et nombre d'octets des données reçues
+    volume_recu = pyqtSignal(int, int)
+
+    def __init__(self, description, fonction_travail, fonction_fin):
+        """
+        Constructeur de la classe Pick_Task
+        :param description: (str) description de la tâche affichée dans le gestionnaire de tâches de Qgis
+        :param fonction_travail: fonction exécutée hors du thread de l'interface, appelée avec la tâche en paramètre
+        :param fonction_fin: fonction exécutée dans le thread de l'interface, appelée avec la tâche en paramètre
+        """
+        super().__init__(description, QgsTask.CanCancel)
+        self.fonction_travail = fonction_travail
+        self.fonction_fin = fonction_fin
+        self.nb_etapes = 1
+        # Exception levée par la fonction de travail (None si la fonction s'est terminée normalement)
+        self.exception = None
+        # Résultat de la tâche : True si la fonction de travail s'est terminée normalement
+        self.succes = False
+        # Liste des opérations différées : tuples (fonction, arguments)
+        self.list_action_fin = []
+
+    def definir_nb_etapes(self, nb_etapes):
+        """
+        Définit le nombre d'étapes de la tâche correspondant à une progression de 100 %.
+        :param nb_etapes: (int) nombre d'étapes
+        :return: None
+        """
+        self.nb_etapes = max(1, nb_etapes)
+
+    def avancer(self, num_etape):
+        """
+        Met à jour la progression de la tâche (signal progressChanged, reçu dans le thread de l'interface).
+        :param num_etape: (int) numéro de l'étape atteinte
+        :return: None
+        """
+        self.setProgress(min(100.0, 100.0 * num_etape / self.nb_etapes))
+
+    def signaler_volume(self, nb_lignes, nb_octets):
+        """
+        Transmet le volume des données reçues (signal volume_recu, reçu dans le thread de l'interface).
+        Cette fonction peut être passée comme fonction_volume d'un collecteur pick_collecte.Pick_Sink.
+        :param nb_lignes: (int) nombre de lignes reçues
+        :param nb_octets: (int) nombre d'octets reçus
+        :return: None
+        """
+        self.volume_recu.emit(nb_lignes, nb_octets)
+
+    def differer(self, fonction, *args):
+        """
+        Enregistre une opération à exécuter à la fin de la tâche dans le thread de l'interface.
+        :param fonction: fonction à exécuter
+        :param args: arguments de la fonction
+        :return: None
+        """
+        self.list_action_fin.append((fonction, args))
+
+    def executer_actions_fin(self):
+        """
+        Exécute les opérations différées dans l'ordre de leur enregistrement (thread de l'interface uniquement).
+        :return: None
+        """
+        for fonction, args in self.list_action_fin:
+            fonction(*args)
+        self.list_action_fin = []
+
+    def run(self):
+        """
+        Exécute la fonction de travail (thread du gestionnaire de tâches).
+        L'exception éventuelle est conservée pour être traitée dans le thread de l'interface.
+        :return: (bool) True si la fonction de travail s'est terminée normalement
+        """
+        try:
+            self.fonction_travail(self)
+        except Exception as erreur:
+            self.exception = erreur
+            return False
+        return True
+
+    def finished(self, resultat):
+        """
+        Appelée par le gestionnaire de tâches dans le thread de l'interface à la fin de la tâche
+        (terminée, en échec ou interrompue).
+        :param resultat: (bool) valeur renvoyée par run (False si la tâche a été interrompue avant son démarrage)
+        :return: None
+        """
+        self.succes = resultat
+        self.fonction_fin(self)
+
+
+if __name__ == '__main__':
+
+    print("")
+    print("---------------------------------------------------------------")
+    print("  Test de la classe Pick_Task du module pick_tache")
+    print("---------------------------------------------------------------")
+    print("")
+
+    def travail_test(tache):
+        tache.definir_nb_etapes(4)
+        for num_etape in range(1, 5):
+            tache.avancer(num_etape)
+            tache.differer(print, "Etape terminée : ", num_etape)
+
+    def fin_test(tache):
+        print("Succès : ", tache.succes, " - Exception : ", tache.exception)
+        tache.executer_actions_fin()
+
+    # Exécution synchrone de la tâche (sans gestionnaire de tâches)
+    ptask = Pick_Task("Test", travail_test, fin_test)
+    ptask.progressChanged.connect(lambda progression: print("Progression (%) : ", progression))
+    ptask.finished(ptask.run())
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+copyright: (C) 2019 by BRGM
+
+Module PickEau contenant une classe Pick_Download permettant :
+    - de répartir les requêtes Hubeau par point (une requête par station) sur un pool borné de threads,
+    - de collecter les résultats dans l'ordre des requêtes demandées,
+    - de conserver le contrôle de l'interruption par l'utilisateur et la mise à jour de la barre de progression.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class Pick_Download():
+    """
+    Classe Pick_Download : moteur de téléchargement parallèle des requêtes par point.
+    Les requêtes sont indépendantes les unes des autres (une station, un groupe ou une liste de paramètres) :
+    elles sont envoyées par un pool de threads dont la taille est bornée par le paramètre nb_requetes_simultanees,
+    tandis que le thread appelant (tâche Qgis de téléchargement, voir pick_tache.Pick_Task) reste en charge
+    du contrôle de l'interruption par l'utilisateur et de la mise à jour de la barre de progression.
+    """
+    def __init__(self, nb_requetes_simultanees=8):
+        """
+        Constructeur de la classe Pick_Download
+        :param nb_requetes_simultanees: (int) nombre maximum de requêtes envoyées simultanément
+        """
+        self.nb_requetes_simultanees = max(1, int(nb_requetes_simultanees))
+        # Drapeau partagé par les threads : une fois levé, les requêtes non encore démarrées ne sont pas envoyées
+        self.interruption = threading.Event()
+
+    def interrompre(self):
+        """
+        Demande l'interruption du téléchargement en cours : les requêtes déjà envoyées se terminent,
+        les requêtes en attente ne sont pas envoyées.
+        :return: None
+        """
+        self.interruption.set()
+
+    def executer(self, fonction_requete, list_args_requete, fonction_controle=None, fonction_progression=None,
+                 fonction_resultat=None):
+        """
+        Exécute la fonction de requête pour chaque tuple d'arguments de la liste en répartissant les appels
+        sur le pool de threads, et renvoie la liste des résultats dans l'ordre de la liste des arguments.
+        :param fonction_requete: fonction appelée pour chaque requête (p.ex. Pick_Req.requete_hubeau_par_point)
+        :param list_args_requete: liste de tuples d'arguments passés à la fonction de requête
+        :param fonction_controle: fonction sans paramètre appelée régulièrement dans le thread appelant
+                                  (levée d'une exception en cas d'interruption par l'utilisateur)
+        :param fonction_progression: fonction appelée dans le thread appelant à chaque requête terminée,
+                                     avec en paramètre le nombre de requêtes terminées
+        :param fonction_resultat: fonction appelée dans le thread appelant à chaque requête terminée, avec en paramètres
+                                  l'index de la requête et son résultat (p.ex ajout à un collecteur pick_collecte.Pick_Sink) :
+                                  le résultat n'est alors pas conservé dans la liste renvoyée
+        :return: liste des résultats de la fonction de requête (dans l'ordre de list_args_requete),
+                 liste de None si la fonction fonction_resultat est définie
+        """
+        self.interruption.clear()
+        list_resultat = [None] * len(list_args_requete)
+        if len(list_args_requete) == 0:
+            return list_resultat
+
+        nb_threads = min(self.nb_requetes_simultanees, len(list_args_requete))
+        executor = ThreadPoolExecutor(max_workers=nb_threads)
+        # Dictionnaire clé = objet future / valeur = index de la requête dans la liste des arguments
+        dict_future = {}
+        try:
+            for index, args_requete in enumerate(list_args_requete):
+                future = executor.submit(self.executer_requete, fonction_requete, args_requete)
+                dict_future[future] = index
+
+            # Attente des résultats par courtes périodes pour contrôler régulièrement l'interruption
+            # par l'utilisateur (bouton 'Interrompre') et mettre à jour la barre de progression
+            set_future_en_cours = set(dict_future.keys())
+            nb_requete_terminee = 0
+            while len(set_future_en_cours) > 0:
+                if fonction_controle is not None:
+                    fonction_controle()
+                set_future_termine, set_future_en_cours = wait(set_future_en_cours, timeout=0.1,
+                                                               return_when=FIRST_COMPLETED)
+                for future in set_future_termine:
+                    # Lève dans le thread appelant l'éventuelle exception survenue dans le thread de la requête
+                    if fonction_resultat is not None:
+                        fonction_resultat(dict_future[future], future.result())
+                    else:
+                        list_resultat[dict_future[future]] = future.result()
+                    nb_requete_terminee += 1
+                    if fonction_progression is not None:
+                        fonction_progression(nb_requete_terminee)
+            if fonction_controle is not None:
+                fonction_controle()
+
+        # En cas d'interruption ou d'erreur, on annule les requêtes qui n'ont pas encore démarré
+        # avant de remonter l'exception à la fonction appelante
+        except BaseException:
+            self.interruption.set()
+            for future in dict_future.keys():
+                future.cancel()
+            raise
+
+        finally:
+            executor.shutdown(wait=False)
+
+        return list_resultat
+
+    def executer_requete(self, fonction_requete, args_requete):
+        """
+        Exécute une requête dans un thread du pool, sauf si l'interruption a été demandée entre-temps.
+        :param fonction_requete: fonction de requête
+        :param args_requete: tuple d'arguments passés à la fonction de requête
+        :return: résultat de la fonction de requête (None si la requête n'a pas été envoyée)
+        """
+        if self.interruption.is_set():
+            return None
+        return fonction_requete(*args_requete)
+
+
+if __name__ == '__main__':
+
+    print("")
+    print("---------------------------------------------------------------")
+    print("  Test de la classe Pick_Download du module pick_telechargement")
+    print("---------------------------------------------------------------")
+    print("")
+
+    import time
+
+    def requete_test(code_point, duree):
+        time.sleep(duree)
+        return (code_point, 200)
+
+    # Instanciation de la classe à tester
+    pdownload = Pick_Download(4)
+
+    list_args = [("BSS00" + str(i), 0.05) for i in range(20)]
+    debut = time.time()
+    list_resultat = pdownload.executer(requete_test, list_args,
+                                       fonction_progression=lambda nb: print("Requêtes terminées : ", nb))
+    print("Durée (s) : ", round(time.time() - debut, 2))
+    print("Ordre conservé : ", [res[0] for res in list_resultat] == [args[0] for args in list_args])
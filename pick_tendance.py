@@ -0,0 +1,540 @@
+# -*- coding: utf-8 -*-
+"""
+copyright: (C) 2019 by BRGM
+
+Module PickEau contenant une classe Pick_Trend permettant :
+    - d'agréger les chroniques d'une table de données (analyses ou niveaux) au pas de temps mensuel,
+    - de calculer en un seul traitement par lots, pour toutes les chroniques (une par station et par paramètre) :
+        - le test de tendance de Mann-Kendall, avec correction de la variance pour les ex-aequo
+          et pour l'autocorrélation (méthode de Hamed et Rao, 1998),
+        - la pente de Sen (médiane des pentes entre tous les couples de valeurs, en unité par an).
+Les chroniques sont regroupées en blocs de chroniques de longueurs voisines et chaque bloc est calculé par des
+opérations numpy sur des tableaux (chroniques x valeurs x valeurs) : le nombre de chroniques ne fait pas
+intervenir de boucle python, la taille des blocs est bornée pour limiter la mémoire occupée.
+Une chronique trop longue pour ces tableaux (p.ex une chronique journalière de plusieurs décennies) est calculée
+seule, par morceaux de couples de valeurs dont la taille est bornée de la même façon.
+Les blocs sont répartis entre plusieurs processus de calcul (un par coeur) qui lisent les chroniques
+dans des fichiers numpy partagés en lecture seule (memmap), sans copie des données pour chaque bloc.
+"""
+
+import os
+import sys
+import math
+import shutil
+import tempfile
+import warnings
+import importlib.util
+from statistics import NormalDist
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+import site
+
+import numpy as np
+import pandas as pd
+
+
+# Définition des exceptions gérées par les fonctions des classes du module
+class Error(Exception):
+   """Base class for other exceptions."""
+   pass
+class ErreurInterruptionCalcul(Error):
+   """Exception gérée levée lorsque l'utilisateur a demandé l'interruption du calcul."""
+   pass
+
+
+# Nom des fichiers numpy partagés avec les processus de calcul
+list_nom_tableau = ["valeur", "t", "num_serie", "num_valeur", "nb_valeurs"]
+
+
+def calculer_bloc_processus(dict_config_tendance, dossier_tableau, debut, fin, ligne_debut, ligne_fin):
+    """
+    Calcul d'un bloc de chroniques dans un processus de calcul : les chroniques sont lues dans les fichiers numpy
+    partagés (memmap, lecture seule) et seules les lignes du bloc sont chargées en mémoire.
+    :param dict_config_tendance: (dict) section "tendance" du fichier de configuration
+    :param dossier_tableau: (str) dossier des fichiers numpy partagés
+    :param debut: (int) numéro de la première chronique du bloc
+    :param fin: (int) numéro de la chronique suivant la dernière chronique du bloc
+    :param ligne_debut: (int) première ligne des valeurs du bloc
+    :param ligne_fin: (int) ligne suivant la dernière ligne des valeurs du bloc
+    :return: (tuple) numéro de la première chronique du bloc, dict des résultats (voir Pick_Trend.calculer_bloc)
+    """
+    dict_tableau = {nom: np.load(os.path.join(dossier_tableau, nom + ".npy"), mmap_mode='r') for nom in list_nom_tableau}
+    ptrend = Pick_Trend(dict_config_tendance)
+    array_x, array_t = ptrend.construire_bloc(dict_tableau, debut, fin, ligne_debut, ligne_fin)
+    return debut, ptrend.calculer_bloc(array_x, array_t, np.array(dict_tableau["nb_valeurs"][debut:fin]))
+
+
+def trouver_executable_python():
+    """
+    Recherche l'interpréteur python qui exécutera les processus de calcul : dans Qgis, sys.executable
+    désigne l'exécutable de Qgis et non celui de python.
+    :return: (str) chemin de l'interpréteur python, None s'il n'est pas trouvé
+    """
+    if os.path.basename(sys.executable).lower().startswith("python"):
+        return sys.executable
+    for chemin_relatif in ["pythonw.exe", "python.exe", os.path.join("bin", "python3"), os.path.join("bin", "python")]:
+        chemin = os.path.join(sys.exec_prefix, chemin_relatif)
+        if os.path.isfile(chemin):
+            return chemin
+    return None
+
+
+def charger_module_processus():
+    """
+    Renvoie le module pick_tendance chargé sous son nom de premier niveau : les processus de calcul importent
+    ce module seul (numpy et pandas), sans importer le plugin et Qgis.
+    :return: module pick_tendance
+    """
+    if "pick_tendance" not in sys.modules:
+        spec = importlib.util.spec_from_file_location("pick_tendance", os.path.abspath(__file__))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["pick_tendance"] = module
+        spec.loader.exec_module(module)
+    return sys.modules["pick_tendance"]
+
+
+class Pick_Trend():
+    """
+    Classe Pick_Trend : calcul des tendances des chroniques par le test de Mann-Kendall et la pente de Sen.
+    Les résultats sont renvoyés dans un df (une ligne par chronique) : nombre de valeurs, période, statistique S,
+    variance de S (corrigée), Z, p-value, pente et ordonnée à l'origine de Sen, tendance ("Hausse", "Baisse", "Absence").
+    """
+    # Libellés des tendances
+    hausse = "Hausse"
+    baisse = "Baisse"
+    absence = "Absence"
+
+    def __init__(self, dict_config_tendance):
+        """
+        Constructeur de la classe Pick_Trend
+        :param dict_config_tendance: (dict) section "tendance" du fichier de configuration
+        """
+        self.pas_agregation = dict_config_tendance["pas_agregation"]
+        self.nb_min_valeurs = max(3, dict_config_tendance["nb_min_valeurs"])
+        self.seuil_significativite = dict_config_tendance["seuil_significativite"]
+        self.correction_autocorrelation = dict_config_tendance["correction_autocorrelation"]
+        self.taille_max_bloc = dict_config_tendance["taille_max_bloc"]
+        # Nombre de processus de calcul (0 = un par coeur, en laissant un coeur à Qgis)
+        nb_processus = dict_config_tendance["nb_processus"]
+        self.nb_processus = nb_processus if nb_processus > 0 else max(1, (os.cpu_count() or 1) - 1)
+        self.dict_config_tendance = dict_config_tendance
+
+    def agreger(self, df_donnee, list_champ_cle, champ_date, champ_valeur):
+        """
+        Prépare les chroniques : dates converties en années décimales, valeurs numériques,
+        moyennes mensuelles si le pas d'agrégation est "mensuel" (valeurs brutes sinon).
+        :param df_donnee: (DataFrame) table de données
+        :param list_champ_cle: (list) champs identifiant une chronique (p.ex ["code_bss", "code_param"])
+        :param champ_date: (str) champ des dates
+        :param champ_valeur: (str) champ des valeurs
+        :return: (DataFrame) df des champs clés, "date" (date de la valeur), "t" (années décimales) et "valeur"
+        """
+        df = df_donnee[list_champ_cle].copy()
+        df["date"] = pd.to_datetime(df_donnee[champ_date].astype(str).str[:10], errors='coerce')
+        df["valeur"] = pd.to_numeric(df_donnee[champ_valeur], errors='coerce')
+        df = df.dropna(subset=["date", "valeur"])
+        if self.pas_agregation == "mensuel":
+            df["date"] = df["date"].dt.to_period("M").dt.to_timestamp()
+            df = df.groupby(list_champ_cle + ["date"], observed=True, sort=False)["valeur"].mean().reset_index()
+        # Années décimales (milieu du mois pour les moyennes mensuelles)
+        jour_annee = df["date"].dt.dayofyear - 1 + (15 if self.pas_agregation == "mensuel" else 0)
+        df["t"] = df["date"].dt.year + jour_annee / 365.25
+        return df.sort_values(list_champ_cle + ["t"]).reset_index(drop=True)
+
+    def calculer_bloc(self, array_x, array_t, array_n):
+        """
+        Calcule le test de Mann-Kendall et la pente de Sen d'un bloc de chroniques de même longueur de tableau.
+        :param array_x: (numpy array) valeurs (chroniques x valeurs), complétées par NaN en fin de ligne
+        :param array_t: (numpy array) dates en années décimales (même forme que array_x)
+        :param array_n: (numpy array) nombre de valeurs de chaque chronique
+        :return: (dict) clé = nom du résultat / valeur = numpy array (une valeur par chronique)
+        """
+        nb_serie, nb_max = array_x.shape
+        array_valide = ~np.isnan(array_x)
+        # Statistique S de Mann-Kendall et pente de Sen : tableaux (chroniques x valeurs x valeurs)
+        # si leur taille ne dépasse pas la taille maximum des blocs, calcul par morceaux sinon
+        if nb_serie * nb_max * nb_max <= self.taille_max_bloc:
+            array_s, array_pente = self.calculer_s_pente(array_x, array_t, array_valide)
+        else:
+            array_s, array_pente = self.calculer_s_pente_morceaux(array_x, array_t, array_valide)
+        # Ordonnée à l'origine de Sen : médiane des ordonnées à l'origine des valeurs
+        # (chroniques sans couple de dates distinctes : pente NaN, avertissement de nanmedian ignoré)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            array_origine = np.nanmedian(array_x - array_pente[:, None] * array_t, axis=1)
+
+        # Variance de S corrigée pour les ex-aequo : somme de t(t-1)(2t+5) sur les groupes de t valeurs égales
+        array_tri = np.sort(array_x, axis=1)
+        array_debut = np.ones(array_tri.shape, dtype=bool)
+        array_debut[:, 1:] = array_tri[:, 1:] != array_tri[:, :-1]
+        array_valide_tri = ~np.isnan(array_tri)
+        array_num_serie = np.broadcast_to(np.arange(nb_serie)[:, None], array_tri.shape)[array_valide_tri]
+        array_debut = array_debut[array_valide_tri]
+        array_effectif = np.bincount(np.cumsum(array_debut) - 1).astype(float)
+        array_ex_aequo = np.bincount(array_num_serie[array_debut],
+                                     weights=array_effectif * (array_effectif - 1) * (2 * array_effectif + 5),
+                                     minlength=nb_serie)
+        n = array_n.astype(float)
+        array_var_s = (n * (n - 1) * (2 * n + 5) - array_ex_aequo) / 18
+
+        # Correction de l'autocorrélation (Hamed et Rao, 1998) : autocorrélations significatives des rangs
+        # de la chronique sans tendance (pente de Sen retirée)
+        if self.correction_autocorrelation:
+            array_residu = np.where(array_valide, array_x - array_pente[:, None] * array_t, np.nan)
+            # (tri stable : rangs des ex-aequo indépendants de la longueur du tableau du bloc)
+            array_rang = np.argsort(np.argsort(array_residu, axis=1, kind='stable'), axis=1, kind='stable').astype(float)
+            array_rang[~array_valide] = np.nan
+            array_rang = array_rang - np.nanmean(array_rang, axis=1)[:, None]
+            array_rang = np.nan_to_num(array_rang)
+            array_denominateur = (array_rang ** 2).sum(axis=1)
+            array_denominateur[array_denominateur == 0] = np.nan
+            seuil_rho = NormalDist().inv_cdf(1 - self.seuil_significativite / 2) / np.sqrt(n)
+            array_somme = np.zeros(nb_serie)
+            for decalage in range(1, nb_max - 2):
+                array_rho = (array_rang[:, :-decalage] * array_rang[:, decalage:]).sum(axis=1) / array_denominateur
+                # (arrondi : le test de significativité ne dépend pas des erreurs d'arrondi de la somme)
+                array_rho = np.round(array_rho, 10)
+                array_poids = (n - decalage) * (n - decalage - 1) * (n - decalage - 2)
+                array_signif = (np.abs(array_rho) > seuil_rho) & (array_poids > 0)
+                array_somme += np.where(array_signif, array_poids * array_rho, 0)
+            with np.errstate(all='ignore'):
+                array_facteur = 1 + 2 * array_somme / (n * (n - 1) * (n - 2))
+            array_var_s = array_var_s * np.where(array_facteur > 0, array_facteur, 1)
+
+        # Statistique Z (correction de continuité) et p-value bilatérale
+        with np.errstate(all='ignore'):
+            array_z = np.where(array_s > 0, (array_s - 1) / np.sqrt(array_var_s),
+                               np.where(array_s < 0, (array_s + 1) / np.sqrt(array_var_s), 0.0))
+        array_z = np.nan_to_num(array_z)
+        array_p = np.vectorize(math.erfc, otypes=[float])(np.abs(array_z) / math.sqrt(2))
+        return {"S": array_s.astype(np.int64), "var_S": array_var_s, "Z": array_z, "p_value": array_p,
+                "pente_sen": array_pente, "origine_sen": array_origine}
+
+    @staticmethod
+    def calculer_s_pente(array_x, array_t, array_valide):
+        """
+        Calcule la statistique S de Mann-Kendall et la pente de Sen d'un bloc de chroniques à partir des tableaux
+        de tous les couples de valeurs (chroniques x valeurs x valeurs).
+        :param array_x: (numpy array) valeurs (chroniques x valeurs), complétées par NaN en fin de ligne
+        :param array_t: (numpy array) dates en années décimales (même forme que array_x)
+        :param array_valide: (numpy array) valeurs renseignées (bool, même forme que array_x)
+        :return: (tuple) numpy array des statistiques S, numpy array des pentes de Sen
+        """
+        nb_serie, nb_max = array_x.shape
+        # Couples (i, j) avec i < j : différences x_j - x_i et t_j - t_i (chroniques x i x j)
+        triangle = np.triu(np.ones((nb_max, nb_max), dtype=bool), 1)
+        array_couple = triangle[None, :, :] & array_valide[:, :, None] & array_valide[:, None, :]
+        array_dx = array_x[:, None, :] - array_x[:, :, None]
+        array_dt = array_t[:, None, :] - array_t[:, :, None]
+
+        # Statistique S de Mann-Kendall
+        array_s = np.where(array_couple, np.sign(np.nan_to_num(array_dx)), 0).sum(axis=(1, 2))
+
+        # Pente de Sen : médiane des pentes des couples de dates distinctes
+        array_pente_couple = np.where(array_couple & (array_dt != 0), array_dx / np.where(array_dt != 0, array_dt, 1), np.nan)
+        del array_dx, array_dt, array_couple
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            array_pente = np.nanmedian(array_pente_couple.reshape(nb_serie, -1), axis=1)
+        return array_s, array_pente
+
+    def calculer_s_pente_morceaux(self, array_x, array_t, array_valide):
+        """
+        Calcule la statistique S de Mann-Kendall et la pente de Sen chronique par chronique, par morceaux de couples
+        de valeurs d'au plus taille_max_bloc couples : la mémoire occupée ne dépend pas de la longueur des chroniques.
+        La médiane des pentes est recherchée par encadrements successifs (voir selectionner_rang).
+        :param array_x: (numpy array) valeurs (chroniques x valeurs), complétées par NaN en fin de ligne
+        :param array_t: (numpy array) dates en années décimales (même forme que array_x)
+        :param array_valide: (numpy array) valeurs renseignées (bool, même forme que array_x)
+        :return: (tuple) numpy array des statistiques S, numpy array des pentes de Sen
+        """
+        nb_serie = array_x.shape[0]
+        array_s = np.zeros(nb_serie, dtype=np.int64)
+        array_pente = np.full(nb_serie, np.nan)
+        for num_serie in range(nb_serie):
+            x = array_x[num_serie][array_valide[num_serie]]
+            t = array_t[num_serie][array_valide[num_serie]]
+
+            def iterer_pentes():
+                for dx, dt in self.iterer_couples(x, t):
+                    array_dt_distinct = dt != 0
+                    yield dx[array_dt_distinct] / dt[array_dt_distinct]
+
+            # Statistique S et nombre de pentes (couples de dates distinctes) en une passe
+            nb_pente = 0
+            for dx, dt in self.iterer_couples(x, t):
+                array_s[num_serie] += int(np.sign(dx).sum())
+                nb_pente += int(np.count_nonzero(dt))
+            if nb_pente == 0:
+                continue
+            # Médiane : moyenne des deux valeurs centrales si le nombre de pentes est pair (comme np.nanmedian)
+            rang = (nb_pente - 1) // 2
+            pente_centrale = self.selectionner_rang(iterer_pentes, rang, nb_pente)
+            if nb_pente % 2 == 0:
+                nb_inferieur_egal, pente_suivante = 0, np.inf
+                for pente in iterer_pentes():
+                    nb_inferieur_egal += int((pente <= pente_centrale).sum())
+                    pente_superieure = pente[pente > pente_centrale]
+                    if len(pente_superieure) > 0:
+                        pente_suivante = min(pente_suivante, pente_superieure.min())
+                if nb_inferieur_egal <= rang + 1:
+                    pente_centrale = (pente_centrale + pente_suivante) / 2
+            array_pente[num_serie] = pente_centrale
+        return array_s, array_pente
+
+    def iterer_couples(self, x, t):
+        """
+        Générateur des différences des couples de valeurs (i, j) avec i < j d'une chronique, par morceaux
+        d'au plus taille_max_bloc couples (lignes i consécutives).
+        :param x: (numpy array) valeurs renseignées de la chronique, classées par date
+        :param t: (numpy array) dates en années décimales
+        :return: itérateur de tuples (numpy array des différences x_j - x_i, numpy array des différences t_j - t_i)
+        """
+        nb_valeurs = len(x)
+        nb_lignes = max(1, self.taille_max_bloc // max(1, nb_valeurs))
+        array_colonne = np.arange(nb_valeurs)
+        for debut in range(0, nb_valeurs - 1, nb_lignes):
+            fin = min(nb_valeurs - 1, debut + nb_lignes)
+            array_couple = array_colonne[None, debut + 1:] > array_colonne[debut:fin, None]
+            yield ((x[None, debut + 1:] - x[debut:fin, None])[array_couple],
+                   (t[None, debut + 1:] - t[debut:fin, None])[array_couple])
+
+    def selectionner_rang(self, fonction_morceaux, rang, nb_valeurs):
+        """
+        Recherche la valeur de rang donné (0 = plus petite valeur) parmi les valeurs renvoyées par morceaux,
+        sans conserver toutes les valeurs en mémoire : l'intervalle [bas, haut[ qui contient la valeur est réduit
+        à chaque passe (classes définies par les quantiles d'un échantillon des valeurs de l'intervalle)
+        jusqu'à ce que ses valeurs tiennent dans un tableau de taille_max_bloc valeurs.
+        :param fonction_morceaux: fonction sans paramètre qui renvoie un itérateur des morceaux de valeurs (numpy arrays)
+        :param rang: (int) rang de la valeur recherchée
+        :param nb_valeurs: (int) nombre total de valeurs
+        :return: (float) valeur de rang donné
+        """
+        nb_classes = 1000
+        bas, haut = -np.inf, np.inf
+        nb_intervalle = nb_valeurs
+        while True:
+            # Valeurs de l'intervalle : nombre, minimum, maximum, échantillon régulier
+            # et valeurs elles-mêmes tant que leur nombre ne dépasse pas la taille maximum d'un bloc
+            pas_echantillon = max(1, nb_intervalle // (100 * nb_classes))
+            nb_inferieur, nb_intervalle = 0, 0
+            valeur_min, valeur_max = np.inf, -np.inf
+            list_echantillon, list_valeur = [], []
+            for morceau in fonction_morceaux():
+                nb_inferieur += int((morceau < bas).sum())
+                valeurs = morceau[(morceau >= bas) & (morceau < haut)]
+                if len(valeurs) == 0:
+                    continue
+                nb_intervalle += len(valeurs)
+                valeur_min, valeur_max = min(valeur_min, valeurs.min()), max(valeur_max, valeurs.max())
+                list_echantillon.append(valeurs[::pas_echantillon])
+                if nb_intervalle > self.taille_max_bloc:
+                    list_valeur = None
+                elif list_valeur is not None:
+                    list_valeur.append(valeurs)
+            rang_intervalle = rang - nb_inferieur
+            if list_valeur is not None:
+                return float(np.partition(np.concatenate(list_valeur), rang_intervalle)[rang_intervalle])
+            if valeur_min == valeur_max:
+                return float(valeur_min)
+
+            # Bornes des classes, toutes comprises dans ]min, max] : chaque classe exclut au moins une valeur
+            # de l'intervalle, qui est donc réduit à chaque passe
+            array_borne = np.quantile(np.concatenate(list_echantillon), np.linspace(0, 1, nb_classes + 1))
+            array_borne = np.unique(np.append(array_borne, [(valeur_min + valeur_max) / 2, valeur_max]))
+            array_borne = array_borne[(array_borne > valeur_min) & (array_borne <= valeur_max)]
+            array_effectif = np.zeros(len(array_borne) + 1, dtype=np.int64)
+            for morceau in fonction_morceaux():
+                valeurs = morceau[(morceau >= bas) & (morceau < haut)]
+                array_effectif += np.bincount(np.searchsorted(array_borne, valeurs, side='right'),
+                                              minlength=len(array_effectif))
+            num_classe = int(np.searchsorted(np.cumsum(array_effectif), rang_intervalle, side='right'))
+            bas = array_borne[num_classe - 1] if num_classe > 0 else bas
+            haut = array_borne[num_classe] if num_classe < len(array_borne) else haut
+            nb_intervalle = int(array_effectif[num_classe])
+
+    @staticmethod
+    def construire_bloc(dict_tableau, debut, fin, ligne_debut, ligne_fin):
+        """
+        Construit les tableaux (chroniques x valeurs) d'un bloc de chroniques, complétés par NaN.
+        :param dict_tableau: (dict) tableaux des valeurs ("valeur", "t", "num_serie", "num_valeur")
+                             classées par chronique, et nombre de valeurs de chaque chronique ("nb_valeurs")
+        :param debut: (int) numéro de la première chronique du bloc
+        :param fin: (int) numéro de la chronique suivant la dernière chronique du bloc
+        :param ligne_debut: (int) première ligne des valeurs du bloc
+        :param ligne_fin: (int) ligne suivant la dernière ligne des valeurs du bloc
+        :return: (tuple) tableau des valeurs, tableau des dates
+        """
+        nb_max = int(dict_tableau["nb_valeurs"][debut])
+        array_x = np.full((fin - debut, nb_max), np.nan)
+        array_t = np.full((fin - debut, nb_max), np.nan)
+        index_ligne = dict_tableau["num_serie"][ligne_debut:ligne_fin] - debut
+        index_colonne = dict_tableau["num_valeur"][ligne_debut:ligne_fin]
+        array_x[index_ligne, index_colonne] = dict_tableau["valeur"][ligne_debut:ligne_fin]
+        array_t[index_ligne, index_colonne] = dict_tableau["t"][ligne_debut:ligne_fin]
+        return array_x, array_t
+
+    def decouper_blocs(self, array_n):
+        """
+        Découpe les chroniques (classées par longueur décroissante) en blocs : la plus longue chronique d'un bloc
+        fixe la largeur des tableaux, le nombre de chroniques est limité par la taille maximum des tableaux
+        (chroniques x valeurs x valeurs) et, s'il y a plusieurs processus, par une part du calcul total
+        pour que chaque processus reçoive plusieurs blocs. Une chronique dont le tableau dépasse à lui seul
+        la taille maximum forme un bloc à elle seule (calcul par morceaux, voir calculer_s_pente_morceaux).
+        :param array_n: (numpy array) nombre de valeurs de chaque chronique, décroissant
+        :return: (list) tuples (numéro de la première chronique, numéro suivant la dernière chronique)
+        """
+        taille_bloc = self.taille_max_bloc
+        if self.nb_processus > 1:
+            taille_bloc = min(taille_bloc, max(1, int((array_n.astype(float) ** 2).sum() / (4 * self.nb_processus))))
+        list_bloc = []
+        debut = 0
+        while debut < len(array_n):
+            nb_max = int(array_n[debut])
+            fin = min(len(array_n), debut + max(1, taille_bloc // (nb_max * nb_max)))
+            list_bloc.append((debut, fin))
+            debut = fin
+        return list_bloc
+
+    def calculer(self, df_donnee, list_champ_cle, champ_date, champ_valeur, fonction_progression=None, fonction_interruption=None):
+        """
+        Calcule les tendances de toutes les chroniques d'une table de données.
+        :param df_donnee: (DataFrame) table de données
+        :param list_champ_cle: (list) champs identifiant une chronique (p.ex ["code_bss", "code_param"])
+        :param champ_date: (str) champ des dates
+        :param champ_valeur: (str) champ des valeurs
+        :param fonction_progression: fonction appelée avec le nombre de blocs calculés et le nombre total de blocs
+        :param fonction_interruption: fonction sans paramètre qui renvoie True si l'interruption du calcul est demandée
+        :return: (DataFrame) df des tendances (une ligne par chronique d'au moins nb_min_valeurs valeurs)
+        """
+        df = self.agreger(df_donnee, list_champ_cle, champ_date, champ_valeur)
+        groupes = df.groupby(list_champ_cle, observed=True, sort=False)
+        df["num_valeur"] = groupes.cumcount()
+        df_serie = groupes.agg(nb_valeurs=("valeur", "size"), date_debut=("date", "min"), date_fin=("date", "max")).reset_index()
+        df_serie = df_serie[df_serie["nb_valeurs"] >= self.nb_min_valeurs]
+        list_champ_resultat = ["S", "var_S", "Z", "p_value", "pente_sen", "origine_sen"]
+        if len(df_serie) == 0:
+            return df_serie.reindex(columns=list_champ_cle + ["nb_valeurs", "date_debut", "date_fin"]
+                                    + list_champ_resultat + ["tendance"])
+        # Chroniques classées par longueur décroissante, numérotées dans cet ordre,
+        # et valeurs classées par chronique (les valeurs d'un bloc sont contiguës)
+        df_serie = df_serie.sort_values("nb_valeurs", ascending=False).reset_index(drop=True)
+        df_serie["num_serie"] = np.arange(len(df_serie))
+        df = df.merge(df_serie[list_champ_cle + ["num_serie"]], on=list_champ_cle, how="inner")
+        df = df.sort_values(["num_serie", "num_valeur"])
+        dict_tableau = {"valeur": df["valeur"].to_numpy(dtype=float),
+                        "t": df["t"].to_numpy(dtype=float),
+                        "num_serie": df["num_serie"].to_numpy(dtype=np.int64),
+                        "num_valeur": df["num_valeur"].to_numpy(dtype=np.int64),
+                        "nb_valeurs": df_serie["nb_valeurs"].to_numpy(dtype=np.int64)}
+        del df
+
+        # Blocs de chroniques et lignes de leurs valeurs
+        list_bloc = [(debut, fin,
+                      int(np.searchsorted(dict_tableau["num_serie"], debut, side='left')),
+                      int(np.searchsorted(dict_tableau["num_serie"], fin, side='left')))
+                     for debut, fin in self.decouper_blocs(dict_tableau["nb_valeurs"])]
+
+        dict_resultat = {champ: np.empty(len(df_serie)) for champ in list_champ_resultat}
+        for debut, dict_bloc in self.calculer_blocs(dict_tableau, list_bloc, fonction_progression, fonction_interruption):
+            fin = debut + len(dict_bloc["S"])
+            for champ in list_champ_resultat:
+                dict_resultat[champ][debut:fin] = dict_bloc[champ]
+
+        for champ in list_champ_resultat:
+            df_serie[champ] = dict_resultat[champ]
+        df_serie["S"] = df_serie["S"].astype(np.int64)
+        df_serie["tendance"] = np.where(df_serie["p_value"] >= self.seuil_significativite, self.absence,
+                                        np.where(df_serie["S"] > 0, self.hausse, self.baisse))
+        df_serie["date_debut"] = df_serie["date_debut"].dt.strftime("%Y-%m-%d")
+        df_serie["date_fin"] = df_serie["date_fin"].dt.strftime("%Y-%m-%d")
+        df_serie = df_serie.drop(columns=["num_serie"]).sort_values(list_champ_cle)
+        return df_serie.reset_index(drop=True)
+
+    def calculer_blocs(self, dict_tableau, list_bloc, fonction_progression=None, fonction_interruption=None):
+        """
+        Générateur des résultats des blocs de chroniques, calculés par un pool de processus s'il y a plusieurs
+        processus et plusieurs blocs (et si l'interpréteur python est trouvé), dans le processus courant sinon.
+        Les résultats sont renvoyés dans l'ordre de fin des calculs.
+        :param dict_tableau: (dict) tableaux des valeurs classées par chronique (voir construire_bloc)
+        :param list_bloc: (list) tuples (première chronique, chronique suivante, première ligne, ligne suivante)
+        :param fonction_progression: fonction appelée avec le nombre de blocs calculés et le nombre total de blocs
+        :param fonction_interruption: fonction sans paramètre qui renvoie True si l'interruption du calcul est demandée
+        :return: itérateur de tuples (numéro de la première chronique du bloc, dict des résultats du bloc)
+        """
+        def controler(nb_bloc_calcule):
+            if (fonction_interruption is not None) and fonction_interruption():
+                raise ErreurInterruptionCalcul
+            if fonction_progression is not None:
+                fonction_progression(nb_bloc_calcule, len(list_bloc))
+
+        executable_python = trouver_executable_python()
+        if (self.nb_processus <= 1) or (len(list_bloc) <= 1) or (executable_python is None):
+            for num_bloc, (debut, fin, ligne_debut, ligne_fin) in enumerate(list_bloc):
+                controler(num_bloc)
+                array_x, array_t = self.construire_bloc(dict_tableau, debut, fin, ligne_debut, ligne_fin)
+                yield debut, self.calculer_bloc(array_x, array_t, dict_tableau["nb_valeurs"][debut:fin])
+            controler(len(list_bloc))
+            return
+
+        # Tableaux partagés en lecture seule avec les processus de calcul (fichiers numpy lus en memmap)
+        dossier_tableau = tempfile.mkdtemp(prefix="pickeau_tendance_")
+        try:
+            for nom in list_nom_tableau:
+                np.save(os.path.join(dossier_tableau, nom + ".npy"), dict_tableau[nom])
+            # Processus démarrés par "spawn" (seule méthode sûre depuis Qgis) avec l'interpréteur python,
+            # qui importent le module pick_tendance depuis le dossier du plugin (sans importer le plugin)
+            contexte = multiprocessing.get_context("spawn")
+            contexte.set_executable(executable_python)
+            module = charger_module_processus()
+            with ProcessPoolExecutor(max_workers=min(self.nb_processus, len(list_bloc)), mp_context=contexte,
+                                     initializer=site.addsitedir,
+                                     initargs=(os.path.dirname(os.path.abspath(__file__)),)) as executeur:
+                list_future = [executeur.submit(module.calculer_bloc_processus, self.dict_config_tendance, dossier_tableau,
+                                                debut, fin, ligne_debut, ligne_fin)
+                               for debut, fin, ligne_debut, ligne_fin in list_bloc]
+                try:
+                    for num_bloc, future in enumerate(as_completed(list_future)):
+                        controler(num_bloc)
+                        yield future.result()
+                    controler(len(list_bloc))
+                except BaseException:
+                    for future in list_future:
+                        future.cancel()
+                    raise
+        finally:
+            shutil.rmtree(dossier_tableau, ignore_errors=True)
+
+
+if __name__ == '__main__':
+
+    import time
+
+    print("")
+    print("---------------------------------------------------------------")
+    print("  Test de la classe Pick_Trend du module pick_tendance")
+    print("---------------------------------------------------------------")
+    print("")
+
+    dict_config = {"pas_agregation": "mensuel", "nb_min_valeurs": 10, "seuil_significativite": 0.05,
+                   "correction_autocorrelation": True, "taille_max_bloc": 20000000, "nb_processus": 0}
+    ptrend = Pick_Trend(dict_config)
+    # 2000 chroniques journalières de 10 ans : tendance à la hausse pour les codes pairs
+    generateur = np.random.default_rng(0)
+    array_date = pd.date_range("2010-01-01", "2019-12-31", freq="D")
+    list_df = []
+    for num_station in range(2000):
+        array_valeur = generateur.normal(0, 1, len(array_date)) + (num_station % 2 == 0) * np.arange(len(array_date)) / 3652
+        list_df.append(pd.DataFrame({"code_bss": f"BSS{num_station:05d}", "date_mesure": array_date.strftime("%Y-%m-%d"),
+                                     "niveau_nappe_eau": array_valeur}))
+    df_test = pd.concat(list_df, ignore_index=True)
+    debut = time.time()
+    df_tendance = ptrend.calculer(df_test, ["code_bss"], "date_mesure", "niveau_nappe_eau",
+                                  fonction_progression=lambda nb_bloc_calcule, nb_bloc: print(f"Blocs calculés : {nb_bloc_calcule}/{nb_bloc}"))
+    print("Chroniques : ", len(df_tendance), " - lignes : ", len(df_test), " - processus : ", ptrend.nb_processus,
+          " - durée (s) : ", round(time.time() - debut, 1))
+    # Même calcul dans le processus courant : résultats identiques
+    df_sequentiel = Pick_Trend(dict(dict_config, nb_processus=1)).calculer(df_test, ["code_bss"], "date_mesure", "niveau_nappe_eau")
+    print("Résultats identiques en un seul processus : ", df_sequentiel.equals(df_tendance))
+    print(df_tendance.groupby(df_tendance["code_bss"].str[-1].astype(int) % 2)["tendance"].value_counts())
+    print(df_tendance.head())
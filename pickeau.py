@@ -296,7 +296,7 @@ class PickEau:
                                         self.preq)
 
         # Instancie les commentaires
-        Commentaires(self.mainDockwidget, self.iface)
+        Commentaires(self.mainDockwidget, self.iface, self.preq)
 
         #     __________________________________________________________________________________________________________
 
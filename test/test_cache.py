@@ -0,0 +1,140 @@
+# coding=utf-8
+"""Tests du cache disque des réponses http (module pick_cache)."""
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+import requests
+
+from pick_cache import Pick_Cache
+
+
+def creer_reponse(statut, contenu=b"", entetes=None):
+    """Réponse http reçue du serveur (contenu déjà lu)."""
+    reponse = requests.models.Response()
+    reponse.status_code = statut
+    reponse._content = contenu
+    reponse.headers.update(entetes or {})
+    return reponse
+
+
+class Serveur():
+    """Serveur de test : renvoie les réponses prévues et conserve les en-têtes des requêtes reçues."""
+
+    def __init__(self, list_reponse):
+        self.list_reponse = list(list_reponse)
+        self.list_entete = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.list_entete.append(dict(headers or {}))
+        return self.list_reponse.pop(0)
+
+
+class TestPickCache(unittest.TestCase):
+    """Test de la durée de vie, de la revalidation et de l'éviction des réponses en cache."""
+
+    url = "https://hubeau.eaufrance.fr/api/v1/niveaux_nappes/stations.csv?size=10&srid=4326"
+
+    def setUp(self):
+        self.dossier_cache = tempfile.mkdtemp()
+        self.pcache = Pick_Cache(self.dossier_cache, 1, {"stations": 3600, "expire": 0})
+
+    def tearDown(self):
+        shutil.rmtree(self.dossier_cache, ignore_errors=True)
+
+    def test_normalisation_url(self):
+        """Deux urls équivalentes ont la même clé."""
+        self.assertEqual(self.pcache.calculer_cle(self.url),
+                         self.pcache.calculer_cle("HTTPS://Hubeau.eaufrance.fr/api/v1/niveaux_nappes/stations.csv?srid=4326&size=10"))
+
+    def test_reponse_non_expiree(self):
+        """Une réponse en cache non expirée est renvoyée sans requête au serveur."""
+        serveur = Serveur([creer_reponse(200, b"code_bss;x\n", {"ETag": '"v1"'})])
+        self.pcache.envoyer_requete(serveur.get, self.url, "stations")
+        reponse = self.pcache.envoyer_requete(serveur.get, self.url, "stations")
+        self.assertEqual(len(serveur.list_entete), 1)
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse.content, b"code_bss;x\n")
+
+    def test_revalidation_304(self):
+        """Une réponse expirée est revalidée : le contenu en cache est renvoyé si le serveur répond 304."""
+        serveur = Serveur([creer_reponse(200, b"v1", {"ETag": '"v1"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"}),
+                           creer_reponse(304)])
+        self.pcache.envoyer_requete(serveur.get, self.url, "expire")
+        cle = self.pcache.calculer_cle(self.url)
+        date_enregistrement = self.pcache.lire_meta(cle)["date_enregistrement"]
+        time.sleep(0.01)
+        reponse = self.pcache.envoyer_requete(serveur.get, self.url, "expire")
+        self.assertEqual(serveur.list_entete[1]["If-None-Match"], '"v1"')
+        self.assertEqual(serveur.list_entete[1]["If-Modified-Since"], "Mon, 01 Jan 2024 00:00:00 GMT")
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse.content, b"v1")
+        # La date d'enregistrement est renouvelée
+        self.assertGreater(self.pcache.lire_meta(cle)["date_enregistrement"], date_enregistrement)
+
+    def test_revalidation_modifiee(self):
+        """Une réponse expirée et modifiée sur le serveur est remplacée."""
+        serveur = Serveur([creer_reponse(200, b"v1", {"ETag": '"v1"'}), creer_reponse(200, b"v2", {"ETag": '"v2"'})])
+        self.pcache.envoyer_requete(serveur.get, self.url, "expire")
+        self.assertEqual(self.pcache.envoyer_requete(serveur.get, self.url, "expire").content, b"v2")
+        self.assertEqual(self.pcache.lire_meta(self.pcache.calculer_cle(self.url))["entetes"]["ETag"], '"v2"')
+
+    def test_page_partielle(self):
+        """Une page partielle (206) est conservée avec son statut et son lien vers la page suivante."""
+        lien = '<https://hubeau.eaufrance.fr/api/v1/niveaux_nappes/stations.csv?page=2&size=10>; rel="next"'
+        serveur = Serveur([creer_reponse(206, b"page1", {"Link": lien})])
+        self.pcache.envoyer_requete(serveur.get, self.url, "stations")
+        reponse = self.pcache.envoyer_requete(serveur.get, self.url, "stations")
+        self.assertEqual(reponse.status_code, 206)
+        self.assertEqual(reponse.links["next"]["url"],
+                         "https://hubeau.eaufrance.fr/api/v1/niveaux_nappes/stations.csv?page=2&size=10")
+
+    def test_erreur_non_conservee(self):
+        """Les réponses en erreur ne sont pas conservées."""
+        serveur = Serveur([creer_reponse(500), creer_reponse(200, b"ok")])
+        self.assertEqual(self.pcache.envoyer_requete(serveur.get, self.url, "stations").status_code, 500)
+        self.assertEqual(self.pcache.envoyer_requete(serveur.get, self.url, "stations").content, b"ok")
+
+    def test_ignorer(self):
+        """Le cache ignoré renvoie la réponse du serveur, enregistrée pour les téléchargements suivants."""
+        serveur = Serveur([creer_reponse(200, b"v1"), creer_reponse(200, b"v2")])
+        self.pcache.envoyer_requete(serveur.get, self.url, "stations")
+        self.pcache.ignorer = True
+        self.assertEqual(self.pcache.envoyer_requete(serveur.get, self.url, "stations").content, b"v2")
+        self.pcache.ignorer = False
+        self.assertEqual(self.pcache.envoyer_requete(serveur.get, self.url, "stations").content, b"v2")
+
+    def test_eviction_lru(self):
+        """Au-delà de la taille maximum, les réponses les moins récemment utilisées sont supprimées."""
+        list_url = [self.url + "&page=" + str(num_page) for num_page in range(3)]
+        list_cle = [self.pcache.calculer_cle(url) for url in list_url]
+        contenu = b"x" * 400 * 1024
+        serveur = Serveur([creer_reponse(200, contenu) for i in range(4)])
+        self.pcache.envoyer_requete(serveur.get, list_url[0], "stations")
+        self.pcache.envoyer_requete(serveur.get, list_url[1], "stations")
+        # Dates d'utilisation : page 0 puis page 1, puis nouvelle lecture de la page 0
+        maintenant = time.time()
+        for cle, age in zip(list_cle[:2], [200, 100]):
+            os.utime(os.path.join(self.dossier_cache, cle + ".bin"), (maintenant - age, maintenant - age))
+        self.pcache.envoyer_requete(serveur.get, list_url[0], "stations")
+        # La troisième réponse dépasse 1 Mo : la page 1 est la moins récemment utilisée
+        self.pcache.envoyer_requete(serveur.get, list_url[2], "stations")
+        self.assertIsNotNone(self.pcache.lire_meta(list_cle[0]))
+        self.assertIsNone(self.pcache.lire_meta(list_cle[1]))
+        self.assertIsNotNone(self.pcache.lire_meta(list_cle[2]))
+        self.assertFalse(os.path.exists(os.path.join(self.dossier_cache, list_cle[1] + ".json")))
+        self.assertEqual(len(serveur.list_entete), 3)
+
+    def test_vider(self):
+        """Le vidage supprime toutes les réponses."""
+        serveur = Serveur([creer_reponse(200, b"v1")])
+        self.pcache.envoyer_requete(serveur.get, self.url, "stations")
+        self.pcache.vider()
+        self.assertEqual(os.listdir(self.dossier_cache), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
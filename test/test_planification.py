@@ -0,0 +1,127 @@
+# coding=utf-8
+"""Tests de la planification des requêtes Hubeau multi-stations (module pick_planification)."""
+
+import unittest
+
+import pandas as pd
+
+from pick_planification import Pick_Plan
+
+
+class Requete():
+    """Construction des urls de test (même forme que Pick_Req.construire_requete_hubeau_par_point)."""
+
+    def construire_requete_hubeau_par_point(self, code_point, list_code_groupe, list_code_parametre, type_requete,
+                                            date_debut=''):
+        requete = ("https://hubeau.eaufrance.fr/api/v1/qualite_nappes/analyses.csv?size=20000"
+                   + "&bss_id=" + '%2C'.join(code_point)
+                   + "&code_groupe_parametre=" + '%2C'.join(list_code_groupe)
+                   + "&code_param=" + '%2C'.join(list_code_parametre))
+        if date_debut != '':
+            requete += "&date_debut_prelevement=" + date_debut
+        return requete
+
+
+class Outils():
+    """Configuration de test (section "telechargement")."""
+
+    def __init__(self, longueur_max_url):
+        self.longueur_max_url = longueur_max_url
+
+    def lire_fichier_config(self):
+        return {"telechargement": {"longueur_max_url": self.longueur_max_url, "nb_max_codes_requete": 200}}
+
+
+def creer_codes(nb_code):
+    """Codes bss de 14 caractères."""
+    return [f"0{1000 + i}X0001/P" for i in range(nb_code)]
+
+
+class TestPickPlan(unittest.TestCase):
+    """Test du regroupement des stations et du découpage des listes de codes."""
+
+    def setUp(self):
+        self.preq = Requete()
+        self.pplan = Pick_Plan(self.preq, Outils(100000))
+
+    def test_lots_200_codes(self):
+        """Sans contrainte de longueur d'url, les lots comptent 200 stations au plus."""
+        list_code = creer_codes(450)
+        list_lot = self.pplan.grouper_stations(list_code, [], ["1340"], "analyses_qualite_csv")
+        self.assertEqual([len(lot) for lot in list_lot], [200, 200, 50])
+        self.assertEqual(sum(list_lot, []), list_code)
+
+    def test_lots_longueur_url(self):
+        """Les urls des lots ne dépassent pas la longueur maximum."""
+        pplan = Pick_Plan(self.preq, Outils(1000))
+        list_code = creer_codes(300)
+        list_lot = pplan.grouper_stations(list_code, ["49"], [], "analyses_qualite_csv", "2020-01-01")
+        self.assertEqual(sum(list_lot, []), list_code)
+        for lot in list_lot:
+            url = self.preq.construire_requete_hubeau_par_point(lot, ["49"], [], "analyses_qualite_csv", "2020-01-01")
+            self.assertLessEqual(len(url), 1000)
+        # Lots pleins sauf le dernier
+        self.assertEqual(len(set(len(lot) for lot in list_lot[:-1])), 1)
+        self.assertGreater(len(list_lot[0]), 1)
+
+    def test_decoupage_codes(self):
+        """Les listes de codes sont dédoublonnées, triées et découpées en lots de 200 codes."""
+        list_code = [str(i) for i in range(1000, 1450)] + ["1000"]
+        list_lot = self.pplan.decouper_liste_code(list_code)
+        self.assertEqual([len(lot) for lot in list_lot], [200, 200, 50])
+        self.assertEqual(sum(list_lot, []), sorted(set(list_code)))
+
+    def test_planification_incrementale(self):
+        """Les stations déjà téléchargées sont regroupées à part et demandées à partir de leur plus ancienne date."""
+        list_code = creer_codes(5)
+        dict_date_debut = {list_code[1]: "2021-05-01", list_code[3]: "2019-02-01"}
+        list_args = self.pplan.planifier_requetes_par_point(list_code, [([], ["1340"])], "analyses_qualite_csv",
+                                                            dict_date_debut)
+        self.assertEqual(list_args, [([list_code[0], list_code[2], list_code[4]], [], ["1340"], "analyses_qualite_csv", ''),
+                                     ([list_code[3], list_code[1]], [], ["1340"], "analyses_qualite_csv", "2019-02-01")])
+
+    def test_strategie_qualite(self):
+        """La stratégie qui envoie le moins de requêtes est retenue."""
+        list_code = creer_codes(10)
+        # Un groupe de 3 paramètres et un paramètre isolé : 1 requête par paramètre contre 2 par groupe
+        list_args = self.pplan.planifier_requetes_qualite(list_code, ["49"], ["1301"], ["1340", "1335", "1337"])
+        self.assertEqual(list_args, [(list_code, [], ["1301", "1335", "1337", "1340"], "analyses_qualite_csv", '')])
+        # Paramètres du groupe inconnus : requêtes par groupe
+        list_args = self.pplan.planifier_requetes_qualite(list_code, ["49"], ["1301"], [])
+        self.assertEqual(len(list_args), 2)
+
+
+
+class TestPickPlanIncremental(unittest.TestCase):
+    """Test de l'élimination des données déjà téléchargées d'un téléchargement incrémental."""
+
+    list_champ_comparaison = ["code_bss", "date_mesure", "niveau_nappe_eau"]
+
+    def setUp(self):
+        self.dict_date_debut = {"A": "2020-05-01", "B": "2021-01-10"}
+        # Mesures du dernier jour déjà enregistrées (dates lues par OGR au format aaaa/mm/jj)
+        self.df_existant = pd.DataFrame({"code_bss": ["A", "B"],
+                                         "date_mesure": ["2020/05/01", "2021/01/10"],
+                                         "niveau_nappe_eau": [12.3, 4.0]})
+
+    def test_dernier_jour(self):
+        """Les mesures du dernier jour sont conservées si elles ne sont pas déjà enregistrées."""
+        df_data = pd.DataFrame({"code_bss": ["A", "A", "A", "A", "B", "B", "C"],
+                                "date_mesure": ["2020-04-30", "2020-05-01", "2020-05-01", "2020-05-02",
+                                                "2021-01-10", "2021-01-11", "2019-01-01"],
+                                "niveau_nappe_eau": [12.0, 12.3, 12.5, 12.6, 4.0, 4.1, 7.0]})
+        df_nouveau = Pick_Plan.filtrer_donnees_nouvelles(df_data, self.dict_date_debut, "date_mesure",
+                                                         self.df_existant, self.list_champ_comparaison)
+        # Mesure antérieure et mesures déjà enregistrées éliminées, station sans date conservée entièrement
+        self.assertEqual(df_nouveau.index.tolist(), [2, 3, 5, 6])
+
+    def test_telechargement_complet(self):
+        """Sans date de début, toutes les données sont conservées."""
+        df_data = pd.DataFrame({"code_bss": ["A"], "date_mesure": ["2020-01-01"], "niveau_nappe_eau": [1.0]})
+        df_nouveau = Pick_Plan.filtrer_donnees_nouvelles(df_data, {}, "date_mesure", self.df_existant,
+                                                         self.list_champ_comparaison)
+        self.assertEqual(len(df_nouveau), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+# coding=utf-8
+"""Tests de la politique d'envoi des requêtes (module pick_politique)."""
+
+import time
+import unittest
+
+import requests
+
+from pick_politique import Pick_Policy
+
+
+def creer_politique(debit=1000, capacite_rafale=100, delai_initial=0, delai_max=0):
+    """Politique d'envoi de test (sans attente par défaut)."""
+    return Pick_Policy({"nb_requetes_par_seconde": {"hubeau.eaufrance.fr": debit, "defaut": 1000},
+                        "capacite_rafale": capacite_rafale,
+                        "nb_max_tentatives": 3,
+                        "delai_initial": delai_initial,
+                        "delai_max": delai_max})
+
+
+def creer_reponse(statut, entetes=None):
+    """Réponse http sans flux, comme une réponse reconstituée depuis le cache."""
+    reponse = requests.models.Response()
+    reponse.status_code = statut
+    reponse.headers.update(entetes or {})
+    return reponse
+
+
+class TestPickPolicySeau(unittest.TestCase):
+    """Test de la limitation de débit par seau à jetons."""
+
+    def test_rafale_puis_debit(self):
+        """Les jetons du seau sont servis en rafale, les suivants au débit du serveur."""
+        ppolicy = creer_politique(debit=20, capacite_rafale=5)
+        debut = time.monotonic()
+        for i in range(5):
+            ppolicy.attendre_jeton("hubeau.eaufrance.fr")
+        self.assertLess(time.monotonic() - debut, 0.1)
+        for i in range(10):
+            ppolicy.attendre_jeton("hubeau.eaufrance.fr")
+        # 10 jetons supplémentaires à 20 jetons par seconde
+        self.assertGreaterEqual(time.monotonic() - debut, 0.45)
+
+    def test_seau_par_serveur(self):
+        """Chaque serveur a son propre seau."""
+        ppolicy = creer_politique(debit=1, capacite_rafale=2)
+        ppolicy.attendre_jeton("hubeau.eaufrance.fr")
+        ppolicy.attendre_jeton("hubeau.eaufrance.fr")
+        debut = time.monotonic()
+        ppolicy.attendre_jeton("api.sandre.eaufrance.fr")
+        self.assertLess(time.monotonic() - debut, 0.1)
+        self.assertLess(ppolicy.dict_seau["hubeau.eaufrance.fr"][0], 1)
+        self.assertGreaterEqual(ppolicy.dict_seau["api.sandre.eaufrance.fr"][0], 1)
+
+
+class TestPickPolicyDelai(unittest.TestCase):
+    """Test du calcul de l'attente avant renvoi."""
+
+    def setUp(self):
+        self.ppolicy = creer_politique(delai_initial=1, delai_max=10)
+
+    def test_retry_after(self):
+        """L'attente demandée par le serveur est respectée, dans la limite du délai maximum."""
+        self.assertEqual(self.ppolicy.calculer_delai_attente(0, creer_reponse(429, {"Retry-After": "3"})), 3)
+        self.assertEqual(self.ppolicy.calculer_delai_attente(0, creer_reponse(503, {"Retry-After": "120"})), 10)
+
+    def test_retry_after_date(self):
+        """Un en-tête Retry-After non numérique (date http) donne l'attente exponentielle."""
+        reponse = creer_reponse(503, {"Retry-After": "Wed, 21 Oct 2026 07:28:00 GMT"})
+        self.assertTrue(1 <= self.ppolicy.calculer_delai_attente(1, reponse) <= 2)
+
+    def test_attente_exponentielle(self):
+        """L'attente double à chaque tentative, tirée entre la moitié et la totalité, et bornée."""
+        for num_tentative, delai in [(0, 1), (1, 2), (2, 4), (3, 8), (4, 10), (10, 10)]:
+            for i in range(20):
+                attente = self.ppolicy.calculer_delai_attente(num_tentative)
+                self.assertTrue(delai / 2 <= attente <= delai)
+
+
+class TestPickPolicyRenvois(unittest.TestCase):
+    """Test des renvois des requêtes en échec temporaire."""
+
+    def setUp(self):
+        self.ppolicy = creer_politique()
+
+    def test_renvoi_reponses_sans_flux(self):
+        """Les réponses en échec sans flux (raw = None) sont renvoyées sans erreur."""
+        list_statut = [503, 503, 200]
+
+        def requete(methode, url, **kwargs):
+            return creer_reponse(list_statut.pop(0))
+
+        reponse = self.ppolicy.envoyer(requete, "GET", "https://hubeau.eaufrance.fr")
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(list_statut, [])
+
+    def test_derniere_reponse_en_echec(self):
+        """Après le nombre maximum de tentatives, la dernière réponse en échec est renvoyée."""
+        list_statut = [503, 429, 502, 200]
+
+        def requete(methode, url, **kwargs):
+            return creer_reponse(list_statut.pop(0))
+
+        reponse = self.ppolicy.envoyer(requete, "GET", "https://hubeau.eaufrance.fr")
+        self.assertEqual(reponse.status_code, 502)
+        self.assertEqual(list_statut, [200])
+
+    def test_erreur_client_non_renvoyee(self):
+        """Les erreurs définitives (4xx sauf 429) ne sont pas renvoyées."""
+        list_statut = [404, 200]
+
+        def requete(methode, url, **kwargs):
+            return creer_reponse(list_statut.pop(0))
+
+        self.assertEqual(self.ppolicy.envoyer(requete, "GET", "https://hubeau.eaufrance.fr").status_code, 404)
+
+    def test_post_envoye_une_fois(self):
+        """Les requêtes POST ne sont pas renvoyées."""
+        list_statut = [503, 200]
+
+        def requete(methode, url, **kwargs):
+            return creer_reponse(list_statut.pop(0))
+
+        self.assertEqual(self.ppolicy.envoyer(requete, "POST", "https://hubeau.eaufrance.fr").status_code, 503)
+
+    def test_erreur_connexion(self):
+        """Les erreurs de connexion sont renvoyées, celle de la dernière tentative est remontée."""
+        list_nb_appel = []
+
+        def requete(methode, url, **kwargs):
+            list_nb_appel.append(1)
+            raise requests.ConnectionError("connexion perdue")
+
+        with self.assertRaises(requests.ConnectionError):
+            self.ppolicy.envoyer(requete, "GET", "https://hubeau.eaufrance.fr")
+        self.assertEqual(len(list_nb_appel), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
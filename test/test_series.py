@@ -0,0 +1,137 @@
+# coding=utf-8
+"""Tests des chroniques en mémoire (module pick_series) : les filtres de Pick_Store donnent les mêmes lignes
+que l'expression de filtre exécutée en sql par OGR / sqlite sur la table du GeoPackage."""
+
+import sqlite3
+import unittest
+
+import numpy as np
+
+from pick_series import Pick_Store
+
+try:
+    from pick_page_graphique import Pick_Pg_Graph
+except ImportError:
+    Pick_Pg_Graph = None
+
+
+# Table des analyses : champs et types sql des colonnes du GeoPackage
+LIST_CHAMP = [("code_bss", "TEXT"), ("code_param", "INTEGER"), ("date_debut_prelevement", "TEXT"),
+              ("code_qualification", "INTEGER"), ("resultat", "REAL"), ("commentaire", "TEXT")]
+
+LIST_LIGNE = [
+    ("07548X0009/F", 1340, "2019-03-12", 1, 12.5, None),
+    ("07548X0009/F", 1340, "2020-06-01", 1, 14.0, "Correct"),
+    ("07548X0009/F", 1340, "2021-01-15", 2, 30.0, "Aberrant"),
+    ("07548X0009/F", 1301, "2020-06-01", 1, 11.2, None),
+    ("07548X0009/F", 1340, "2022-02-20", 1, None, None),
+    ("08034X0012/P", 1340, "2018-11-30", 3, 8.0, "correct"),
+    ("08034X0012/P", 1340, "2020-06-01T10:30:00", 1, 9.5, "Douteux"),
+    ("08034X0012/P", 1335, "2020-07-01", 4, 0.05, None),
+    ("09123X0456/S", 1340, "2020-01-01", None, 3.0, "Correct"),
+]
+
+# Conditions des filtres du tracé des graphiques (voir Pick_Pg_Graph.construire_filtre_donnee)
+LIST_FILTRE = [
+    [("code_bss", "IN", ["07548X0009/F", "08034X0012/P"]), ("code_param", "=", 1340)],
+    [("code_bss", "IN", ["07548X0009/F", "08034X0012/P", "09123X0456/S"]), ("code_param", "=", 1340),
+     ("date_debut_prelevement", ">=", "2019-01-01"), ("date_debut_prelevement", "<=", "2020-12-31"),
+     ("resultat", "NOT NULL", None)],
+    [("code_bss", "IN", ["07548X0009/F", "08034X0012/P", "09123X0456/S"]), ("code_param", "=", 1340),
+     ("code_qualification", "=", 1)],
+    [("code_bss", "IN", ["07548X0009/F", "08034X0012/P", "09123X0456/S"]), ("code_param", "=", 1340),
+     ("code_qualification", "<>", 2), ("resultat", "NOT NULL", None)],
+    [("code_bss", "IN", ["07548X0009/F", "08034X0012/P"]), ("code_param", "=", 1340),
+     ("commentaire", "LIKE", "Correct")],
+    [("code_bss", "IN", ["07548X0009/F", "08034X0012/P", "09123X0456/S"]), ("code_param", "=", 1340),
+     ("commentaire", "NOT LIKE", "Aberrant")],
+    [("code_bss", "IN", ["08034X0012/P"]), ("date_debut_prelevement", ">=", "2020-06-01")],
+    [("code_param", "=", 1335)],
+    [("code_bss", "IN", ["INCONNU"]), ("code_param", "=", 1340)],
+]
+
+
+def construire_sql(list_condition):
+    """Traduction de référence des conditions en clause where sql paramétrée."""
+    list_expr = []
+    list_parametre = []
+    for champ, operateur, valeur in list_condition:
+        if operateur == "IN":
+            list_expr.append(f'("{champ}" IN ({", ".join("?" for v in valeur)}))')
+            list_parametre += list(valeur)
+        elif operateur == "NOT NULL":
+            list_expr.append(f'("{champ}" IS NOT NULL)')
+        else:
+            list_expr.append(f'("{champ}" {operateur} ?)')
+            list_parametre.append(valeur)
+    return " AND ".join(list_expr), list_parametre
+
+
+class TestPickStoreFiltre(unittest.TestCase):
+    """Comparaison des lignes filtrées en mémoire avec les lignes sélectionnées par sqlite."""
+
+    list_champ = LIST_CHAMP
+    list_ligne = LIST_LIGNE
+    list_filtre = LIST_FILTRE
+
+    def setUp(self):
+        self.connexion = sqlite3.connect(":memory:")
+        self.connexion.execute("CREATE TABLE analyses (fid INTEGER PRIMARY KEY, "
+                               + ", ".join(f'"{champ}" {type_sql}' for champ, type_sql in self.list_champ) + ")")
+        self.connexion.executemany("INSERT INTO analyses VALUES (?, " + ", ".join("?" for c in self.list_champ) + ")",
+                                   [(num_ligne + 1,) + ligne for num_ligne, ligne in enumerate(self.list_ligne)])
+        # Colonnes lues depuis la couche : tableaux d'objets, valeurs nulles à None
+        dict_colonne = {"id": np.arange(1, len(self.list_ligne) + 1)}
+        for num_champ, (champ, type_sql) in enumerate(self.list_champ):
+            dict_colonne[champ] = np.array([ligne[num_champ] for ligne in self.list_ligne], dtype=object)
+        self.pstore = Pick_Store()
+        self.pstore.charger("analyses", dict_colonne, ["code_bss", "code_param"])
+
+    def tearDown(self):
+        self.connexion.close()
+
+    def lire_id_sql(self, expression, list_parametre=()):
+        requete = "SELECT fid FROM analyses" + (" WHERE " + expression if expression else "")
+        return sorted(ligne[0] for ligne in self.connexion.execute(requete, list_parametre))
+
+    def lire_id_store(self, list_condition):
+        return sorted(self.pstore.filtrer("analyses", list_condition, ["resultat"])["id"].tolist())
+
+    def test_filtres_reference_sql(self):
+        for list_condition in self.list_filtre:
+            with self.subTest(list_condition=list_condition):
+                self.assertEqual(self.lire_id_store(list_condition), self.lire_id_sql(*construire_sql(list_condition)))
+
+    def test_ordre_des_lignes(self):
+        """Les lignes d'une chronique sont renvoyées dans l'ordre de la table."""
+        dict_valeur = self.pstore.filtrer("analyses", self.list_filtre[0], ["date_debut_prelevement"])
+        self.assertEqual(dict_valeur["id"].tolist(), [1, 2, 3, 5, 6, 7])
+
+    @unittest.skipIf(Pick_Pg_Graph is None, "Qgis non disponible")
+    def test_filtres_expression_qgis(self):
+        """L'expression de filtre de la couche sélectionne les mêmes lignes que Pick_Store."""
+        for list_condition in self.list_filtre:
+            with self.subTest(list_condition=list_condition):
+                self.assertEqual(self.lire_id_store(list_condition),
+                                 self.lire_id_sql(Pick_Pg_Graph.construire_expression(list_condition)))
+
+
+class TestPickStoreFiltreCodesTexte(TestPickStoreFiltre):
+    """Même comparaison lorsque les codes paramètre sont enregistrés en texte (codes encodés en catégories,
+    voir pick_normalisation.Pick_Norm.encoder_colonne) : la valeur du filtre est alors un texte."""
+
+    list_champ = [(champ, "TEXT" if champ == "code_param" else type_sql) for champ, type_sql in LIST_CHAMP]
+    list_ligne = [(ligne[0], {1340: "1340", 1301: "01301", 1335: "1335A"}[ligne[1]]) + ligne[2:] for ligne in LIST_LIGNE]
+    list_filtre = [[("code_param", "=", "1340") if condition[0] == "code_param" else condition for condition in list_condition]
+                   for list_condition in LIST_FILTRE] \
+                  + [[("code_bss", "IN", ["07548X0009/F"]), ("code_param", "=", "01301")],
+                     [("code_param", "=", "1335A")]]
+
+    def test_code_sans_zero_initial(self):
+        """Le code "01301" n'est pas confondu avec le nombre 1301."""
+        self.assertEqual(self.lire_id_store([("code_param", "=", "1301")]), [])
+        self.assertEqual(self.lire_id_store([("code_param", "=", "01301")]), [4])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+# coding=utf-8
+"""Tests du calcul local des statistiques descriptives piézométriques (module donnees.stats_descriptives_locales)."""
+
+import os
+import json
+import unittest
+
+import pandas as pd
+
+try:
+    from donnees.stats_descriptives_locales import StatsDescriptivesLocales
+except ImportError:
+    StatsDescriptivesLocales = None
+
+# Réponse enregistrée de la route stats_descriptives_piezo de Piceau et chroniques Hubeau des mêmes stations :
+#   - reponse.json : réponse de <url piceau>/stats_descriptives_piezo/[<codes bss>]/<date début>/<date fin>,
+#   - chroniques.csv : chroniques des mêmes stations (niveaux_nappes/chroniques.csv, champs code_bss, date_mesure
+#     et niveau_nappe_eau, séparateur ";"),
+#   - parametres.json : {"date_debut": "aaaa-mm-jj", "date_fin": "aaaa-mm-jj", "bss_id": {code bss: bss_id}}
+DOSSIER_REPONSE = os.path.join(os.path.dirname(__file__), "donnees", "stats_descriptives_piezo")
+
+
+@unittest.skipIf(StatsDescriptivesLocales is None, "Qgis non disponible")
+class TestStatsDescriptivesLocales(unittest.TestCase):
+    """Test des statistiques calculées sur des chroniques dont les statistiques se calculent à la main."""
+
+    def setUp(self):
+        self.df = pd.DataFrame({"code_bss": ["A"] * 5 + ["B"] * 2,
+                                "date_mesure": ["2019-12-31", "2020-01-10", "2020-01-20", "2020/02/05", "2021-01-15",
+                                                "2020-03-01", "2020-03-02"],
+                                "niveau_nappe_eau": [100.0, 10.0, 12.0, 14.0, 20.0, 5.0, 7.0]})
+        self.res = StatsDescriptivesLocales().calculerStatistiques(self.df, {"A": "BSS001", "B": "BSS002"},
+                                                                  "2020-01-01", "2021-12-31")
+
+    def test_structure(self):
+        self.assertEqual(sorted(self.res.keys()), ["BSS001", "BSS002"])
+        for station in self.res.values():
+            for nomTable in ["stat_pz_chronique", "stat_pz_par_annee", "stat_pz_par_mois", "chronique_stat_pz_pas_mensuel"]:
+                self.assertEqual(len(station[nomTable]), 1)
+
+    def test_valeurs(self):
+        station = self.res["BSS001"]
+        # Mesure de 2019 hors période
+        chronique = station["stat_pz_chronique"][0]
+        self.assertEqual(chronique["nb_mesures"], 4)
+        self.assertEqual((chronique["date_debut"], chronique["date_fin"]), ("2020-01-10", "2021-01-15"))
+        self.assertAlmostEqual(chronique["moyenne"], 14.0)
+        self.assertAlmostEqual(chronique["mediane"], 13.0)
+        self.assertEqual(sorted(station["stat_pz_par_annee"][0].keys()), ["2020", "2021"])
+        self.assertAlmostEqual(station["stat_pz_par_mois"][0]["01"]["moyenne"], 14.0)
+        self.assertEqual(station["chronique_stat_pz_pas_mensuel"][0]["2020-01"]["nb_mesures"], 2)
+        # Ecart type d'une seule mesure non défini
+        self.assertIsNone(station["chronique_stat_pz_pas_mensuel"][0]["2021-01"]["ecart_type"])
+
+
+@unittest.skipIf(StatsDescriptivesLocales is None, "Qgis non disponible")
+@unittest.skipUnless(os.path.isfile(os.path.join(DOSSIER_REPONSE, "reponse.json")),
+                     "Réponse enregistrée de la route stats_descriptives_piezo absente")
+class TestStatsDescriptivesLocalesReponse(unittest.TestCase):
+    """Comparaison du calcul local avec une réponse enregistrée de la route stats_descriptives_piezo :
+    mêmes stations, mêmes tables, mêmes périodes, mêmes noms de statistiques et mêmes valeurs."""
+
+    def setUp(self):
+        with open(os.path.join(DOSSIER_REPONSE, "reponse.json"), encoding="utf-8") as f:
+            self.reponse = json.load(f)
+        with open(os.path.join(DOSSIER_REPONSE, "parametres.json"), encoding="utf-8") as f:
+            parametres = json.load(f)
+        df = pd.read_csv(os.path.join(DOSSIER_REPONSE, "chroniques.csv"), sep=";", dtype={"code_bss": str})
+        self.res = StatsDescriptivesLocales().calculerStatistiques(df, parametres["bss_id"], parametres["date_debut"],
+                                                                  parametres["date_fin"])
+
+    def comparer_statistiques(self, stats_local, stats_reponse):
+        self.assertEqual(sorted(stats_local.keys()), sorted(stats_reponse.keys()))
+        for nom, valeur in stats_reponse.items():
+            if isinstance(valeur, (int, float)) and not isinstance(valeur, bool):
+                self.assertAlmostEqual(stats_local[nom], valeur, places=4, msg=nom)
+            else:
+                self.assertEqual(stats_local[nom], valeur, msg=nom)
+
+    def test_reponse(self):
+        self.assertEqual(sorted(self.res.keys()), sorted(self.reponse.keys()))
+        for bssId, station in self.reponse.items():
+            with self.subTest(bss_id=bssId):
+                stationLocale = self.res[bssId]
+                self.assertEqual(sorted(stationLocale.keys()), sorted(station.keys()))
+                self.comparer_statistiques(stationLocale["stat_pz_chronique"][0], station["stat_pz_chronique"][0])
+                for nomTable in ["stat_pz_par_annee", "stat_pz_par_mois", "chronique_stat_pz_pas_mensuel"]:
+                    dictPeriode = station[nomTable][0]
+                    self.assertEqual(sorted(stationLocale[nomTable][0].keys()), sorted(dictPeriode.keys()))
+                    for periode, stats in dictPeriode.items():
+                        self.comparer_statistiques(stationLocale[nomTable][0][periode], stats)
+
+
+if __name__ == "__main__":
+    unittest.main()
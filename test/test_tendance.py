@@ -0,0 +1,105 @@
+# coding=utf-8
+"""Tests du calcul des tendances (module pick_tendance) : test de Mann-Kendall et pente de Sen."""
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from pick_tendance import Pick_Trend
+
+try:
+    import pymannkendall
+except ImportError:
+    pymannkendall = None
+
+
+def creer_config(correction_autocorrelation=False, taille_max_bloc=20000000):
+    """Configuration de la tendance sur valeurs brutes, calcul dans le processus courant."""
+    return {"pas_agregation": "brut", "nb_min_valeurs": 3, "seuil_significativite": 0.05,
+            "correction_autocorrelation": correction_autocorrelation, "taille_max_bloc": taille_max_bloc,
+            "nb_processus": 1}
+
+
+def creer_chronique(code_bss, list_valeur, annee_debut=1980):
+    """Chronique annuelle (1er janvier : dates en années décimales entières)."""
+    return pd.DataFrame({"code_bss": code_bss,
+                         "date_mesure": [f"{annee_debut + i}-01-01" for i in range(len(list_valeur))],
+                         "niveau_nappe_eau": list_valeur})
+
+
+class TestPickTrendValeursConnues(unittest.TestCase):
+    """Test des résultats sur des chroniques dont le test de Mann-Kendall se calcule à la main."""
+
+    def setUp(self):
+        self.ptrend = Pick_Trend(creer_config())
+
+    def test_chronique_croissante(self):
+        df = creer_chronique("A", np.arange(1.0, 11.0))
+        resultat = self.ptrend.calculer(df, ["code_bss"], "date_mesure", "niveau_nappe_eau").iloc[0]
+        # S = n(n-1)/2, var(S) = n(n-1)(2n+5)/18, Z = (S-1)/racine(var(S))
+        self.assertEqual(resultat["S"], 45)
+        self.assertAlmostEqual(resultat["var_S"], 125.0)
+        self.assertAlmostEqual(resultat["Z"], 3.9354796403996297)
+        self.assertAlmostEqual(resultat["p_value"], 8.303070332644999e-05)
+        self.assertAlmostEqual(resultat["pente_sen"], 1.0)
+        self.assertAlmostEqual(resultat["origine_sen"], 1.0 - 1980)
+        self.assertEqual(resultat["tendance"], Pick_Trend.hausse)
+
+    def test_chronique_ex_aequo(self):
+        df = creer_chronique("A", [1.0, 1.0, 2.0, 3.0])
+        resultat = self.ptrend.calculer(df, ["code_bss"], "date_mesure", "niveau_nappe_eau").iloc[0]
+        # Un groupe de 2 ex-aequo : var(S) = (4.3.13 - 2.1.9) / 18
+        self.assertEqual(resultat["S"], 5)
+        self.assertAlmostEqual(resultat["var_S"], 7.666666666666667)
+        self.assertAlmostEqual(resultat["Z"], 1.4446302370292303)
+        self.assertAlmostEqual(resultat["p_value"], 0.1485617748918687)
+        # Médiane des pentes 0, 1/2, 2/3, 1, 1, 1
+        self.assertAlmostEqual(resultat["pente_sen"], (2 / 3 + 1) / 2)
+        self.assertEqual(resultat["tendance"], Pick_Trend.absence)
+
+    def test_chronique_trop_courte(self):
+        df = creer_chronique("A", [1.0, 2.0])
+        self.assertEqual(len(self.ptrend.calculer(df, ["code_bss"], "date_mesure", "niveau_nappe_eau")), 0)
+
+    def test_calcul_par_morceaux(self):
+        # Blocs dépassant la taille maximum : calcul par morceaux, résultats identiques
+        generateur = np.random.default_rng(0)
+        df = pd.concat([creer_chronique(f"S{i}", generateur.normal(0, 1, 30).cumsum()) for i in range(5)],
+                       ignore_index=True)
+        df_tableau = self.ptrend.calculer(df, ["code_bss"], "date_mesure", "niveau_nappe_eau")
+        df_morceaux = Pick_Trend(creer_config(taille_max_bloc=100)).calculer(df, ["code_bss"], "date_mesure",
+                                                                             "niveau_nappe_eau")
+        pd.testing.assert_frame_equal(df_tableau, df_morceaux)
+
+
+@unittest.skipIf(pymannkendall is None, "pymannkendall non installé")
+class TestPickTrendPymannkendall(unittest.TestCase):
+    """Comparaison avec les tests de la bibliothèque pymannkendall (dates annuelles : pente par pas de temps)."""
+
+    def setUp(self):
+        generateur = np.random.default_rng(1)
+        self.array_valeur = np.cumsum(generateur.normal(0.1, 1, 40))
+        # Ex-aequo
+        self.array_valeur[5] = self.array_valeur[6]
+        self.df = creer_chronique("A", self.array_valeur)
+
+    def comparer(self, resultat, resultat_mk):
+        self.assertEqual(resultat["S"], resultat_mk.s)
+        self.assertAlmostEqual(resultat["var_S"] / resultat_mk.var_s, 1.0, places=7)
+        self.assertAlmostEqual(resultat["Z"], resultat_mk.z, places=7)
+        self.assertAlmostEqual(resultat["p_value"], resultat_mk.p, places=7)
+        self.assertAlmostEqual(resultat["pente_sen"], resultat_mk.slope)
+
+    def test_test_original(self):
+        resultat = Pick_Trend(creer_config()).calculer(self.df, ["code_bss"], "date_mesure", "niveau_nappe_eau")
+        self.comparer(resultat.iloc[0], pymannkendall.original_test(self.array_valeur))
+
+    def test_correction_hamed_rao(self):
+        resultat = Pick_Trend(creer_config(correction_autocorrelation=True)).calculer(self.df, ["code_bss"],
+                                                                                     "date_mesure", "niveau_nappe_eau")
+        self.comparer(resultat.iloc[0], pymannkendall.hamed_rao_modification_test(self.array_valeur))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,6 @@
 import os
-from osgeo import ogr
+import pandas as pd
+from osgeo import ogr, osr
 from datetime import datetime
 from qgis.core import QgsProject, QgsVectorLayer, QgsVectorFileWriter, QgsLayerTreeGroup
 
@@ -72,17 +73,29 @@ class UtilitaireCouches():
                                  nom_fichier: str,
                                  epsg_origine="",
                                  epsg_destination="",
-                                 ajouter_couche=False):
+                                 ajouter_couche=False,
+                                 champ_x="",
+                                 champ_y=""):
         """
-        Ecrit une couche Qgis dans un geopackage existant ou à créer.
+        Ecrit une couche Qgis (ou un dataframe) dans un geopackage existant ou à créer.
         :param chemin_geopackage: (str) chemin du geopackage existant ou à créer
-        :param qgs_vector_layer: (QgsVectorLayer) objet couche vecteur à écrire dans le geopackage
+        :param qgs_vector_layer: (QgsVectorLayer | DataFrame) objet couche vecteur ou dataframe à écrire dans le geopackage
         :param layer_name: (str) nom de la couche vecteur à écrire dans le geopackage
         :param epsg_origine="": (str) code epsg d'origine de la couche vecteur au format du type "EPSG:2154"
         :param epsg_destination="": (str) code epsg de reprojection de la couche vecteur au format du type "EPSG:2154"
         :param ajouter_couche=False: (bool) indique s'il faut ajouter la couche à un geopackage existant (True) ou créer le geopackage (False)
+        :param champ_x="": (str) nom du champ de longitude du dataframe (couche de points uniquement)
+        :param champ_y="": (str) nom du champ de latitude du dataframe (couche de points uniquement)
         :return: None
         """
+        # Dataframe : écriture directe dans le geopackage, sans passer par une couche Qgis
+        if isinstance(qgs_vector_layer, pd.DataFrame):
+            UtilitaireCouches.ecrire_dataframe_geopackage(os.path.join(chemin_geopackage, nom_fichier), layer_name, qgs_vector_layer,
+                                                          champ_x, champ_y,
+                                                          epsg_origine if epsg_origine != "" else 4326,
+                                                          epsg_destination if epsg_destination != "" else None,
+                                                          ajouter_couche)
+            return
 
         features = qgs_vector_layer.getFeatures()
         # for feature in features:
@@ -92,7 +105,7 @@ class UtilitaireCouches():
         options.driverName = "GPKG"
         options.layerName = layer_name
         options.fileEncoding = "utf-8"
-        chemin_geopackage = chemin_geopackage + "/" + nom_fichier
+        chemin_geopackage = os.path.join(chemin_geopackage, nom_fichier)
 
         # if (epsg_origine != "") and (epsg_destination != ""):
         #     transform_proj = QgsCoordinateTransform(QgsCoordinateReferenceSystem(epsg_origine),
@@ -130,3 +143,444 @@ class UtilitaireCouches():
                 layer_node.setExpanded(True)
             else:
                 layer_node.setExpanded(False)
+
+    @staticmethod
+    def lire_dates_max_geopackage(chemin_geopackage: str, nom_table: str, champ_code: str, champ_date: str) -> dict:
+        """
+        Lecture dans une table d'un geopackage de la dernière date de donnée de chaque station.
+
+        :param chemin_geopackage: chemin du geopackage
+        :type chemin_geopackage: str
+
+        :param nom_table: nom de la table des données dans le geopackage
+        :type nom_table: str
+
+        :param champ_code: nom du champ du code station (p.ex "code_bss")
+        :type champ_code: str
+
+        :param champ_date: nom du champ de date (p.ex "date_mesure")
+        :type champ_date: str
+
+        :return: dictionnaire clé = code station / valeur = dernière date ("aaaa-mm-jj")
+        :rtype: dict
+        """
+        dict_date_max = {}
+        gpkg = ogr.Open(chemin_geopackage)
+        if gpkg is None:
+            return dict_date_max
+        requete_sql = f'SELECT "{champ_code}", MAX("{champ_date}") FROM "{nom_table}" GROUP BY "{champ_code}"'
+        resultat = gpkg.ExecuteSQL(requete_sql)
+        if resultat is not None:
+            for feature in resultat:
+                if feature.IsFieldSetAndNotNull(0) and feature.IsFieldSetAndNotNull(1):
+                    dict_date_max[feature.GetFieldAsString(0)] = feature.GetFieldAsString(1).replace("/", "-")[:10]
+            gpkg.ReleaseResultSet(resultat)
+        return dict_date_max
+
+    @staticmethod
+    def lire_lignes_dates_max_geopackage(chemin_geopackage: str, nom_table: str, champ_code: str, champ_date: str,
+                                         list_champ: list):
+        """
+        Lecture dans une table d'un geopackage des lignes du dernier jour de données de chaque station
+        (lignes comparées aux données d'un téléchargement incrémental, demandées à partir de ce jour).
+
+        :param chemin_geopackage: chemin du geopackage
+        :type chemin_geopackage: str
+
+        :param nom_table: nom de la table des données dans le geopackage
+        :type nom_table: str
+
+        :param champ_code: nom du champ du code station (p.ex "code_bss")
+        :type champ_code: str
+
+        :param champ_date: nom du champ de date (p.ex "date_mesure")
+        :type champ_date: str
+
+        :param list_champ: champs lus (p.ex ["code_bss", "date_mesure", "niveau_nappe_eau"])
+        :type list_champ: list
+
+        :return: lignes du dernier jour de chaque station (champs list_champ)
+        :rtype: DataFrame
+        """
+        list_ligne = []
+        gpkg = ogr.Open(chemin_geopackage)
+        if gpkg is None:
+            return pd.DataFrame(columns=list_champ)
+        str_champ = ", ".join(f't."{nom_champ}"' for nom_champ in list_champ)
+        requete_sql = (f'SELECT {str_champ} FROM "{nom_table}" AS t '
+                       f'JOIN (SELECT "{champ_code}" AS code_max, MAX("{champ_date}") AS date_max '
+                       f'FROM "{nom_table}" GROUP BY "{champ_code}") AS m '
+                       f'ON t."{champ_code}" = m.code_max AND substr(t."{champ_date}", 1, 10) = substr(m.date_max, 1, 10)')
+        resultat = gpkg.ExecuteSQL(requete_sql)
+        if resultat is not None:
+            for feature in resultat:
+                list_ligne.append([feature.GetField(index_champ) if feature.IsFieldSetAndNotNull(index_champ) else None
+                                   for index_champ in range(len(list_champ))])
+            gpkg.ReleaseResultSet(resultat)
+        return pd.DataFrame(list_ligne, columns=list_champ)
+
+    @staticmethod
+    def lire_valeurs_distinctes_geopackage(chemin_geopackage: str, nom_table: str, champ: str) -> set:
+        """
+        Lecture des valeurs distinctes d'un champ d'une table d'un geopackage.
+
+        :param chemin_geopackage: chemin du geopackage
+        :type chemin_geopackage: str
+
+        :param nom_table: nom de la table dans le geopackage
+        :type nom_table: str
+
+        :param champ: nom du champ
+        :type champ: str
+
+        :return: ensemble des valeurs du champ
+        :rtype: set
+        """
+        set_valeur = set()
+        gpkg = ogr.Open(chemin_geopackage)
+        if gpkg is None:
+            return set_valeur
+        resultat = gpkg.ExecuteSQL(f'SELECT DISTINCT "{champ}" FROM "{nom_table}"')
+        if resultat is not None:
+            for feature in resultat:
+                set_valeur.add(feature.GetFieldAsString(0))
+            gpkg.ReleaseResultSet(resultat)
+        return set_valeur
+
+    @staticmethod
+    def rechercher_dernier_resultat(chemin_dossier: str, prefixe_dossier: str, prefixe_table: str) -> dict:
+        """
+        Recherche dans un dossier le dernier sous-dossier résultat (le plus récent d'après son horodate)
+        et la table des données de son geopackage.
+
+        :param chemin_dossier: dossier contenant les sous-dossiers résultats (dossier du geopackage des stations)
+        :type chemin_dossier: str
+
+        :param prefixe_dossier: début du nom des sous-dossiers résultats (p.ex "Résultats_Piézométrie_")
+        :type prefixe_dossier: str
+
+        :param prefixe_table: début du nom de la table des données dans le geopackage (p.ex "Données_Niveaux_")
+        :type prefixe_table: str
+
+        :return: dictionnaire {"chemin_geopackage", "nom_table_donnees"} ou None si aucun résultat n'existe
+        :rtype: dict
+        """
+        if (chemin_dossier is None) or (not os.path.isdir(chemin_dossier)):
+            return None
+        # Les noms des sous-dossiers se terminent par l'horodate du téléchargement (aammjjhhmmss)
+        list_nom_dossier = [nom for nom in os.listdir(chemin_dossier)
+                            if nom.startswith(prefixe_dossier) and os.path.isdir(os.path.join(chemin_dossier, nom))]
+        for nom_dossier in sorted(list_nom_dossier, key=lambda nom: nom.split("_")[-1], reverse=True):
+            chemin_geopackage = os.path.join(chemin_dossier, nom_dossier, nom_dossier + ".gpkg")
+            if not os.path.isfile(chemin_geopackage):
+                continue
+            gpkg = ogr.Open(chemin_geopackage)
+            if gpkg is None:
+                continue
+            for layer in gpkg:
+                if layer.GetName().startswith(prefixe_table):
+                    return {"chemin_geopackage": chemin_geopackage, "nom_table_donnees": layer.GetName()}
+        return None
+
+    @staticmethod
+    def lire_table_geopackage(chemin_geopackage: str, nom_table: str, list_champ: list, filtre_sql: str = "") -> pd.DataFrame:
+        """
+        Lecture de quelques champs de toutes les lignes (ou des lignes filtrées) d'une table d'un geopackage (sans les géométries).
+
+        :param chemin_geopackage: chemin du geopackage
+        :type chemin_geopackage: str
+
+        :param nom_table: nom de la table dans le geopackage
+        :type nom_table: str
+
+        :param list_champ: liste des noms des champs à lire
+        :type list_champ: list
+
+        :param filtre_sql: condition sql des lignes à lire (clause WHERE sans le mot clé), toutes les lignes si vide
+        :type filtre_sql: str
+
+        :return: dataframe des champs lus (vide si le geopackage ou la table n'existe pas)
+        :rtype: pd.DataFrame
+        """
+        dict_colonne = {champ: [] for champ in list_champ}
+        gpkg = ogr.Open(chemin_geopackage)
+        if gpkg is None:
+            return pd.DataFrame(dict_colonne)
+        liste_champ = ", ".join(f'"{champ}"' for champ in list_champ)
+        requete_sql = f'SELECT {liste_champ} FROM "{nom_table}"' + (f' WHERE {filtre_sql}' if filtre_sql else '')
+        resultat = gpkg.ExecuteSQL(requete_sql)
+        if resultat is not None:
+            list_index = list(range(len(list_champ)))
+            for feature in resultat:
+                for champ, index in zip(list_champ, list_index):
+                    dict_colonne[champ].append(feature.GetField(index))
+            gpkg.ReleaseResultSet(resultat)
+        return pd.DataFrame(dict_colonne)
+
+    @staticmethod
+    def creer_systeme_reference(epsg) -> osr.SpatialReference:
+        """
+        Création d'un système de référence spatiale à partir d'un code epsg.
+
+        :param epsg: code epsg (p.ex 2154) ou code au format du type "EPSG:2154"
+        :type epsg: int | str
+
+        :return: système de référence, axes dans l'ordre longitude / latitude
+        :rtype: osr.SpatialReference
+        """
+        srs = osr.SpatialReference()
+        if isinstance(epsg, str):
+            srs.SetFromUserInput(epsg)
+        else:
+            srs.ImportFromEPSG(int(epsg))
+        if hasattr(osr, "OAMS_TRADITIONAL_GIS_ORDER"):
+            srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        return srs
+
+    @staticmethod
+    def definir_type_champ(dtype) -> tuple:
+        """
+        Correspondance entre le type d'une colonne de dataframe et le type de champ OGR.
+
+        :param dtype: type de la colonne
+        :type dtype: numpy.dtype
+
+        :return: tuple (type OGR, sous-type OGR)
+        :rtype: tuple
+        """
+        if pd.api.types.is_bool_dtype(dtype):
+            return ogr.OFTInteger, ogr.OFSTBoolean
+        if pd.api.types.is_integer_dtype(dtype):
+            return ogr.OFTInteger64, ogr.OFSTNone
+        if pd.api.types.is_float_dtype(dtype):
+            return ogr.OFTReal, ogr.OFSTNone
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            return ogr.OFTDateTime, ogr.OFSTNone
+        return ogr.OFTString, ogr.OFSTNone
+
+    @staticmethod
+    def ecrire_dataframe_geopackage(chemin_geopackage: str, nom_table: str, df_data, champ_x="", champ_y="",
+                                    epsg_origine=4326, epsg_destination=None, ajouter_couche=False) -> int:
+        """
+        Ecriture directe d'un dataframe dans une table (ou une couche de points) d'un geopackage existant ou à créer,
+        sans passer par un csv ni par une couche Qgis : les types des champs sont ceux des colonnes du dataframe
+        et les lignes sont insérées en une seule transaction (voir ajouter_lignes_geopackage).
+        L'index spatial d'une couche de points n'est créé qu'après l'insertion de toutes les lignes
+        (construction en une fois plutôt que mise à jour à chaque ligne).
+        Une table de même nom déjà présente dans le geopackage est remplacée.
+
+        :param chemin_geopackage: chemin du geopackage
+        :type chemin_geopackage: str
+
+        :param nom_table: nom de la table ou de la couche dans le geopackage
+        :type nom_table: str
+
+        :param df_data: lignes à écrire
+        :type df_data: DataFrame
+
+        :param champ_x: nom du champ de longitude (couche de points uniquement, table sans géométrie sinon)
+        :type champ_x: str
+
+        :param champ_y: nom du champ de latitude (couche de points uniquement)
+        :type champ_y: str
+
+        :param epsg_origine: code epsg des coordonnées x / y du dataframe (p.ex 4326 ou "EPSG:4326")
+        :type epsg_origine: int | str
+
+        :param epsg_destination: code epsg de la couche de points (None = pas de reprojection)
+        :type epsg_destination: int | str
+
+        :param ajouter_couche: indique s'il faut ajouter la table à un geopackage existant (True) ou créer le geopackage (False)
+        :type ajouter_couche: bool
+
+        :return: nombre de lignes écrites
+        :rtype: int
+        """
+        driver = ogr.GetDriverByName("GPKG")
+        if (ajouter_couche is True) and os.path.isfile(chemin_geopackage):
+            gpkg = driver.Open(chemin_geopackage, 1)
+        else:
+            if os.path.isfile(chemin_geopackage):
+                driver.DeleteDataSource(chemin_geopackage)
+            gpkg = driver.CreateDataSource(chemin_geopackage)
+
+        # Couche de points dans la projection de destination, ou table sans géométrie
+        srs = None
+        type_geometrie = ogr.wkbNone
+        if champ_x != "":
+            srs = UtilitaireCouches.creer_systeme_reference(epsg_destination if epsg_destination is not None else epsg_origine)
+            type_geometrie = ogr.wkbPoint
+        layer = gpkg.CreateLayer(nom_table, srs, type_geometrie, ["OVERWRITE=YES", "SPATIAL_INDEX=NO"])
+
+        # Champs de la table d'après les types des colonnes du dataframe
+        for nom_col in df_data.columns:
+            type_champ, sous_type_champ = UtilitaireCouches.definir_type_champ(df_data[nom_col].dtype)
+            field_defn = ogr.FieldDefn(str(nom_col), type_champ)
+            field_defn.SetSubType(sous_type_champ)
+            layer.CreateField(field_defn)
+        layer = None
+        gpkg = None
+
+        nb_ligne = UtilitaireCouches.ajouter_lignes_geopackage(chemin_geopackage, nom_table, df_data, champ_x, champ_y, epsg_origine)
+        if champ_x != "":
+            UtilitaireCouches.creer_index_spatial_geopackage(chemin_geopackage, nom_table)
+        return nb_ligne
+
+    @staticmethod
+    def creer_index_spatial_geopackage(chemin_geopackage: str, nom_table: str):
+        """
+        Création (si il n'existe pas déjà) de l'index spatial (R-tree) d'une couche d'un geopackage.
+        L'index est ensuite tenu à jour par les triggers du geopackage lors des ajouts de lignes
+        et utilisé par Qgis pour les requêtes sur une emprise (affichage, sélection, identification).
+
+        :param chemin_geopackage: chemin du geopackage
+        :type chemin_geopackage: str
+
+        :param nom_table: nom de la couche dans le geopackage
+        :type nom_table: str
+        """
+        gpkg = ogr.Open(chemin_geopackage, 1)
+        layer = gpkg.GetLayerByName(nom_table)
+        champ_geometrie = layer.GetGeometryColumn()
+        if champ_geometrie != "":
+            resultat = gpkg.ExecuteSQL(f"SELECT HasSpatialIndex('{nom_table}', '{champ_geometrie}')")
+            index_existant = (resultat is not None) and (resultat.GetNextFeature().GetField(0) == 1)
+            if resultat is not None:
+                gpkg.ReleaseResultSet(resultat)
+            if not index_existant:
+                resultat = gpkg.ExecuteSQL(f"SELECT CreateSpatialIndex('{nom_table}', '{champ_geometrie}')")
+                if resultat is not None:
+                    gpkg.ReleaseResultSet(resultat)
+        layer = None
+        gpkg = None
+
+    @staticmethod
+    def creer_index_geopackage(chemin_geopackage: str, nom_table: str, list_champ: list):
+        """
+        Création (si il n'existe pas déjà) d'un index attributaire sur une table d'un geopackage,
+        puis mise à jour des statistiques de la table utilisées par sqlite pour choisir l'index.
+
+        :param chemin_geopackage: chemin du geopackage
+        :type chemin_geopackage: str
+
+        :param nom_table: nom de la table dans le geopackage
+        :type nom_table: str
+
+        :param list_champ: champs de l'index, dans l'ordre des filtres (égalités puis intervalle)
+        :type list_champ: list
+        """
+        nom_index = "idx_" + nom_table + "_" + "_".join(list_champ)
+        champs = ", ".join(f'"{champ}"' for champ in list_champ)
+        gpkg = ogr.Open(chemin_geopackage, 1)
+        gpkg.ExecuteSQL(f'CREATE INDEX IF NOT EXISTS "{nom_index}" ON "{nom_table}" ({champs})')
+        gpkg.ExecuteSQL(f'ANALYZE "{nom_table}"')
+        gpkg = None
+
+    @staticmethod
+    def creer_vue_geopackage(chemin_geopackage: str, nom_vue: str, requete_sql: str):
+        """
+        Création d'une vue sql dans un geopackage et déclaration de la vue comme table attributaire
+        (table gpkg_contents) pour qu'elle puisse être lue comme une couche sans géométrie.
+        La requête doit renvoyer en premier un champ entier "fid" (identifiant des lignes de la vue).
+
+        :param chemin_geopackage: chemin du geopackage
+        :type chemin_geopackage: str
+
+        :param nom_vue: nom de la vue
+        :type nom_vue: str
+
+        :param requete_sql: requête sql (SELECT) de la vue
+        :type requete_sql: str
+        """
+        gpkg = ogr.Open(chemin_geopackage, 1)
+        gpkg.ExecuteSQL(f'DROP VIEW IF EXISTS "{nom_vue}"')
+        gpkg.ExecuteSQL(f"DELETE FROM gpkg_contents WHERE table_name = '{nom_vue}'")
+        gpkg.ExecuteSQL(f'CREATE VIEW "{nom_vue}" AS {requete_sql}')
+        gpkg.ExecuteSQL(f"INSERT INTO gpkg_contents (table_name, identifier, data_type) VALUES ('{nom_vue}', '{nom_vue}', 'attributes')")
+        gpkg = None
+
+    @staticmethod
+    def ajouter_lignes_geopackage(chemin_geopackage: str, nom_table: str, df_data, champ_x="", champ_y="", epsg_origine=4326) -> int:
+        """
+        Ajout des lignes d'un dataframe à une table (ou couche de points) existante d'un geopackage,
+        en une seule transaction. Seuls les champs du dataframe présents dans la table sont écrits.
+
+        :param chemin_geopackage: chemin du geopackage
+        :type chemin_geopackage: str
+
+        :param nom_table: nom de la table ou de la couche dans le geopackage
+        :type nom_table: str
+
+        :param df_data: lignes à ajouter
+        :type df_data: DataFrame
+
+        :param champ_x: nom du champ de longitude (couche de points uniquement)
+        :type champ_x: str
+
+        :param champ_y: nom du champ de latitude (couche de points uniquement)
+        :type champ_y: str
+
+        :param epsg_origine: code epsg des coordonnées x / y du dataframe (p.ex 4326 ou "EPSG:4326")
+        :type epsg_origine: int | str
+
+        :return: nombre de lignes ajoutées
+        :rtype: int
+        """
+        gpkg = ogr.Open(chemin_geopackage, 1)
+        layer = gpkg.GetLayerByName(nom_table)
+        layer_defn = layer.GetLayerDefn()
+        # Correspondance entre les colonnes du dataframe et les champs de la table
+        list_champ = [(nom_col, layer_defn.GetFieldIndex(nom_col)) for nom_col in df_data.columns
+                      if layer_defn.GetFieldIndex(nom_col) >= 0]
+
+        # Transformation des coordonnées dans la projection de la couche de points
+        transformation = None
+        if (champ_x != "") and (layer.GetSpatialRef() is not None):
+            srs_origine = UtilitaireCouches.creer_systeme_reference(epsg_origine)
+            srs_destination = layer.GetSpatialRef()
+            if hasattr(osr, "OAMS_TRADITIONAL_GIS_ORDER"):
+                srs_destination.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+            transformation = osr.CoordinateTransformation(srs_origine, srs_destination)
+
+        nb_ligne = 0
+        layer.StartTransaction()
+        try:
+            for dict_ligne in df_data.to_dict('records'):
+                feature = ogr.Feature(layer_defn)
+                for nom_col, index_champ in list_champ:
+                    valeur = dict_ligne[nom_col]
+                    if pd.isna(valeur):
+                        feature.SetFieldNull(index_champ)
+                    elif isinstance(valeur, bool):
+                        feature.SetField(index_champ, int(valeur))
+                    else:
+                        feature.SetField(index_champ, valeur if isinstance(valeur, (int, float)) else str(valeur))
+                # Point sans coordonnées : ligne écrite sans géométrie
+                if (champ_x != "") and not (pd.isna(dict_ligne[champ_x]) or pd.isna(dict_ligne[champ_y])):
+                    point = ogr.Geometry(ogr.wkbPoint)
+                    point.AddPoint_2D(float(dict_ligne[champ_x]), float(dict_ligne[champ_y]))
+                    if transformation is not None:
+                        point.Transform(transformation)
+                    feature.SetGeometry(point)
+                layer.CreateFeature(feature)
+                nb_ligne += 1
+            layer.CommitTransaction()
+        except Exception:
+            layer.RollbackTransaction()
+            raise
+        finally:
+            gpkg = None
+        return nb_ligne
+
+    @staticmethod
+    def recharger_couches_geopackage(chemin_geopackage: str):
+        """
+        Rechargement des couches du projet issues d'un geopackage modifié (p.ex après ajout de lignes).
+
+        :param chemin_geopackage: chemin du geopackage
+        :type chemin_geopackage: str
+        """
+        for layer in QgsProject.instance().mapLayers().values():
+            if isinstance(layer, QgsVectorLayer) and (layer.source().split("|")[0] == chemin_geopackage):
+                layer.reload()
+                layer.triggerRepaint()